@@ -148,3 +148,35 @@ GOOGLE_CLIENT_ID = '406038150169-1m2fs1pesvhker6ik84hjgoeonpj24rt.apps.googleuse
 GOOGLE_CLIENT_SECRET = ''
 
 GROQ_API_KEY = ''
+
+# Upload ingestion
+# CSV uploads are read in chunks of this many rows so worker memory scales with accounts, not rows
+AML_STREAMING_INGEST = True
+AML_INGEST_CHUNK_SIZE = 100000
+# Uploads are streamed here and parsed by path; failed tasks keep their file for retries
+AML_UPLOAD_SPOOL_DIR = BASE_DIR / 'uploads' / 'spool'
+# Normalized uploads are cached as Parquet keyed by content hash; set the dir to None to disable
+AML_PARSE_CACHE_DIR = BASE_DIR / 'uploads' / 'parsed_cache'
+AML_PARSE_CACHE_MAX_BYTES = 5 * 1024 ** 3
+
+# Upload processing workers (`python manage.py run_workers`)
+AML_WORKER_PROCESSES = 2
+# A task whose worker stops renewing its lease for this long is re-queued
+AML_WORKER_LEASE_SECONDS = 300
+AML_WORKER_MAX_ATTEMPTS = 3
+# Processes each upload worker uses to score a file in batch mode (1 = serial); roughly
+# cores / AML_WORKER_PROCESSES. Benchmark with `python manage.py benchmark sharding`
+AML_SCORING_WORKERS = 1
+
+# Per-account feature state carried across uploads (dashboard/feature_store.py)
+AML_FEATURE_STORE = True
+# Counterparties remembered per account for the round-trip feature
+AML_FEATURE_SKETCH_SIZE = 500
+
+# `manage.py train_model` fits on a uniform sample of this many accounts, streamed from the DB
+AML_TRAINING_SAMPLE_ACCOUNTS = 100000
+
+# /api/score-transaction/ keeps per-account state in memory and pickles it here every
+# AML_REALTIME_SNAPSHOT_SECONDS, so a restart resumes from the last snapshot
+AML_REALTIME_SNAPSHOT_DIR = BASE_DIR / 'uploads' / 'realtime'
+AML_REALTIME_SNAPSHOT_SECONDS = 60
@@ -1005,7 +1005,7 @@ const AMLDashboard = () => {
                                                     </div>
                                                     <div className="flex items-center gap-3">
                                                         <span className="flex items-center gap-2 px-4 py-2 bg-white rounded-xl text-[10px] font-black uppercase tracking-widest text-emerald-600 shadow-sm border border-emerald-100">
-                                                            <ArrowDownRight size={14} /> Inflow: ₹{selectedAlert.amount}
+                                                            <ArrowDownRight size={14} /> Inflow: {selectedAlert.amount}
                                                         </span>
                                                         <span className="flex items-center gap-2 px-4 py-2 bg-white rounded-xl text-[10px] font-black uppercase tracking-widest text-rose-600 shadow-sm border border-rose-100">
                                                             <ArrowUpRight size={14} /> Outflow Peak
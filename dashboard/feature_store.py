@@ -0,0 +1,151 @@
+"""
+Persistent per-account feature state (AccountFeatureState rows).
+
+Each upload loads the saved state of the accounts it mentions into a
+StreamingFeatureAccumulator, folds its own transactions in and writes the merged
+state back, so a daily delta costs time proportional to its own size while every
+account is still scored on its full history. Uploads of one user have to be
+applied in order; claim_next_task runs at most one task per user at a time. Each
+applied file is recorded by content hash (FeatureStoreUpload); uploaded again, it
+isn't folded in a second time (that would double its accounts' counts) but its
+accounts' saved state is scored again, e.g. with a model trained since. Only
+identical files are recognized: rows of an export that overlaps an earlier one are
+counted again, and the task reports how many predate their accounts' history.
+"""
+from datetime import timezone as dt_timezone
+
+import pandas as pd
+from django.conf import settings
+from django.utils import timezone
+
+from .ml.risk_engine import RiskEngine
+from .ml.streaming import StreamingFeatureAccumulator
+from .models import AccountFeatureState, FeatureStoreUpload
+from .money import MINOR_UNITS
+
+STATE_FIELDS = ['total_volume', 'transaction_count', 'structuring_count', 'mule_score', 'cycle_count',
+                'cycle_volume', 'dated_count', 'first_datetime', 'last_datetime', 'last_type', 'last_amount',
+                'peaks', 'recent', 'counterparties']
+
+
+def enabled():
+    return getattr(settings, 'AML_FEATURE_STORE', True)
+
+
+def stored_transaction_chunks(transactions, chunk_size):
+    """
+    Normalized frames (see RiskEngine.prepare_frame) of a Transaction queryset, read
+    with .iterator() so only one chunk of rows is in memory at a time
+    """
+    engine = RiskEngine()
+    rows = transactions.values_list('account__account_id', 'date_time', 'type', 'amount', 'related_account')
+    batch = []
+    for row in rows.iterator(chunk_size=chunk_size):
+        batch.append(row)
+        if len(batch) >= chunk_size:
+            yield _normalize(engine, batch)
+            batch = []
+    if batch:
+        yield _normalize(engine, batch)
+
+
+def _normalize(engine, batch):
+    df = pd.DataFrame(batch, columns=['account_id', 'date_time', 'type', 'amount', 'related_account'])
+    df['amount'] = df['amount'] / MINOR_UNITS  # stored as paise
+    # Stored datetimes are aware UTC; uploads are naive
+    df['date_time'] = pd.to_datetime(df['date_time'], utc=True).dt.tz_localize(None)
+    return engine.prepare_frame(df)
+
+
+class FeatureStore:
+    """Loads and saves one user's AccountFeatureState rows as accumulator state frames"""
+
+    def __init__(self, user, batch_size=5000):
+        self.user = user
+        self.batch_size = batch_size
+
+    def accumulator(self, **kwargs):
+        """A StreamingFeatureAccumulator that picks up each account's saved history"""
+        return StreamingFeatureAccumulator(
+            load_history=self.load,
+            sketch_size=getattr(settings, 'AML_FEATURE_SKETCH_SIZE', 500),
+            **kwargs,
+        )
+
+    def load(self, account_ids=None):
+        """Saved state for these accounts (all of the user's when None) as a state frame"""
+        queryset = AccountFeatureState.objects.filter(user=self.user)
+        if account_ids is None:
+            rows = list(queryset.values('account_id', *STATE_FIELDS))
+        else:
+            account_ids = list(account_ids)
+            rows = []
+            for start in range(0, len(account_ids), self.batch_size):
+                batch = account_ids[start:start + self.batch_size]
+                rows.extend(queryset.filter(account_id__in=batch).values('account_id', *STATE_FIELDS))
+        if not rows:
+            return pd.DataFrame()
+
+        state = pd.DataFrame(rows).set_index('account_id')
+        peaks = pd.DataFrame(state.pop('peaks').tolist(), index=state.index)
+        state = state.join(peaks.reindex(columns=StreamingFeatureAccumulator.WINDOW_COLUMNS).fillna(0))
+        # The accumulator works on naive UTC datetimes, like the uploads themselves
+        for col in ['first_datetime', 'last_datetime']:
+            state[col] = pd.to_datetime(state[col], utc=True).dt.tz_localize(None)
+        return state
+
+    def applied(self, content_key):
+        """Whether the upload with this ParsedUploadCache.content_key is already folded in"""
+        return FeatureStoreUpload.objects.filter(user=self.user, content_key=content_key).exists()
+
+    def save(self, state, content_key=None, task_id=None):
+        """Insert or overwrite the state of every account in the frame, recording the upload it came from"""
+        if content_key:
+            FeatureStoreUpload.objects.create(user=self.user, content_key=content_key, task_id=task_id)
+        if state.empty:
+            return
+        window_columns = StreamingFeatureAccumulator.WINDOW_COLUMNS
+        peaks = state[window_columns].astype('float64').to_dict('records')
+        rows = state.drop(columns=window_columns)
+
+        objs = []
+        for (account_id, row), account_peaks in zip(rows.iterrows(), peaks):
+            objs.append(AccountFeatureState(
+                user=self.user,
+                account_id=account_id,
+                total_volume=float(row['total_volume']),
+                transaction_count=int(row['transaction_count']),
+                structuring_count=int(row['structuring_count']),
+                mule_score=int(row['mule_score']),
+                cycle_count=int(row['cycle_count']),
+                cycle_volume=float(row['cycle_volume']),
+                dated_count=int(row['dated_count']),
+                first_datetime=_aware(row['first_datetime']),
+                last_datetime=_aware(row['last_datetime']),
+                last_type=None if pd.isna(row['last_type']) else str(row['last_type']),
+                last_amount=float(row['last_amount']),
+                peaks=account_peaks,
+                recent=row['recent'],
+                counterparties={str(k): int(v) for k, v in row['counterparties'].items()},
+            ))
+        AccountFeatureState.objects.bulk_create(
+            objs,
+            batch_size=1000,
+            update_conflicts=True,
+            unique_fields=['user', 'account_id'],
+            update_fields=STATE_FIELDS + ['updated_at'],
+        )
+
+    def features(self):
+        """Merged feature frame for every stored account, ready for RiskEngine.score_features"""
+        accumulator = StreamingFeatureAccumulator()
+        state = self.load()
+        if not state.empty:
+            accumulator.seed(state)
+        return accumulator.features()
+
+
+def _aware(value):
+    if pd.isna(value):
+        return None
+    return timezone.make_aware(pd.Timestamp(value).to_pydatetime(), dt_timezone.utc)
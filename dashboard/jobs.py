@@ -0,0 +1,152 @@
+"""
+Database-backed job queue for upload processing.
+
+ProcessingTask rows are the queue: UploadView inserts them as 'Pending' and
+`manage.py run_workers` processes claim them. A claim is a conditional UPDATE
+(status Pending -> Processing) so two workers can never take the same task, and
+it comes with a lease that the worker keeps renewing while it runs. Tasks whose
+lease runs out belong to a worker that died and are put back in the queue.
+"""
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connections
+from django.db.models import Count, Exists, F, Min, OuterRef, Q
+from django.utils import timezone
+
+from .models import ProcessingTask
+
+
+def lease_seconds():
+    return getattr(settings, 'AML_WORKER_LEASE_SECONDS', 300)
+
+
+def claim_next_task(worker_id, lease=None):
+    """
+    Claim the oldest pending task of the user with the fewest running tasks.
+    Returns the claimed task, or None when the queue is empty.
+
+    With the feature store on, each upload builds on the state the previous one left,
+    so a user's tasks run one at a time and in upload order.
+    """
+    from .feature_store import enabled as feature_store_enabled
+
+    lease = lease or lease_seconds()
+    for _ in range(5):
+        # Per-user fairness: one user's backlog can't starve everyone else
+        running = dict(ProcessingTask.objects.filter(status='Processing')
+                       .values_list('user').annotate(n=Count('id')))
+        pending = list(ProcessingTask.objects.filter(status='Pending')
+                       .values('user').annotate(oldest=Min('created_at')))
+        if feature_store_enabled():
+            pending = [p for p in pending if p['user'] not in running]
+        if not pending:
+            return None
+
+        user = min(pending, key=lambda p: (running.get(p['user'], 0), p['oldest']))['user']
+
+        task = ProcessingTask.objects.filter(status='Pending', user=user).order_by('created_at').first()
+        if task is None:
+            continue
+
+        candidate = ProcessingTask.objects.filter(pk=task.pk, status='Pending')
+        if feature_store_enabled():
+            candidate = candidate.filter(~Exists(ProcessingTask.objects.filter(user=OuterRef('user'), status='Processing')))
+        claimed = candidate.update(
+            status='Processing',
+            worker_id=worker_id,
+            lease_expires_at=timezone.now() + timedelta(seconds=lease),
+            attempts=F('attempts') + 1,
+            updated_at=timezone.now(),
+        )
+        if claimed:
+            task.refresh_from_db()
+            return task
+        # Another worker won the race for this task (or this user); look again
+    return None
+
+
+def renew_lease(task_pk, worker_id, lease=None):
+    """Extend a running task's lease; returns False if the task is no longer ours"""
+    lease = lease or lease_seconds()
+    return bool(ProcessingTask.objects.filter(pk=task_pk, worker_id=worker_id, status='Processing').update(
+        lease_expires_at=timezone.now() + timedelta(seconds=lease)
+    ))
+
+
+def recover_orphaned_tasks(max_attempts=None):
+    """
+    Re-queue 'Processing' tasks whose lease expired (their worker crashed or was
+    restarted). Tasks without a lease were started by the old in-process threads
+    and can't still be running either. Tasks that keep dying are failed instead.
+    Returns (requeued, failed).
+    """
+    max_attempts = max_attempts or getattr(settings, 'AML_WORKER_MAX_ATTEMPTS', 3)
+    orphaned = ProcessingTask.objects.filter(status='Processing').filter(
+        Q(lease_expires_at__lt=timezone.now()) | Q(lease_expires_at__isnull=True)
+    )
+
+    failed = orphaned.filter(attempts__gte=max_attempts).update(
+        status='Failed',
+        error_message=f'Worker lost the task {max_attempts} times; giving up',
+        worker_id=None,
+        lease_expires_at=None,
+        updated_at=timezone.now(),
+    )
+    requeued = orphaned.update(
+        status='Pending',
+        progress=0,
+        processed_records=0,
+        worker_id=None,
+        lease_expires_at=None,
+        updated_at=timezone.now(),
+    )
+    return requeued, failed
+
+
+class LeaseHeartbeat(threading.Thread):
+    """Renews a task's lease in the background while the worker processes it"""
+
+    def __init__(self, task_pk, worker_id, lease=None):
+        super().__init__(daemon=True)
+        self.task_pk = task_pk
+        self.worker_id = worker_id
+        self.lease = lease or lease_seconds()
+        self._stop_event = threading.Event()
+
+    def run(self):
+        try:
+            while not self._stop_event.wait(self.lease / 3):
+                if not renew_lease(self.task_pk, self.worker_id, self.lease):
+                    print(f"[{self.worker_id}] Lost lease on task {self.task_pk}")
+                    return
+        finally:
+            connections.close_all()
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+def run_worker(worker_id, stop_event, poll_interval=2.0, lease=None):
+    """Claim and process tasks until stop_event is set"""
+    from .views import background_process
+
+    lease = lease or lease_seconds()
+    while not stop_event.is_set():
+        task = claim_next_task(worker_id, lease)
+        if task is None:
+            stop_event.wait(poll_interval)
+            continue
+
+        print(f"[{worker_id}] Processing task {task.task_id} (attempt {task.attempts})")
+        started = time.monotonic()
+        heartbeat = LeaseHeartbeat(task.pk, worker_id, lease)
+        heartbeat.start()
+        try:
+            background_process(task.task_id, task.file_path, task.user_id)
+        finally:
+            heartbeat.stop()
+        print(f"[{worker_id}] Finished task {task.task_id} in {time.monotonic() - started:.1f}s")
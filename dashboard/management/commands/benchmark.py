@@ -0,0 +1,321 @@
+import gc
+import json
+import os
+import platform
+import subprocess
+import tempfile
+import uuid
+from datetime import datetime
+import numpy as np
+import pandas as pd
+import sklearn
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from dashboard.ml import fan
+from dashboard.ml.benchmarks import reset_peak_rss, rss_mb, timed
+from dashboard.ml.graph import CounterpartyGraph
+from dashboard.ml.readers import iter_upload_chunks
+from dashboard.ml.risk_engine import RiskEngine
+from dashboard.ml.streaming import StreamingFeatureAccumulator
+from dashboard.ml.synthetic import generate_transactions
+from dashboard.models import Transaction
+from dashboard.views import build_evidence_transactions, save_results
+
+
+class Command(BaseCommand):
+    help = 'Benchmark individual stages of the upload pipeline on synthetic data'
+
+    def add_arguments(self, parser):
+        parser.add_argument('stage', choices=['evidence', 'parse', 'graph', 'windows', 'fan', 'network', 'sharding', 'memory',
+                                              'pipeline'])
+        parser.add_argument('--rows', type=int, nargs='+',
+                            help='Defaults to 10k, 100k and 1M rows (and 10M for the pipeline stage)')
+        parser.add_argument('--source', default='aml_20000_transactions.xlsx',
+                            help='Upload file tiled up to --rows for the parse stage')
+        parser.add_argument('--legacy-max-rows', type=int, default=100000,
+                            help='Skip the old per-account filter above this size (it is O(accounts x rows))')
+        parser.add_argument('--max-hops', type=int, default=4, help='Longest cycle for the graph stage')
+        parser.add_argument('--workers', type=int, nargs='+', default=sorted({1, 2, 4, os.cpu_count() or 1}),
+                            help='Process pool sizes for the sharding stage (1 is the serial path)')
+        parser.add_argument('--path', choices=['streaming', 'batch'], default='streaming',
+                            help="Upload path the pipeline stage runs: background_process's chunked streaming "
+                                 "ingest (the default) or its whole-file batch fallback")
+        parser.add_argument('--chunk-size', type=int, default=getattr(settings, 'AML_INGEST_CHUNK_SIZE', 100000),
+                            help='Rows per chunk on the streaming path')
+        parser.add_argument('--output', default='benchmark-pipeline.json', help='JSON report of the pipeline stage')
+        parser.add_argument('--baseline', help='Earlier pipeline report to compare stage timings against')
+        parser.add_argument('--db-max-rows', type=int, default=1000000,
+                            help='Skip the pipeline DB write above this size (evidence objects are held in memory)')
+
+    def handle(self, *args, **options):
+        if not options['rows']:
+            options['rows'] = [10000, 100000, 1000000] + ([10000000] if options['stage'] == 'pipeline' else [])
+        getattr(self, f"bench_{options['stage']}")(options)
+
+    def bench_evidence(self, options):
+        self.stdout.write(f"{'rows':>10} {'accounts':>9} {'sample_s':>9} {'build_s':>9} {'rows/s':>12} {'legacy_s':>10}")
+        for n_rows in options['rows']:
+            df, _ = generate_transactions(n_rows, normalized=True)
+            results = pd.DataFrame({'account_id': df['account_id'].unique(), 'risk_score': 60})
+
+            evidence, sample_s = timed(RiskEngine.top_transactions, df)
+            _, build_s = timed(build_evidence_transactions, evidence, results, {}, None)
+            grouped_s = sample_s + build_s
+
+            legacy = '-'
+            if n_rows <= options['legacy_max_rows']:
+                _, legacy_s = timed(self._legacy_evidence, df, results)
+                legacy = f"{legacy_s:.2f}"
+
+            self.stdout.write(f"{n_rows:>10} {len(results):>9} {sample_s:>9.2f} {build_s:>9.2f} "
+                              f"{n_rows / grouped_s:>12,.0f} {legacy:>10}")
+
+    def bench_parse(self, options):
+        source = options['source']
+        raw = pd.read_csv(source) if source.endswith('.csv') else pd.read_excel(source)
+        self.stdout.write(f"{'rows':>10} {'amounts':>9} {'legacy_s':>9} {'fast_s':>9} {'speedup':>8}")
+        for n_rows in options['rows']:
+            tiled = raw.iloc[np.resize(np.arange(len(raw)), n_rows)].reset_index(drop=True)
+            # Exports often carry formatted amounts ("₹1,234,567"), which take the string path
+            as_text = tiled.assign(amount='₹' + tiled['amount'].astype(str))
+            for label, frame in [('numeric', tiled), ('text', as_text)]:
+                _, legacy_s = timed(self._legacy_prepare, frame.copy())
+                _, fast_s = timed(RiskEngine().prepare_frame, frame.copy())
+                self.stdout.write(f"{n_rows:>10} {label:>9} {legacy_s:>9.2f} {fast_s:>9.2f} {legacy_s / fast_s:>7.1f}x")
+
+    def bench_graph(self, options):
+        self.stdout.write(f"{'rows':>10} {'edges':>10} {'build_s':>8} {'cycles_s':>9} {'cycles':>9} {'accounts':>9} {'edges/s':>12}")
+        for n_rows in options['rows']:
+            df, _ = generate_transactions(n_rows, normalized=True)
+            graph, build_s = timed(CounterpartyGraph.from_frame, df, max_length=options['max_hops'])
+            features, cycles_s = timed(graph.cycle_features)
+            truncated = ' (truncated)' if graph.truncated else ''
+            self.stdout.write(f"{n_rows:>10} {graph.n_edges:>10} {build_s:>8.2f} {cycles_s:>9.2f} {graph.total_cycles:>9} "
+                              f"{len(features):>9} {graph.n_edges / (build_s + cycles_s):>12,.0f}{truncated}")
+
+    def bench_windows(self, options):
+        # Share of extract_features_vectorized spent on the rolling-window features
+        self.stdout.write(f"{'rows':>10} {'features_s':>11} {'windows_s':>10} {'without_s':>10} {'overhead':>9}")
+        for n_rows in options['rows']:
+            df, _ = generate_transactions(n_rows, normalized=True)
+            _, features_s = timed(RiskEngine().extract_features_vectorized, df)
+
+            timeline = df.sort_values(['account_id', 'datetime'])
+            _, windows_s = timed(RiskEngine.window_features, timeline)
+            _, spans_s = timed(RiskEngine.timeline_spans, timeline)
+            windows_s += spans_s
+
+            without_s = features_s - windows_s
+            self.stdout.write(f"{n_rows:>10} {features_s:>11.2f} {windows_s:>10.2f} {without_s:>10.2f} "
+                              f"{features_s / without_s:>8.2f}x")
+
+    def bench_fan(self, options):
+        # Sparse-matrix fan-in/out features against a plain groupby of distinct counterparties per week
+        self.stdout.write(f"{'rows':>10} {'fan_s':>8} {'edges/s':>12} {'groupby_s':>10} {'speedup':>8} {'fan_in':>7} {'fan_out':>8}")
+        for n_rows in options['rows']:
+            df, _ = generate_transactions(n_rows, normalized=True)
+            features, fan_s = timed(fan.fan_features, df)
+            _, groupby_s = timed(self._groupby_fan_counts, df)
+            flagged = {d: int(RiskEngine.fan_flags(features, d).sum()) for d in fan.DIRECTIONS}
+            self.stdout.write(f"{n_rows:>10} {fan_s:>8.2f} {n_rows / fan_s:>12,.0f} {groupby_s:>10.2f} "
+                              f"{groupby_s / fan_s:>7.1f}x {flagged['in']:>7} {flagged['out']:>8}")
+
+    def bench_network(self, options):
+        # Risk propagation over a graph of ~rows/10 accounts and `rows` transfers, a quarter of them seeds
+        self.stdout.write(f"{'rows':>10} {'nodes':>9} {'edges':>10} {'build_s':>8} {'propagate_s':>12} {'iterations':>11} "
+                          f"{'exposed':>8}")
+        for n_rows in options['rows']:
+            df, _ = generate_transactions(n_rows, normalized=True)
+            graph, build_s = timed(CounterpartyGraph.from_frame, df)
+            accounts = pd.unique(df['account_id'])
+            seeds = pd.Series(np.random.default_rng(0).random(len(accounts)) < 0.25, index=accounts, dtype='float64')
+            risk, propagate_s = timed(graph.network_risk, seeds)
+            self.stdout.write(f"{n_rows:>10} {len(risk):>9} {graph.n_edges:>10} {build_s:>8.2f} {propagate_s:>12.2f} "
+                              f"{graph.risk_iterations:>11} {int((risk >= 50).sum()):>8}")
+
+    def bench_sharding(self, options):
+        # End-to-end RiskEngine.analyze on 1..N cores, checked against the serial results
+        self.stdout.write(f"{'rows':>10} {'workers':>8} {'analyze_s':>10} {'rows/s':>12} {'speedup':>8} {'identical':>10}")
+        for n_rows in options['rows']:
+            df, _ = generate_transactions(n_rows, normalized=True)
+            serial_s = expected = None
+            for workers in options['workers']:
+                engine = RiskEngine()
+                engine.df = df.copy()
+                results, analyze_s = timed(engine.analyze, use_saved_model=True, workers=workers)
+                if expected is None:
+                    expected, serial_s = results, analyze_s
+                self.stdout.write(f"{n_rows:>10} {workers:>8} {analyze_s:>10.2f} {n_rows / analyze_s:>12,.0f} "
+                                  f"{serial_s / analyze_s:>7.2f}x {str(results == expected):>10}")
+
+    def bench_memory(self, options):
+        # Peak RSS of extract_features_vectorized above what the process held before it (Linux only)
+        self.stdout.write(f"{'rows':>10} {'input_mb':>9} {'base_mb':>8} {'peak_mb':>8} {'extra_mb':>9} {'features_s':>11}")
+        for n_rows in options['rows']:
+            df, _ = generate_transactions(n_rows, normalized=True)
+            input_mb = df.memory_usage(deep=True).sum() / 1024 ** 2
+            gc.collect()
+            reset_peak_rss()
+            base_mb, _ = rss_mb()
+            features, features_s = timed(RiskEngine().extract_features_vectorized, df)
+            _, peak_mb = rss_mb()
+            self.stdout.write(f"{n_rows:>10} {input_mb:>9.0f} {base_mb:>8.0f} {peak_mb:>8.0f} {peak_mb - base_mb:>9.0f} "
+                              f"{features_s:>11.2f}")
+            del df, features
+
+    def bench_pipeline(self, options):
+        # background_process's streaming (or batch) path stage by stage on generated uploads, written to a JSON report
+        self.stdout.write(f"Path: {options['path']}")
+        self.stdout.write(f"{'rows':>10} {'stage':>9} {'seconds':>8} {'rows/s':>12} {'peak_mb':>8}")
+        runs = []
+        for n_rows in options['rows']:
+            runs.append(self._pipeline_run(n_rows, options))
+            for stage, timing in runs[-1]['stages'].items():
+                self.stdout.write(f"{n_rows:>10} {stage:>9} {timing['seconds']:>8.2f} {timing['rows_per_s']:>12,.0f} "
+                                  f"{timing['peak_mb']:>8.0f}")
+            gc.collect()
+
+        report = {'created': datetime.now().isoformat(timespec='seconds'), 'environment': self._environment(),
+                  'runs': runs}
+        with open(options['output'], 'w') as f:
+            json.dump(report, f, indent=2)
+        self.stdout.write(f"Report written to {options['output']}")
+
+        if options['baseline']:
+            self._compare(options['baseline'], runs)
+
+    def _pipeline_run(self, n_rows, options):
+        # ~0.5% of accounts for each planted typology
+        n_accounts = max(1, n_rows // 10)
+        planted_accounts = max(1, n_accounts // 200)
+        df, planted = generate_transactions(n_rows, n_accounts, structuring=planted_accounts, mules=planted_accounts,
+                                            round_trips=max(1, planted_accounts // 3))
+        run = {'rows': n_rows, 'accounts': n_accounts, 'path': options['path'], 'stages': {}}
+        engine = RiskEngine()
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'upload.csv')
+            df.to_csv(path, index=False)
+            run['file_mb'] = round(os.path.getsize(path) / 1024 ** 2, 1)
+            del df
+            gc.collect()
+
+            if options['path'] == 'streaming':
+                # Reading, parsing and aggregating are interleaved chunk by chunk, so they are one stage
+                accumulator = self._stage(run, 'stream', self._stream, engine, path, options['chunk_size'])
+                if accumulator.out_of_order_rows:
+                    self.stdout.write(self.style.WARNING(
+                        f"{accumulator.out_of_order_rows} out-of-order rows; background_process would fall back to batch"))
+            else:
+                df = self._stage(run, 'parse', lambda: engine.prepare_frame(pd.read_csv(path, memory_map=True)))
+
+        if options['path'] == 'streaming':
+            features = self._stage(run, 'features', accumulator.features)
+            results = self._stage(run, 'score', engine.score_features, features, use_saved_model=True, columnar=True,
+                                  graph=accumulator.graph)
+            evidence = accumulator.evidence()
+            del features, accumulator
+        else:
+            features = self._stage(run, 'features', engine.extract_features_vectorized, df)
+            results = self._stage(run, 'score', engine.score_features, features, use_saved_model=True, columnar=True,
+                                  graph=engine.graph)
+            evidence = self._stage(run, 'evidence', RiskEngine.top_transactions, df)
+            del features, df
+            engine.df = engine.graph = None
+
+        if n_rows <= options['db_max_rows']:
+            user = User.objects.create_user(username=f"benchmark-{uuid.uuid4().hex[:12]}")
+            try:
+                self._stage(run, 'db_write', save_results, user, results, evidence)
+            finally:
+                user.delete()
+
+        # Share of each planted typology that ends up alerted
+        flagged = results.set_index('account_id')['risk_score'] > 50
+        run['flagged'] = int(flagged.sum())
+        run['planted_alerted'] = {typology: round(float(flagged.reindex(ids, fill_value=False).mean()), 3)
+                                  for typology, ids in planted.items()}
+        return run
+
+    @staticmethod
+    def _stream(engine, path, chunk_size):
+        # background_process's streaming ingest without the parse cache and progress updates
+        accumulator = StreamingFeatureAccumulator()
+        for chunk, _ in iter_upload_chunks(path, chunk_size):
+            accumulator.update(engine.prepare_frame(chunk))
+        return accumulator
+
+    @staticmethod
+    def _stage(run, name, fn, *args, **kwargs):
+        gc.collect()
+        reset_peak_rss()
+        base_mb, _ = rss_mb()
+        result, seconds = timed(fn, *args, **kwargs)
+        _, peak_mb = rss_mb()
+        run['stages'][name] = {'seconds': round(seconds, 3), 'rows_per_s': round(run['rows'] / seconds),
+                               'peak_mb': round(peak_mb - base_mb, 1)}
+        run['peak_rss_mb'] = round(max(run.get('peak_rss_mb', 0), peak_mb), 1)
+        return result
+
+    @staticmethod
+    def _environment():
+        try:
+            commit = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True).stdout.strip() or None
+        except OSError:
+            commit = None
+        return {'commit': commit, 'python': platform.python_version(), 'platform': platform.platform(),
+                'cpus': os.cpu_count(), 'numpy': np.__version__, 'pandas': pd.__version__,
+                'scikit-learn': sklearn.__version__}
+
+    def _compare(self, path, runs):
+        with open(path) as f:
+            # Reports from before --path timed the batch path
+            baseline = {(run['rows'], run.get('path', 'batch')): run for run in json.load(f)['runs']}
+        self.stdout.write(f"Against {path} (time ratio, <1 is faster)")
+        self.stdout.write(f"{'rows':>10} {'stage':>9} {'before_s':>9} {'after_s':>8} {'ratio':>6}")
+        for run in runs:
+            before = baseline.get((run['rows'], run['path']), {}).get('stages', {})
+            for stage, timing in run['stages'].items():
+                if stage in before:
+                    self.stdout.write(f"{run['rows']:>10} {stage:>9} {before[stage]['seconds']:>9.2f} "
+                                      f"{timing['seconds']:>8.2f} {timing['seconds'] / before[stage]['seconds']:>6.2f}")
+
+    @staticmethod
+    def _legacy_prepare(df):
+        # RiskEngine._prepare_data before the typed fast path
+        engine = RiskEngine()
+        engine.df = df
+        engine._map_columns()
+        df = engine.df
+        try:
+            df['datetime'] = pd.to_datetime(df['date'].astype(str) + ' ' + df['time'].astype(str))
+        except Exception:
+            df['datetime'] = pd.to_datetime(df['date'], errors='coerce')
+
+        def clean_amount(val):
+            if pd.isna(val): return 0.0
+            if isinstance(val, (int, float)):
+                return float(val)
+            return float(str(val).replace('₹', '').replace(',', '').replace('$', ''))
+
+        df['amount'] = df['amount'].apply(clean_amount)
+        return df
+
+    @staticmethod
+    def _groupby_fan_counts(df):
+        # Only the distinct-counterparty counts, the way a DataFrame-only version would get them
+        inflow = df['type'].str.lower().isin(CounterpartyGraph.INFLOW_TYPES).rename('inflow')
+        week = (df['datetime'].astype('int64') // (fan.WINDOW_SECONDS * 10 ** 9)).rename('week')
+        counts = df.groupby([df['account_id'], inflow, week])['related_account'].nunique()
+        return counts.groupby(level=[0, 1]).max()
+
+    @staticmethod
+    def _legacy_evidence(df, results):
+        # The per-account filter background_process used before the grouped pass
+        transactions = []
+        for acc_id in results['account_id']:
+            sample = df[df['account_id'] == acc_id].sort_values(by='amount', ascending=False).head(5)
+            for _, row in sample.iterrows():
+                transactions.append(Transaction(date_time=row['datetime'], type=row['type'],
+                                                amount=f"₹{row['amount']}", related_account=str(row['related_account'])))
+        return transactions
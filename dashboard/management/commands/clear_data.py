@@ -1,5 +1,5 @@
 from django.core.management.base import BaseCommand
-from dashboard.models import Account, Alert, Transaction
+from dashboard.models import Account, AccountFeatureState, Alert, DashboardSummary, FeatureStoreUpload, Transaction
 
 class Command(BaseCommand):
     help = 'Clear all accounts, transactions, and alerts from the database'
@@ -14,6 +14,9 @@ class Command(BaseCommand):
         Alert.objects.all().delete()
         Transaction.objects.all().delete()
         Account.objects.all().delete()
+        DashboardSummary.objects.all().delete()
+        AccountFeatureState.objects.all().delete()
+        FeatureStoreUpload.objects.all().delete()
         
         self.stdout.write(self.style.SUCCESS(
             f'Successfully deleted {alert_count} alerts, {txn_count} transactions, and {acc_count} accounts.'
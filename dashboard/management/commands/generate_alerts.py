@@ -1,5 +1,10 @@
+from django.contrib.auth.models import User
 from django.core.management.base import BaseCommand
-from dashboard.models import Account, Alert, Transaction
+from django.db import transaction
+from dashboard import summary
+from dashboard.feature_store import FeatureStore
+from dashboard.models import Account, AccountFeatureState, Alert
+from dashboard.money import to_minor
 from dashboard.ml.risk_engine import RiskEngine
 from django.utils import timezone
 
@@ -7,26 +12,25 @@ class Command(BaseCommand):
     help = 'Generate alerts for all accounts using RiskEngine'
 
     def handle(self, *args, **kwargs):
-        self.stdout.write('Fetching transactions...')
-        txns = Transaction.objects.all().values(
-            'account__account_id', 'date_time', 'type', 'amount', 'related_account'
-        )
-        
-        # Format data for RiskEngine
-        data = []
-        for t in txns:
-            data.append({
-                'account_id': t['account__account_id'],
-                'date': t['date_time'].strftime('%Y-%m-%d'),
-                'time': t['date_time'].strftime('%H:%M:%S'),
-                'type': t['type'],
-                'amount': t['amount'],
-                'related_account': t['related_account']
-            })
+        # Features come from the per-account feature store instead of re-reading every transaction
+        user_ids = AccountFeatureState.objects.order_by().values_list('user', flat=True).distinct()
+        if not user_ids:
+            self.stdout.write(self.style.WARNING('Feature store is empty. Run `manage.py rebuild_feature_store` first.'))
+            return
+
+        for user_id in user_ids:
+            self._generate(user_id)
+
+    def _generate(self, user_id):
+        self.stdout.write('Loading account features...')
+        store = FeatureStore(User.objects.filter(pk=user_id).first())
+        features_df = store.features()
 
         self.stdout.write('Running RiskEngine...')
-        engine = RiskEngine(data)
-        results = engine.analyze()
+        engine = RiskEngine()
+        results = engine.score_features(features_df)
+        accounts = {acc.account_id: acc for acc in Account.objects.filter(user_id=user_id)}
+        results = [res for res in results if res['accountId'] in accounts]
 
         self.stdout.write(f'Generated {len(results)} suspicious patterns. Saving alerts...')
         
@@ -35,16 +39,26 @@ class Command(BaseCommand):
             # Create an alert for each flagged account
             alerts_to_create.append(Alert(
                 alert_id=f"AL-{res['accountId']}-{timezone.now().strftime('%m%d%H%M')}",
-                account=Account.objects.get(account_id=res['accountId']),
+                account=accounts[res['accountId']],
+                user=store.user,
                 risk_score=res['riskScore'],
-                type=" + ".join(res['patterns']),
+                type=RiskEngine.PATTERN_SEPARATOR.join(res['patterns']),
+                typologies=RiskEngine.labels_mask(res['patterns']),
                 date=timezone.now().date(),
                 time=timezone.now().time(),
                 status='Open',
-                amount=f"₹{res['totalVolume']:,.2f}",
+                amount=to_minor(res['totalVolume']),
                 transactions_count=res['transactionCount'],
-                priority='Critical' if res['riskScore'] > 90 else 'High'
+                priority='Critical' if res['riskScore'] > 90 else 'High',
+                model_version=res['modelVersion'],
             ))
 
-        Alert.objects.bulk_create(alerts_to_create)
+        alerted = {alert.account_id for alert in alerts_to_create}
+        with transaction.atomic():
+            delta = summary.SummaryDelta().add_alerts(alerts_to_create)
+            if store.user:
+                delta.counters['flagged_accounts'] += len(alerted - summary.accounts_with_alerts(store.user, alerted))
+            Alert.objects.bulk_create(alerts_to_create)
+            if store.user:
+                summary.apply(store.user, delta)
         self.stdout.write(self.style.SUCCESS(f'Successfully generated {len(alerts_to_create)} alerts.'))
@@ -0,0 +1,32 @@
+import json
+from django.core.management.base import BaseCommand
+from dashboard.ml.synthetic import generate_transactions
+
+
+class Command(BaseCommand):
+    help = 'Write a synthetic upload (CSV) with planted structuring, mule and round-trip accounts'
+
+    def add_arguments(self, parser):
+        parser.add_argument('output', help='CSV file to write')
+        parser.add_argument('--rows', type=int, default=100000)
+        parser.add_argument('--accounts', type=int, help='Defaults to rows / 10')
+        parser.add_argument('--structuring', type=int, default=0, help='Accounts structuring deposits')
+        parser.add_argument('--mules', type=int, default=0, help='Accounts passing deposits straight on')
+        parser.add_argument('--round-trips', type=int, default=0, help='Rings of accounts cycling money back')
+        parser.add_argument('--days', type=int, default=30)
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--labels', help='Also write the planted account IDs per typology to this JSON file')
+
+    def handle(self, *args, **options):
+        df, planted = generate_transactions(
+            options['rows'], n_accounts=options['accounts'], structuring=options['structuring'],
+            mules=options['mules'], round_trips=options['round_trips'], days=options['days'], seed=options['seed'],
+        )
+        df.to_csv(options['output'], index=False)
+        if options['labels']:
+            with open(options['labels'], 'w') as f:
+                json.dump({typology: ids.tolist() for typology, ids in planted.items()}, f, indent=2)
+
+        counts = ', '.join(f"{typology} {len(ids)}" for typology, ids in planted.items())
+        self.stdout.write(f"Wrote {len(df)} rows for {df['account_id'].nunique()} accounts to {options['output']} "
+                          f"(planted: {counts})")
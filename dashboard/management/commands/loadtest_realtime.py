@@ -0,0 +1,76 @@
+import json
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+from dashboard.ml.realtime import RealtimeScorer, parse_transaction
+from dashboard.ml.synthetic import generate_transactions
+
+
+class Command(BaseCommand):
+    help = 'Load-test real-time transaction scoring and report p50/p99 latency and throughput'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=20000)
+        parser.add_argument('--accounts', type=int, default=2000)
+        parser.add_argument('--url', help='POST to this /api/score-transaction/ URL instead of scoring in-process')
+        parser.add_argument('--token', help='JWT access token for --url')
+        parser.add_argument('--concurrency', type=int, default=8, help='Parallel clients for --url')
+
+    def handle(self, *args, **options):
+        df, _ = generate_transactions(options['requests'], n_accounts=options['accounts'], normalized=True)
+        payloads = [
+            {'account_id': a, 'datetime': t.isoformat(), 'type': ty, 'amount': float(amt), 'related_account': r}
+            for a, t, ty, amt, r in zip(df['account_id'], df['datetime'], df['type'], df['amount'], df['related_account'])
+        ]
+
+        if options['url']:
+            latencies, errors, elapsed = self.run_http(payloads, options)
+        else:
+            latencies, errors, elapsed = self.run_in_process(payloads)
+
+        latencies = np.array(latencies) * 1000
+        self.stdout.write(f"requests {len(payloads)}  errors {errors}  accounts {options['accounts']}")
+        if len(latencies):
+            self.stdout.write(f"p50 {np.percentile(latencies, 50):.2f} ms  p99 {np.percentile(latencies, 99):.2f} ms  "
+                              f"max {latencies.max():.2f} ms")
+        self.stdout.write(f"throughput {len(payloads) / elapsed:,.0f} req/s")
+
+    def run_in_process(self, payloads):
+        """Parse and score each payload directly, without the HTTP and DRF overhead"""
+        scorer = RealtimeScorer()
+        scorer.score(*parse_transaction(payloads[0]))  # compile the model outside the timings
+        latencies = []
+        start = time.perf_counter()
+        for payload in payloads[1:]:
+            t0 = time.perf_counter()
+            scorer.score(*parse_transaction(payload))
+            latencies.append(time.perf_counter() - t0)
+        return latencies, 0, time.perf_counter() - start
+
+    def run_http(self, payloads, options):
+        headers = {'Content-Type': 'application/json'}
+        if options['token']:
+            headers['Authorization'] = f"Bearer {options['token']}"
+        if options['concurrency'] < 1:
+            raise CommandError("--concurrency must be at least 1")
+
+        def send(payload):
+            request = urllib.request.Request(options['url'], data=json.dumps(payload).encode(), headers=headers)
+            t0 = time.perf_counter()
+            try:
+                with urllib.request.urlopen(request, timeout=30) as response:
+                    response.read()
+                return time.perf_counter() - t0
+            except (urllib.error.URLError, OSError):
+                return None
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(options['concurrency']) as pool:
+            results = list(pool.map(send, payloads))
+        elapsed = time.perf_counter() - start
+        latencies = [r for r in results if r is not None]
+        return latencies, len(results) - len(latencies), elapsed
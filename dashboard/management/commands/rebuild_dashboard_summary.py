@@ -0,0 +1,35 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.forms.models import model_to_dict
+from dashboard import summary
+from dashboard.models import DashboardSummary
+
+FIELDS = summary.BREAKDOWNS + ['total_accounts', 'flagged_accounts', 'total_transactions', 'total_alerts',
+                               'suspicious_volume']
+
+
+class Command(BaseCommand):
+    help = 'Recompute the per-user dashboard summaries from the accounts, alerts and transactions tables'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help='Only rebuild this username (default: everyone)')
+
+    def handle(self, *args, **options):
+        if options['user']:
+            users = User.objects.filter(username=options['user'])
+        else:
+            users = User.objects.all()
+
+        drifted = 0
+        for user in users.order_by('pk'):
+            old = DashboardSummary.objects.filter(user=user).first()
+            new = summary.rebuild(user)
+            if old is None:
+                continue
+            before, after = model_to_dict(old, FIELDS), model_to_dict(new, FIELDS)
+            changed = [name for name in FIELDS if before[name] != after[name]]
+            if changed:
+                drifted += 1
+                self.stdout.write(self.style.WARNING(f"{user.username}: repaired {', '.join(changed)}"))
+
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {users.count()} dashboard summaries ({drifted} had drifted).'))
@@ -0,0 +1,55 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Sum
+from dashboard.feature_store import FeatureStore, stored_transaction_chunks
+from dashboard.ml.streaming import StreamingFeatureAccumulator
+from dashboard.models import AccountFeatureState, FeatureStoreUpload, Transaction
+
+
+class Command(BaseCommand):
+    help = ('Rebuild per-account feature state from the transactions stored in the database. '
+            'Uploads only store evidence transactions, so it refuses to replace state built from them unless --force')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help='Only rebuild this username (default: everyone, including unowned accounts)')
+        parser.add_argument('--chunk-size', type=int, default=100000)
+        parser.add_argument('--force', action='store_true',
+                            help='Also replace state built from uploads, losing the transactions that were not stored')
+
+    def handle(self, *args, **options):
+        if options['user']:
+            users = [User.objects.get(username=options['user'])]
+        else:
+            users = [User.objects.filter(pk=pk).first() for pk in
+                     Transaction.objects.order_by().values_list('user', flat=True).distinct()]
+
+        # Uploads fold every row into the state but keep only a few evidence Transactions, so
+        # state that counts more transactions than the table holds can't be rebuilt from it
+        lossy = []
+        for user in users:
+            counted = AccountFeatureState.objects.filter(user=user).aggregate(n=Sum('transaction_count'))['n'] or 0
+            stored = Transaction.objects.filter(user=user).count()
+            if counted > stored:
+                lossy.append(f"{user.username if user else '(no user)'} ({counted} transactions, {stored} stored)")
+        if lossy and not options['force']:
+            raise CommandError(f"Feature state built from uploads would lose history: {', '.join(lossy)}. "
+                               f"Use --force to rebuild from the stored transactions anyway.")
+
+        for user in users:
+            accumulator = StreamingFeatureAccumulator()
+            # Replay the history in time order, one chunk at a time
+            transactions = Transaction.objects.filter(user=user).order_by('date_time')
+            for chunk in stored_transaction_chunks(transactions, options['chunk_size']):
+                accumulator.update(chunk)
+
+            state = accumulator.state()
+            with transaction.atomic():
+                AccountFeatureState.objects.filter(user=user).delete()
+                # The uploads are no longer part of the state, so uploading them again applies them
+                FeatureStoreUpload.objects.filter(user=user).delete()
+                FeatureStore(user).save(state)
+            name = user.username if user else '(no user)'
+            self.stdout.write(f'{name}: {accumulator.total_rows} transactions, {len(state)} accounts')
+
+        self.stdout.write(self.style.SUCCESS('Feature store rebuilt.'))
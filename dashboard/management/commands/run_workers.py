@@ -0,0 +1,100 @@
+import multiprocessing
+import os
+import signal
+import socket
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+
+def _worker_entry(worker_id, stop_event, poll_interval, lease):
+    # Runs in a child process. Imports happen here so the module also works with the
+    # 'spawn' start method (Windows/macOS), where Django has to be set up again.
+    import django
+    django.setup()
+    from django.db import connections
+    from dashboard.jobs import run_worker
+
+    # Ctrl-C goes to the whole process group; let the parent decide when we stop
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    try:
+        run_worker(worker_id, stop_event, poll_interval, lease)
+    finally:
+        connections.close_all()
+
+
+class Command(BaseCommand):
+    help = 'Run a pool of worker processes that claim and process queued upload tasks'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=getattr(settings, 'AML_WORKER_PROCESSES', 2))
+        parser.add_argument('--lease', type=int, default=getattr(settings, 'AML_WORKER_LEASE_SECONDS', 300),
+                            help='Seconds before a silent worker\'s task is considered orphaned')
+        parser.add_argument('--poll', type=float, default=2.0, help='Seconds between queue polls when idle')
+
+    def handle(self, *args, **options):
+        from django.db import connections
+        from dashboard.jobs import recover_orphaned_tasks
+
+        requeued, failed = recover_orphaned_tasks()
+        self.stdout.write(f'Recovered orphaned tasks: {requeued} re-queued, {failed} failed')
+        # Children open their own connections
+        connections.close_all()
+
+        ctx = multiprocessing.get_context()
+        stop_event = ctx.Event()
+        prefix = f"{socket.gethostname()}-{os.getpid()}"
+        workers = {}
+
+        def start(slot):
+            proc = ctx.Process(
+                target=_worker_entry,
+                args=(f"{prefix}-w{slot}", stop_event, options['poll'], options['lease']),
+                name=f"aml-worker-{slot}",
+            )
+            proc.start()
+            workers[slot] = proc
+
+        # Only flip a plain flag in the handler; touching the multiprocessing Event here
+        # can deadlock against the main loop
+        stopping = []
+
+        def request_stop(signum, frame):
+            if stopping:
+                # Second signal: don't wait for in-flight tasks
+                for proc in workers.values():
+                    proc.terminate()
+            stopping.append(signum)
+
+        signal.signal(signal.SIGINT, request_stop)
+        signal.signal(signal.SIGTERM, request_stop)
+
+        for slot in range(options['processes']):
+            start(slot)
+        self.stdout.write(self.style.SUCCESS(f"Started {options['processes']} workers"))
+
+        last_recovery = time.monotonic()
+        while not stopping:
+            time.sleep(options['poll'])
+            if stopping:
+                break
+
+            # Replace crashed workers; their tasks come back via lease expiry
+            for slot, proc in list(workers.items()):
+                if not proc.is_alive():
+                    self.stdout.write(self.style.WARNING(f"Worker {slot} exited ({proc.exitcode}), restarting"))
+                    start(slot)
+
+            if time.monotonic() - last_recovery >= options['lease'] / 2:
+                requeued, failed = recover_orphaned_tasks()
+                connections.close_all()
+                if requeued or failed:
+                    self.stdout.write(f'Recovered orphaned tasks: {requeued} re-queued, {failed} failed')
+                last_recovery = time.monotonic()
+
+        self.stdout.write('Stopping workers after their current task...')
+        stop_event.set()
+        for proc in workers.values():
+            proc.join()
+        self.stdout.write(self.style.SUCCESS('All workers stopped'))
@@ -1,5 +1,7 @@
 from django.core.management.base import BaseCommand
-from dashboard.models import Account, Alert, Transaction
+from dashboard.models import Account, Alert, DashboardSummary, Transaction
+from dashboard.money import to_minor
+from dashboard.ml.risk_engine import RiskEngine
 from datetime import datetime, time
 
 class Command(BaseCommand):
@@ -10,6 +12,7 @@ class Command(BaseCommand):
         Alert.objects.all().delete()
         Transaction.objects.all().delete()
         Account.objects.all().delete()
+        DashboardSummary.objects.all().delete()
 
         # Create Account
         acc = Account.objects.create(
@@ -17,7 +20,7 @@ class Command(BaseCommand):
             name='Rajesh Kumar',
             type='Individual',
             open_date='2025-08-15',
-            avg_balance='₹245,000',
+            avg_balance=to_minor('₹245,000'),
             total_transactions=127,
             flagged_transactions=15,
             risk_history=[45, 52, 61, 73, 88, 95],
@@ -26,7 +29,7 @@ class Command(BaseCommand):
 
         # Create Alerts
         alerts_data = [
-            { 'id': 'AML-2026-001', 'accountId': 'ACC-45891', 'accountName': 'Rajesh Kumar', 'riskScore': 95, 'type': 'Money Mule + Structuring', 'date': '2026-01-24', 'time': '14:30', 'status': 'Open', 'amount': '₹8,750,000', 'transactions': 15, 'priority': 'Critical' },
+            { 'id': 'AML-2026-001', 'accountId': 'ACC-45891', 'accountName': 'Rajesh Kumar', 'riskScore': 95, 'type': 'Structuring, Money Mule', 'date': '2026-01-24', 'time': '14:30', 'status': 'Open', 'amount': '₹8,750,000', 'transactions': 15, 'priority': 'Critical' },
             { 'id': 'AML-2026-002', 'accountId': 'ACC-23456', 'accountName': 'Priya Sharma', 'riskScore': 92, 'type': 'High Volume', 'date': '2026-01-24', 'time': '12:15', 'status': 'Under Review', 'amount': '₹12,300,000', 'transactions': 8, 'priority': 'Critical' },
             { 'id': 'AML-2026-003', 'accountId': 'ACC-78923', 'accountName': 'Mohammed Ali', 'riskScore': 88, 'type': 'Round Trip', 'date': '2026-01-23', 'time': '16:45', 'status': 'Open', 'amount': '₹4,500,000', 'transactions': 12, 'priority': 'High' },
             { 'id': 'AML-2026-004', 'accountId': 'ACC-34567', 'accountName': 'Anita Desai', 'riskScore': 85, 'type': 'Structuring', 'date': '2026-01-23', 'time': '09:20', 'status': 'Closed', 'amount': '₹2,100,000', 'transactions': 9, 'priority': 'High' },
@@ -44,7 +47,7 @@ class Command(BaseCommand):
                         'name': a['accountName'],
                         'type': 'Individual',
                         'open_date': '2025-01-01',
-                        'avg_balance': '₹100,000',
+                        'avg_balance': to_minor('₹100,000'),
                         'total_transactions': 50,
                         'flagged_transactions': 5
                     }
@@ -55,10 +58,11 @@ class Command(BaseCommand):
                 account=account,
                 risk_score=a['riskScore'],
                 type=a['type'],
+                typologies=RiskEngine.labels_mask(a['type'].split(RiskEngine.PATTERN_SEPARATOR)),
                 date=a['date'],
                 time=a['time'],
                 status=a['status'],
-                amount=a['amount'],
+                amount=to_minor(a['amount']),
                 transactions_count=a['transactions'],
                 priority=a['priority']
             )
@@ -78,7 +82,7 @@ class Command(BaseCommand):
                 account=acc,
                 date_time=dt,
                 type=t['type'],
-                amount=t['amount'],
+                amount=to_minor(t['amount']),
                 related_account=t.get('to') or t.get('from'),
                 flag=t['flag']
             )
@@ -1,6 +1,8 @@
 import pandas as pd
 from django.core.management.base import BaseCommand
-from dashboard.models import Account, Alert, Transaction
+from dashboard.models import Account, AccountFeatureState, Alert, DashboardSummary, FeatureStoreUpload, Transaction
+from dashboard.ml.readers import iter_upload_chunks
+from dashboard.money import to_minor
 from django.utils.dateparse import parse_date, parse_time
 from datetime import datetime
 
@@ -12,58 +14,58 @@ class Command(BaseCommand):
         Alert.objects.all().delete()
         Transaction.objects.all().delete()
         Account.objects.all().delete()
+        DashboardSummary.objects.all().delete()
+        AccountFeatureState.objects.all().delete()
+        FeatureStoreUpload.objects.all().delete()
 
         self.stdout.write('Reading Excel file...')
-        df = pd.read_excel('aml_20000_transactions.xlsx')
-        
-        # Ensure correct types
-        df['amount'] = df['amount'].astype(str).str.replace('₹', '').str.replace(',', '').astype(float)
-        
-        self.stdout.write(f'Importing {len(df)} transactions...')
-        
-        accounts_to_create = {}
-        transactions_to_create = []
+        account_map = {}
+        imported = 0
 
-        for _, row in df.iterrows():
-            acc_id = str(row['account_id'])
-            if acc_id not in accounts_to_create:
-                accounts_to_create[acc_id] = Account(
-                    account_id=acc_id,
-                    name=f"Account {acc_id}",
-                    type='Savings', # Default
-                    open_date='2023-01-01', # Default
-                    avg_balance='₹0',
-                    total_transactions=0,
-                    flagged_transactions=0,
-                    risk_history=[],
-                    counterparties=[]
-                )
-            
-            # Parse date/time
-            dt_str = f"{row['date']} {row['time']}"
-            try:
-                dt = pd.to_datetime(dt_str)
-            except:
-                dt = datetime.now()
+        # Stream the workbook in chunks instead of loading the whole sheet
+        for df, fraction in iter_upload_chunks('aml_20000_transactions.xlsx', 50000):
+            # Ensure correct types
+            df['amount'] = df['amount'].astype(str).str.replace('₹', '').str.replace(',', '').astype(float)
 
-            transactions_to_create.append(Transaction(
-                account=accounts_to_create[acc_id],
-                date_time=dt,
-                type=row['type'],
-                amount=f"₹{row['amount']}",
-                related_account=str(row['related_account']) if not pd.isna(row['related_account']) else None,
-                flag=False
-            ))
+            accounts_to_create = {}
+            for acc_id in df['account_id'].astype(str).unique():
+                if acc_id not in account_map:
+                    accounts_to_create[acc_id] = Account(
+                        account_id=acc_id,
+                        name=f"Account {acc_id}",
+                        type='Savings', # Default
+                        open_date='2023-01-01', # Default
+                        avg_balance=0,
+                        total_transactions=0,
+                        flagged_transactions=0,
+                        risk_history=[],
+                        counterparties=[]
+                    )
 
-        self.stdout.write('Saving accounts...')
-        Account.objects.bulk_create(accounts_to_create.values())
-        
-        # Re-fetch accounts to get IDs for foreign keys
-        account_map = {acc.account_id: acc for acc in Account.objects.all()}
-        for txn in transactions_to_create:
-            txn.account = account_map[txn.account.account_id]
+            # Save this chunk's new accounts first and re-fetch them to get IDs for foreign keys
+            Account.objects.bulk_create(accounts_to_create.values())
+            account_map.update({acc.account_id: acc for acc in Account.objects.filter(account_id__in=list(accounts_to_create))})
 
-        self.stdout.write('Saving transactions...')
-        Transaction.objects.bulk_create(transactions_to_create)
+            transactions_to_create = []
+            for _, row in df.iterrows():
+                # Parse date/time
+                dt_str = f"{row['date']} {row['time']}"
+                try:
+                    dt = pd.to_datetime(dt_str)
+                except:
+                    dt = datetime.now()
 
-        self.stdout.write(self.style.SUCCESS(f'Successfully seeded {len(accounts_to_create)} accounts and {len(transactions_to_create)} transactions.'))
+                transactions_to_create.append(Transaction(
+                    account=account_map[str(row['account_id'])],
+                    date_time=dt,
+                    type=row['type'],
+                    amount=to_minor(row['amount']),
+                    related_account=str(row['related_account']) if not pd.isna(row['related_account']) else None,
+                    flag=False
+                ))
+
+            Transaction.objects.bulk_create(transactions_to_create)
+            imported += len(transactions_to_create)
+            self.stdout.write(f'Imported {imported} transactions ({int(fraction * 100)}% of file)...')
+
+        self.stdout.write(self.style.SUCCESS(f'Successfully seeded {len(account_map)} accounts and {imported} transactions.'))
@@ -1,16 +1,102 @@
+import random
+import pandas as pd
+from django.conf import settings
 from django.core.management.base import BaseCommand
-from dashboard.models import Transaction
+from django.db.models import Exists, OuterRef
+from dashboard.feature_store import stored_transaction_chunks
+from dashboard.models import Account, Transaction
+from dashboard.money import MINOR_UNITS
+from dashboard.ml.graph import CounterpartyGraph
 from dashboard.ml.risk_engine import RiskEngine
+from dashboard.ml.streaming import StreamingFeatureAccumulator
+
+
+def reservoir_sample(items, k, rng):
+    """Uniform sample of k items from an iterable of unknown length, holding only k at a time"""
+    sample = []
+    for i, item in enumerate(items):
+        if i < k:
+            sample.append(item)
+        else:
+            j = rng.randrange(i + 1)
+            if j < k:
+                sample[j] = item
+    return sample
+
 
 class Command(BaseCommand):
-    help = 'Train the Isolation Forest model on all transactions in the database'
+    help = 'Train the Isolation Forest model on the transactions in the database'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sample-accounts', type=int,
+                            default=getattr(settings, 'AML_TRAINING_SAMPLE_ACCOUNTS', 100000),
+                            help='Accounts to fit on, drawn uniformly from every account with transactions')
+        parser.add_argument('--chunk-size', type=int, default=100000, help='Transactions read per query chunk')
+        parser.add_argument('--fold-every', type=int, default=10,
+                            help='Chunks between compacting the accumulator to per-account state')
+        parser.add_argument('--seed', type=int, help='Seed for the account sample')
+        parser.add_argument('--in-memory', action='store_true',
+                            help='Load every transaction at once and train on all accounts (needs RAM for all rows)')
 
-    def handle(self, *args, **kwargs):
+    def handle(self, *args, **options):
+        if options['in_memory']:
+            self.train_in_memory()
+        else:
+            self.train_streaming(options)
+
+    def train_streaming(self, options):
+        """
+        Fit on a reservoir sample of accounts, replaying their transactions in time order
+        through a StreamingFeatureAccumulator. Every `fold_every` chunks the accumulator is
+        compacted to per-account state (as the feature store does between uploads), so
+        memory depends on the sample size and chunk size, not on how many rows are stored.
+
+        Cycles run through accounts whatever the sample, so every account's transfers go
+        into one counterparty graph, compacted at the same points to the last cycle window;
+        only the sampled accounts get feature rows. The sample is drawn from the Account
+        table, so the transactions themselves are read once.
+        """
+        self.stdout.write('Sampling accounts...')
+        with_transactions = Exists(Transaction.objects.filter(account=OuterRef('pk')))
+        accounts = Account.objects.filter(with_transactions).order_by().values_list('account_id', flat=True).distinct()
+        sample = reservoir_sample(accounts.iterator(chunk_size=options['chunk_size']), options['sample_accounts'],
+                                  random.Random(options['seed']))
+        if not sample:
+            self.stdout.write(self.style.WARNING('No transactions found in database. Please seed data first.'))
+            return
+
+        self.stdout.write(f'Streaming transactions for {len(sample)} sampled accounts...')
+        sampled = pd.Index(sample)
+        accumulator = StreamingFeatureAccumulator()
+        graph = CounterpartyGraph()
+        n_transactions = 0
+        transactions = Transaction.objects.order_by('date_time')
+        for i, chunk in enumerate(stored_transaction_chunks(transactions, options['chunk_size']), start=1):
+            graph.add_transactions(chunk)
+            chunk = chunk[sampled.get_indexer(chunk['account_id']) >= 0]
+            accumulator.update(chunk)
+            n_transactions += len(chunk)
+            if i % options['fold_every'] == 0:
+                state = accumulator.state()
+                accumulator = StreamingFeatureAccumulator()
+                accumulator.seed(state)
+                graph.compact()
+
+        features = accumulator.features()
+        cycles = graph.cycle_features().reindex(features.index).fillna(0)
+        features['cycle_count'] = cycles['cycle_count'].astype('int64')
+        features['cycle_volume'] = cycles['cycle_volume']
+        self.stdout.write(f'Training model on {len(features)} accounts ({n_transactions} transactions)...')
+        engine = RiskEngine()
+        engine.fit_features(features, sampled_accounts=len(features), n_transactions=n_transactions)
+        self.stdout.write(self.style.SUCCESS(f'Model {engine.model_version} trained and published successfully.'))
+
+    def train_in_memory(self):
         self.stdout.write('Fetching transactions for training...')
         txns = Transaction.objects.all().values(
             'account__account_id', 'date_time', 'type', 'amount', 'related_account'
         )
-        
+
         if not txns:
             self.stdout.write(self.style.WARNING('No transactions found in database. Please seed data first.'))
             return
@@ -23,7 +109,7 @@ class Command(BaseCommand):
                 'date': t['date_time'].strftime('%Y-%m-%d'),
                 'time': t['date_time'].strftime('%H:%M:%S'),
                 'type': t['type'],
-                'amount': t['amount'],
+                'amount': t['amount'] / MINOR_UNITS,
                 'related_account': t['related_account']
             })
 
@@ -31,4 +117,4 @@ class Command(BaseCommand):
         engine = RiskEngine()
         engine.train(data)
 
-        self.stdout.write(self.style.SUCCESS('Model trained and saved successfully.'))
+        self.stdout.write(self.style.SUCCESS(f'Model {engine.model_version} trained and published successfully.'))
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-17 23:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0004_alter_account_account_id_alter_alert_alert_id_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='processingtask',
+            name='file_path',
+            field=models.CharField(blank=True, max_length=500, null=True),
+        ),
+        migrations.AddField(
+            model_name='processingtask',
+            name='file_size',
+            field=models.BigIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-17 23:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0006_processingtask_lease'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='processingtask',
+            name='cache_hits',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='processingtask',
+            name='cache_misses',
+            field=models.IntegerField(default=0),
+        ),
+    ]
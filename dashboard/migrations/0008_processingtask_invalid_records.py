@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 23:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0007_processingtask_cache_counts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='processingtask',
+            name='invalid_records',
+            field=models.IntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.18 on 2026-10-18 00:34
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0008_processingtask_invalid_records'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AccountFeatureState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('account_id', models.CharField(max_length=20)),
+                ('total_volume', models.FloatField(default=0)),
+                ('transaction_count', models.IntegerField(default=0)),
+                ('structuring_count', models.IntegerField(default=0)),
+                ('mule_score', models.IntegerField(default=0)),
+                ('cycle_count', models.IntegerField(default=0)),
+                ('cycle_volume', models.FloatField(default=0)),
+                ('dated_count', models.IntegerField(default=0)),
+                ('first_datetime', models.DateTimeField(blank=True, null=True)),
+                ('last_datetime', models.DateTimeField(blank=True, null=True)),
+                ('last_type', models.CharField(blank=True, max_length=50, null=True)),
+                ('last_amount', models.FloatField(default=0)),
+                ('peaks', models.JSONField(default=dict)),
+                ('recent', models.JSONField(default=list)),
+                ('counterparties', models.JSONField(default=dict)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='feature_states', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('user', 'account_id')},
+            },
+        ),
+    ]
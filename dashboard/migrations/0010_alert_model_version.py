@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 00:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0009_accountfeaturestate'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='alert',
+            name='model_version',
+            field=models.CharField(blank=True, max_length=50, null=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0010_alert_model_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='alert',
+            name='network_risk_score',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+    ]
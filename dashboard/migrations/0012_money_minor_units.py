@@ -0,0 +1,44 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0011_alert_network_risk_score'),
+    ]
+
+    operations = [
+        # Nullable, so they can be dropped (and re-added by a reverse migration) after the backfill
+        migrations.AlterField(
+            model_name='account',
+            name='avg_balance',
+            field=models.CharField(blank=True, max_length=50, null=True),
+        ),
+        migrations.AlterField(
+            model_name='alert',
+            name='amount',
+            field=models.CharField(blank=True, max_length=50, null=True),
+        ),
+        migrations.AlterField(
+            model_name='transaction',
+            name='amount',
+            field=models.CharField(blank=True, max_length=50, null=True),
+        ),
+        migrations.AddField(
+            model_name='account',
+            name='avg_balance_minor',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='alert',
+            name='amount_minor',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='transaction',
+            name='amount_minor',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+    ]
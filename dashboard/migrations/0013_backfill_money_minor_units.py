@@ -0,0 +1,75 @@
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+
+from django.db import migrations, transaction
+
+# Rows per read and bulk_update; each chunk commits on its own so big tables don't hold one long transaction
+CHUNK_SIZE = 5000
+MONEY_FIELDS = [('Account', 'avg_balance'), ('Alert', 'amount'), ('Transaction', 'amount')]
+
+
+def to_minor(text):
+    # Frozen copy of dashboard.money.to_minor; unparseable strings become 0
+    cleaned = str(text or '')
+    for junk in ('₹', '$', ',', ' '):
+        cleaned = cleaned.replace(junk, '')
+    try:
+        amount = Decimal(cleaned)
+    except InvalidOperation:
+        return 0, True
+    if not amount.is_finite():
+        return 0, True
+    return int((amount * 100).quantize(Decimal(1), rounding=ROUND_HALF_UP)), False
+
+
+def format_minor(minor):
+    whole, fraction = divmod(abs(minor or 0), 100)
+    sign = '-' if (minor or 0) < 0 else ''
+    return f"{sign}₹{whole:,}.{fraction:02d}" if fraction else f"{sign}₹{whole:,}"
+
+
+def backfill(apps, schema_editor):
+    for model_name, field in MONEY_FIELDS:
+        model = apps.get_model('dashboard', model_name)
+        last_pk, updated, unparseable = 0, 0, 0
+        while True:
+            rows = list(model.objects.filter(pk__gt=last_pk).order_by('pk').values_list('pk', field)[:CHUNK_SIZE])
+            if not rows:
+                break
+            objs = []
+            for pk, text in rows:
+                minor, bad = to_minor(text)
+                unparseable += bad
+                objs.append(model(pk=pk, **{f'{field}_minor': minor}))
+            with transaction.atomic():
+                model.objects.bulk_update(objs, [f'{field}_minor'], batch_size=1000)
+            last_pk = rows[-1][0]
+            updated += len(rows)
+        if updated:
+            print(f"\n  {model_name}.{field}: {updated} rows backfilled, {unparseable} unparseable set to 0", end='')
+
+
+def restore(apps, schema_editor):
+    for model_name, field in MONEY_FIELDS:
+        model = apps.get_model('dashboard', model_name)
+        last_pk = 0
+        while True:
+            rows = list(model.objects.filter(pk__gt=last_pk).order_by('pk').values_list('pk', f'{field}_minor')[:CHUNK_SIZE])
+            if not rows:
+                break
+            objs = [model(pk=pk, **{field: format_minor(minor)}) for pk, minor in rows]
+            with transaction.atomic():
+                model.objects.bulk_update(objs, [field], batch_size=1000)
+            last_pk = rows[-1][0]
+
+
+class Migration(migrations.Migration):
+    # Chunks commit separately; rerunning is safe since every row is recomputed from the string
+    atomic = False
+
+    dependencies = [
+        ('dashboard', '0012_money_minor_units'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill, restore),
+    ]
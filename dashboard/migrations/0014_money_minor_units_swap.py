@@ -0,0 +1,55 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0013_backfill_money_minor_units'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='account',
+            name='avg_balance',
+        ),
+        migrations.RemoveField(
+            model_name='alert',
+            name='amount',
+        ),
+        migrations.RemoveField(
+            model_name='transaction',
+            name='amount',
+        ),
+        migrations.RenameField(
+            model_name='account',
+            old_name='avg_balance_minor',
+            new_name='avg_balance',
+        ),
+        migrations.RenameField(
+            model_name='alert',
+            old_name='amount_minor',
+            new_name='amount',
+        ),
+        migrations.RenameField(
+            model_name='transaction',
+            old_name='amount_minor',
+            new_name='amount',
+        ),
+        migrations.AlterField(
+            model_name='account',
+            name='avg_balance',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AlterField(
+            model_name='alert',
+            name='amount',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AlterField(
+            model_name='transaction',
+            name='amount',
+            field=models.BigIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:07
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0015_dashboard_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='alert',
+            name='alert_user_type_idx',
+        ),
+        migrations.AddField(
+            model_name='alert',
+            name='typologies',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='alert',
+            index=models.Index(fields=['user', 'typologies'], name='alert_user_typologies_idx'),
+        ),
+    ]
@@ -0,0 +1,45 @@
+import re
+
+from django.db import migrations, transaction
+
+CHUNK_SIZE = 5000
+# Frozen copy of the labels of RiskEngine.PATTERNS; bit i is PATTERNS[i]
+PATTERN_LABELS = ['High Volume', 'Structuring', 'Money Mule', 'Round Trip', 'Fan-In', 'Fan-Out', 'Anomalous Behavior']
+
+
+def parse_type(text):
+    """(bitmask, canonical type string) of an Alert.type joined with ", " or " + " (generate_alerts used both)"""
+    labels = [label.strip() for label in re.split(r'[,+]', text or '') if label.strip()]
+    known = [label for label in PATTERN_LABELS if label in labels]
+    unknown = [label for label in dict.fromkeys(labels) if label not in PATTERN_LABELS]
+    mask = sum(1 << PATTERN_LABELS.index(label) for label in known)
+    return mask, ', '.join(known + unknown)
+
+
+def backfill(apps, schema_editor):
+    Alert = apps.get_model('dashboard', 'Alert')
+    last_pk = 0
+    while True:
+        rows = list(Alert.objects.filter(pk__gt=last_pk).order_by('pk').values_list('pk', 'type')[:CHUNK_SIZE])
+        if not rows:
+            break
+        objs = []
+        for pk, text in rows:
+            mask, canonical = parse_type(text)
+            objs.append(Alert(pk=pk, typologies=mask, type=canonical))
+        with transaction.atomic():
+            Alert.objects.bulk_update(objs, ['typologies', 'type'], batch_size=1000)
+        last_pk = rows[-1][0]
+
+
+class Migration(migrations.Migration):
+    # Chunks commit separately; rerunning recomputes every row from its type string
+    atomic = False
+
+    dependencies = [
+        ('dashboard', '0016_alert_typologies'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:09
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0017_backfill_alert_typologies'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DashboardSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total_accounts', models.IntegerField(default=0)),
+                ('flagged_accounts', models.IntegerField(default=0)),
+                ('total_transactions', models.BigIntegerField(default=0)),
+                ('total_alerts', models.IntegerField(default=0)),
+                ('suspicious_volume', models.BigIntegerField(default=0)),
+                ('daily_alerts', models.JSONField(default=dict)),
+                ('typologies', models.JSONField(default=dict)),
+                ('priorities', models.JSONField(default=dict)),
+                ('statuses', models.JSONField(default=dict)),
+                ('account_types', models.JSONField(default=dict)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='dashboard_summary', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
@@ -0,0 +1,24 @@
+import time
+
+
+def timed(fn, *args, **kwargs):
+    """Run fn once and return (result, seconds)"""
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def reset_peak_rss():
+    """Restart the kernel's peak-RSS counter from the current RSS (Linux only)"""
+    with open('/proc/self/clear_refs', 'w') as f:
+        f.write('5')
+
+
+def rss_mb():
+    """(current, peak) resident set size of this process in MB, from /proc (Linux only)"""
+    sizes = {}
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith(('VmRSS:', 'VmHWM:')):
+                sizes[line.split(':')[0]] = int(line.split()[1]) / 1024
+    return sizes['VmRSS'], sizes['VmHWM']
@@ -0,0 +1,38 @@
+import numpy as np
+
+
+class ScoreCalibration:
+    """
+    Fixed mapping from Isolation Forest decision_function output to a 0-100 risk score,
+    fitted once on the training accounts and stored with the model.
+
+    `quantiles` are the training scores at evenly spaced ranks (0 = most anomalous).
+    Risk falls linearly with rank: the most anomalous training account maps to 100,
+    the model's contamination boundary to 50 and the most normal account to 0, so a
+    batch like the training data has about `contamination` of its accounts above 50.
+    Scores between knots are interpolated and scores outside the training range are
+    clipped, so an account gets the same risk score whatever else is in its batch.
+    """
+    N_QUANTILES = 1001
+
+    def __init__(self, quantiles, contamination):
+        self.quantiles = np.asarray(quantiles, dtype='float64')
+        self.contamination = float(contamination)
+        ranks = np.linspace(0, 1, len(self.quantiles))
+        c = self.contamination
+        self.risks = np.where(ranks <= c, 100 - 50 * ranks / c, 50 - 50 * (ranks - c) / (1 - c))
+
+    @classmethod
+    def fit(cls, scores, contamination):
+        return cls(np.quantile(scores, np.linspace(0, 1, cls.N_QUANTILES)), contamination)
+
+    def risk(self, scores):
+        """Integer risk scores (0-100) for an array of decision_function scores"""
+        return np.interp(scores, self.quantiles, self.risks).astype('int64')
+
+    def to_dict(self):
+        return {'quantiles': self.quantiles.tolist(), 'contamination': self.contamination}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['quantiles'], data['contamination']) if data else None
@@ -0,0 +1,123 @@
+"""
+Fan-in / fan-out features: many counterparties paying into one account (fan-in), or
+one account paying out to many (fan-out), within a 7-day window.
+
+Every (account, window) pair is a row of a sparse account x counterparty matrix per
+direction, holding the amount exchanged with each counterparty. Row nnz is then the
+number of distinct counterparties, and volumes and Herfindahl concentration come from
+row sums, all without a Python loop. Each account reports its busiest window per
+direction (the earliest one on ties):
+
+    fan_in_7d / fan_out_7d          distinct counterparties in that window
+    fan_*_concentration             Herfindahl index of their amounts (1.0 = a single one)
+    fan_in_ratio / fan_out_ratio    money moved the other way in the same window, relative
+                                    to the fan volume (~1 when the funds pass straight through)
+
+Windows are fixed 7-day buckets of epoch time, so a streamed account only has to
+recompute the windows its new transactions fall into (see `merge`).
+"""
+import numpy as np
+import pandas as pd
+from scipy.sparse import csr_matrix
+from .graph import CounterpartyGraph
+
+WINDOW_SECONDS = 7 * 86400
+DIRECTIONS = ('in', 'out')
+COLUMNS = [f'fan_{d}_{stat}' for d in DIRECTIONS for stat in ('7d', 'concentration', 'ratio')]
+# COLUMNS plus the window each direction's figures come from, kept in saved state
+STATE_COLUMNS = COLUMNS + [f'fan_{d}_window' for d in DIRECTIONS]
+
+
+def windows(df):
+    """7-day window number of every row; -1 for undated rows"""
+    seconds = df['datetime'].to_numpy(dtype='datetime64[s]').view('int64')
+    return np.where(df['datetime'].notna().to_numpy(), seconds // WINDOW_SECONDS, -1)
+
+
+def fan_features(df, accounts=None, counterparties=None):
+    """
+    STATE_COLUMNS per account for a normalized frame (see RiskEngine.prepare_frame),
+    indexed by account_id. Accounts without dated, linked transactions are omitted.
+
+    `accounts` / `counterparties` take the (codes, uniques) of pd.factorize on
+    account_id / related_account when the caller already has them.
+    """
+    account, accounts = accounts if accounts is not None else pd.factorize(df['account_id'])
+    related, counterparties = counterparties if counterparties is not None else pd.factorize(df['related_account'])
+    window = windows(df)
+    # Transfers to oneself, compared on the (few) distinct IDs rather than per row
+    own = np.append(pd.Index(accounts).get_indexer(counterparties), -2)[related] == account
+    keep = (account >= 0) & (related >= 0) & (window >= 0) & ~own
+    if not keep.any():
+        return pd.DataFrame(columns=STATE_COLUMNS, index=pd.Index([], name='account_id'))
+
+    type_codes, types = pd.factorize(df['type'])
+    inflow_types = np.append(pd.Index(types).astype(str).str.lower().isin(CounterpartyGraph.INFLOW_TYPES), False)
+    inflow = inflow_types[type_codes][keep]
+    account, related, window = account[keep], related[keep], window[keep]
+    # Paise keep volumes exact however the rows are grouped or ordered
+    paise = np.round(df['amount'].to_numpy(dtype='float64')[keep] * 100).astype('int64')
+
+    # Rows of the matrices: (account, window) pairs, sorted by account then window
+    span = int(window.max() - window.min()) + 1
+    keys, row = np.unique(account.astype('int64') * span + (window - window.min()), return_inverse=True)
+    key_account, key_window = keys // span, keys % span + window.min()
+
+    stats = {}
+    for direction, mask in zip(DIRECTIONS, (inflow, ~inflow)):
+        # Duplicate (row, counterparty) entries are summed; zero amounts still count as a counterparty
+        matrix = csr_matrix((paise[mask], (row[mask], related[mask])), shape=(len(keys), related.max() + 1))
+        matrix.sum_duplicates()
+        squares = matrix.copy()
+        squares.data = matrix.data.astype('float64') ** 2
+        stats[direction] = (np.diff(matrix.indptr), np.asarray(matrix.sum(axis=1)).ravel(),
+                            np.asarray(squares.sum(axis=1)).ravel())
+
+    # Each direction's figures land on the account's code; accounts with neither are dropped
+    features = {column: np.zeros(len(accounts), dtype='int64' if column.endswith(('_7d', '_window')) else 'float64')
+                for column in STATE_COLUMNS}
+    for direction, other in zip(DIRECTIONS, reversed(DIRECTIONS)):
+        counts, volume, squares = stats[direction]
+        # Busiest window per account, earliest first on ties
+        candidates = np.flatnonzero(counts > 0)
+        order = np.lexsort((key_window[candidates], -counts[candidates], key_account[candidates]))
+        ranked = candidates[order]
+        first = np.ones(len(ranked), dtype=bool)
+        first[1:] = key_account[ranked][1:] != key_account[ranked][:-1]
+        best = ranked[first]
+
+        fan_volume = volume[best].astype('float64')
+        concentration = np.divide(squares[best], fan_volume ** 2, out=np.zeros(len(best)), where=fan_volume > 0)
+        ratio = np.divide(stats[other][1][best], fan_volume, out=np.zeros(len(best)), where=fan_volume > 0)
+        codes = key_account[best]
+        features[f'fan_{direction}_7d'][codes] = counts[best]
+        features[f'fan_{direction}_concentration'][codes] = concentration.round(4)
+        features[f'fan_{direction}_ratio'][codes] = ratio.round(4)
+        features[f'fan_{direction}_window'][codes] = key_window[best]
+
+    present = np.flatnonzero((features['fan_in_7d'] > 0) | (features['fan_out_7d'] > 0))
+    return pd.DataFrame({column: values[present] for column, values in features.items()},
+                        index=pd.Index(accounts.take(present), name='account_id'))
+
+
+def merge(previous, update):
+    """
+    Fold the fan features of the windows a chunk touched (`update`, from fan_features
+    over those windows' complete rows) into the running per-account state. A window
+    seen before replaces its own earlier figures; otherwise the busier window wins and
+    the earlier one on ties, so the result matches one batch pass over all rows.
+    """
+    if previous is None or previous.empty:
+        return update
+    if update.empty:
+        return previous
+    index = previous.index.union(update.index)
+    merged = previous.reindex(index)
+    update = update.reindex(index)
+    for direction in DIRECTIONS:
+        count, window = f'fan_{direction}_7d', f'fan_{direction}_window'
+        take = (update[count] > 0) & (merged[count].isna() | (update[window] == merged[window]) |
+                                      (update[count] > merged[count]))
+        columns = [c for c in STATE_COLUMNS if c.startswith(f'fan_{direction}_')]
+        merged.loc[take, columns] = update.loc[take, columns]
+    return merged.fillna(0)
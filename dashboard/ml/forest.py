@@ -0,0 +1,60 @@
+import numpy as np
+
+
+def average_path_length(n):
+    """Expected path length of an unsuccessful BST search among n samples (c(n) of the Isolation Forest paper)"""
+    n = np.asarray(n, dtype='float64')
+    harmonic = np.log(np.maximum(n - 1, 1)) + np.euler_gamma
+    return np.where(n <= 1, 0.0, np.where(n == 2, 1.0, 2 * harmonic - 2 * (n - 1) / np.maximum(n, 1)))
+
+
+class CompiledForest:
+    """
+    A fitted sklearn IsolationForest flattened into a few numpy arrays, for scoring one
+    row (or a handful) without sklearn's per-call validation and per-tree Python loop.
+
+    Every tree's nodes are packed into shared arrays with leaves pointing at themselves,
+    so all trees are walked together, one level per step, in max_depth vectorized steps.
+    Leaves carry their depth plus c(n_samples) up front. decision_function matches the
+    model's own (to float rounding) and is about a hundred times faster on a single row.
+    """
+
+    def __init__(self, model):
+        lefts, rights, features, thresholds, values, roots = [], [], [], [], [], []
+        offset, max_depth = 0, 0
+        for tree, tree_features in zip(model.estimators_, model.estimators_features_):
+            t = tree.tree_
+            leaf = t.children_left < 0
+            nodes = np.arange(t.node_count)
+            depth = np.zeros(t.node_count, dtype='float64')
+            # Children always come after their parent in sklearn's node order
+            for node in nodes[~leaf]:
+                depth[t.children_left[node]] = depth[t.children_right[node]] = depth[node] + 1
+
+            lefts.append(np.where(leaf, nodes, t.children_left) + offset)
+            rights.append(np.where(leaf, nodes, t.children_right) + offset)
+            features.append(np.asarray(tree_features)[np.where(leaf, 0, t.feature)])
+            thresholds.append(np.where(leaf, 0.0, t.threshold))
+            values.append(np.where(leaf, depth + average_path_length(t.n_node_samples), 0.0))
+            roots.append(offset)
+            offset += t.node_count
+            max_depth = max(max_depth, t.max_depth)
+
+        self.left, self.right = np.concatenate(lefts), np.concatenate(rights)
+        self.feature, self.threshold = np.concatenate(features), np.concatenate(thresholds)
+        self.value, self.roots = np.concatenate(values), np.array(roots)
+        self.max_depth = max_depth
+        self.n_features = model.n_features_in_
+        self.normalizer = len(model.estimators_) * float(average_path_length(model.max_samples_))
+        self.offset = model.offset_
+
+    def decision_function(self, X):
+        """Same as IsolationForest.decision_function, for a 1-D row or a 2-D array of rows"""
+        X = np.atleast_2d(np.asarray(X, dtype='float32')).astype('float64')  # trees split on float32 values
+        rows = np.arange(len(X))[:, None]
+        node = np.broadcast_to(self.roots, (len(X), len(self.roots)))
+        for _ in range(self.max_depth):
+            go_left = X[rows, self.feature[node]] <= self.threshold[node]
+            node = np.where(go_left, self.left[node], self.right[node])
+        depths = self.value[node].sum(axis=1)
+        return -(2 ** (-depths / self.normalizer)) - self.offset
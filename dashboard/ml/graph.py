@@ -0,0 +1,394 @@
+from datetime import timedelta
+import numpy as np
+import pandas as pd
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import connected_components
+
+
+class CounterpartyGraph:
+    """
+    Directed money-flow graph built from the `related_account` of each transaction.
+
+    Account IDs are integer-encoded as they arrive and edges are kept as flat numpy
+    arrays sorted by (source, time), i.e. a CSR adjacency with one entry per
+    transaction. Deposits flow from the counterparty into the account; every other
+    type flows out of the account to the counterparty.
+
+    `cycle_features` enumerates temporal cycles such as A->B->C->A: at most
+    `max_length` hops, each hop no earlier than the previous one, and the whole cycle
+    completed within `window` of its first transfer. Only edges inside a strongly
+    connected component can lie on a cycle, so everything else is dropped up front.
+    Paths are then extended breadth-first over all start edges at once, with the
+    closing hop looked up by (source, destination) instead of expanded, so the work is
+    vectorized and memory is bounded by `max_paths` partial paths at a time.
+
+    Transfers added with `history=True` (already scored in an earlier upload) only
+    help close cycles: a cycle is counted when at least one of its edges is new.
+
+    A transfer between two accounts that are both in the data shows up twice, as the
+    sender's withdrawal and the receiver's deposit. Both give the same edge, so edges
+    with the same (source, destination, time, amount) are merged into one before cycles
+    or risk are computed; the merged edge is new only if all of its copies are.
+
+    For transfers that arrive in time order, `compact` keeps the edge store bounded:
+    it moves the cycles found so far into running totals, the amounts of the dropped
+    transfers into per-pair totals for `network_risk`, and keeps only the last `window`
+    of transfers, as history, for cycles still to close. Transfers older than `horizon`
+    can't be added after that without missing cycles.
+
+    Dense hub accounts can have astronomically many cycles; enumeration stops after
+    `max_expansions` path extensions and sets `truncated`, making the counts lower
+    bounds.
+
+    `network_risk` spreads per-account risk over the same transfers (see there).
+    """
+    INFLOW_TYPES = ('deposit', 'credit', 'transfer in')
+    # Risk propagation: share of risk passed on per hop, convergence threshold, iteration cap
+    RISK_DAMPING = 0.85
+    RISK_TOLERANCE = 1e-6
+    RISK_MAX_ITERATIONS = 200
+
+    def __init__(self, max_length=4, window=timedelta(days=7), max_paths=250_000, max_expansions=200_000_000):
+        self.max_length = max_length
+        self.window = pd.Timedelta(window).value
+        self.max_paths = max_paths
+        self.max_expansions = max_expansions
+        self.total_cycles = 0
+        self.truncated = False
+        self.risk_iterations = 0
+
+        self._nodes = pd.Index([], dtype=object)
+        self._src, self._dst, self._time, self._amount, self._new = [], [], [], [], []
+        self._carried = None    # (cycle_count, cycle_volume, total_cycles) from compacted transfers
+        self._pair_totals = None    # (src, dst, total amount) per pair of compacted transfers
+        self.horizon = None         # oldest transfer time (ns) kept by the last compaction
+
+    @classmethod
+    def from_frame(cls, df, **kwargs):
+        graph = cls(**kwargs)
+        graph.add_transactions(df)
+        return graph
+
+    @property
+    def n_edges(self):
+        return sum(len(src) for src in self._src)
+
+    def add_transactions(self, df, history=False):
+        """Add the transfers in a normalized frame (see RiskEngine.prepare_frame)"""
+        # Work on integer codes of whole columns; masking the frame itself would copy every string
+        account, related = self._encode(df['account_id'], df['related_account'])
+        linked = (account >= 0) & (related >= 0) & (account != related) & df['datetime'].notna().to_numpy()
+        if not linked.any():
+            return
+        account, related = account[linked], related[linked]
+
+        type_codes, types = pd.factorize(df['type'])
+        inflow_types = np.append(pd.Index(types).astype(str).str.lower().isin(self.INFLOW_TYPES), False)
+        inflow = inflow_types[type_codes][linked]
+
+        self._src.append(np.where(inflow, related, account))
+        self._dst.append(np.where(inflow, account, related))
+        self._time.append(df['datetime'].to_numpy(dtype='datetime64[ns]').view('int64')[linked])
+        self._amount.append(df['amount'].to_numpy(dtype='float64')[linked])
+        self._new.append(np.full(len(account), not history))
+
+    def _encode(self, *columns):
+        """Integer node codes for each column of IDs (-1 where missing), extending the node index with new accounts"""
+        encoded = []
+        for column in columns:
+            codes, uniques = pd.factorize(column)
+            uniques = pd.Index(uniques).astype(str)
+            known = self._nodes.get_indexer(uniques)
+            unseen = known < 0
+            if unseen.any():
+                known[unseen] = len(self._nodes) + np.arange(unseen.sum())
+                self._nodes = self._nodes.append(pd.Index(np.asarray(uniques[unseen], dtype=object)))
+            # Code -1 (missing) picks the trailing -1
+            encoded.append(np.append(known, -1).astype('int32')[codes])
+        return encoded
+
+    def cycle_features(self):
+        """
+        Per-account cycle_count (cycles the account is on) and cycle_volume (amount the
+        account sent along those cycles), indexed by account ID. Accounts on no cycle
+        are omitted.
+        """
+        n_nodes = len(self._nodes)
+        self._cycle_count = np.zeros(n_nodes, dtype='int64')
+        self._cycle_volume = np.zeros(n_nodes, dtype='float64')
+        self.total_cycles = 0
+        self.truncated = False
+        self._expansions = 0
+
+        if self.n_edges:
+            self._build()
+            # Every cycle is rooted at its earliest edge, so each one is found exactly once
+            edges = np.arange(len(self._e_src), dtype='int32')
+            for start in range(0, len(edges), self.max_paths):
+                batch = edges[start:start + self.max_paths]
+                self._extend(
+                    nodes=np.column_stack([self._e_src[batch], self._e_dst[batch]]),
+                    path_edges=batch[:, None],
+                    last_rank=self._e_rank[batch],
+                    hi_rank=self._e_hi_rank[batch],
+                    fresh=self._e_new[batch],
+                )
+            if self.truncated:
+                print(f"Cycle detection stopped after {self.max_expansions:,} path extensions; "
+                      f"cycle counts are lower bounds")
+            self._release()
+
+        if self._carried is not None:
+            count, volume, total = self._carried
+            self._cycle_count[:len(count)] += count
+            self._cycle_volume[:len(volume)] += volume
+            self.total_cycles += total
+
+        found = self._cycle_count > 0
+        return pd.DataFrame({
+            'cycle_count': self._cycle_count[found],
+            'cycle_volume': self._cycle_volume[found].round(2),
+        }, index=pd.Index(self._nodes[found], name='account_id'))
+
+    def compact(self):
+        """
+        Count the cycles among the transfers so far into running totals and drop every
+        transfer more than `window` older than the newest one. Transfers added later
+        must be no older than `horizon`; each cycle is then counted once, as a cycle
+        closing later only uses kept transfers.
+        """
+        if not self.n_edges:
+            return
+        self.cycle_features()
+        self._carried = (self._cycle_count, self._cycle_volume, self.total_cycles)
+        src, dst, time, amount, _ = self._edges()
+        self.horizon = int(time.max()) - self.window
+        keep = time >= self.horizon
+        if self._pair_totals is not None:
+            dropped = [np.concatenate([carried, fresh[~keep]]) for carried, fresh in zip(self._pair_totals, (src, dst, amount))]
+        else:
+            dropped = [src[~keep], dst[~keep], amount[~keep]]
+        pairs, pair_id = np.unique(dropped[0].astype('int64') * len(self._nodes) + dropped[1], return_inverse=True)
+        self._pair_totals = ((pairs // len(self._nodes)).astype('int32'), (pairs % len(self._nodes)).astype('int32'),
+                             np.bincount(pair_id, weights=np.abs(dropped[2]), minlength=len(pairs)))
+        # Every cycle among the kept transfers is counted already
+        self._src, self._dst, self._time, self._amount = [src[keep]], [dst[keep]], [time[keep]], [amount[keep]]
+        self._new = [np.zeros(int(keep.sum()), dtype=bool)]
+
+    def _edges(self):
+        """(src, dst, time, amount, new) of every transfer, mirrored legs merged, in arrival order"""
+        src, dst = np.concatenate(self._src), np.concatenate(self._dst)
+        time, amount, new = np.concatenate(self._time), np.concatenate(self._amount), np.concatenate(self._new)
+        order = np.lexsort((amount, time, dst, src))
+        # First edge of each run of identical (src, dst, time, amount) in sorted order
+        first = np.zeros(len(order), dtype=bool)
+        first[0] = True
+        for column in (src, dst, time, amount):
+            ordered = column[order]
+            first[1:] |= ordered[1:] != ordered[:-1]
+        if first.all():
+            return src, dst, time, amount, new
+        starts = np.flatnonzero(first)
+        kept_new = np.logical_and.reduceat(new[order], starts)
+        kept = order[starts]
+        by_arrival = np.argsort(kept, kind='stable')
+        kept = kept[by_arrival]
+        return src[kept], dst[kept], time[kept], amount[kept], kept_new[by_arrival]
+
+    def _build(self):
+        n_nodes = len(self._nodes)
+        src, dst, time, amount, new = self._edges()
+
+        # An edge can only close a cycle if both ends are in the same strongly connected component
+        adjacency = csr_matrix((np.ones(len(src), dtype='int8'), (src, dst)), shape=(n_nodes, n_nodes))
+        _, component = connected_components(adjacency, directed=True, connection='strong')
+        del adjacency
+        cyclic = component[src] == component[dst]
+        src, dst, time, amount, new = src[cyclic], dst[cyclic], time[cyclic], amount[cyclic], new[cyclic]
+        del component, cyclic
+        n = len(src)
+
+        # Rank edges chronologically (ties by arrival) so "later hop" is a strict order
+        by_time = np.argsort(time, kind='stable')
+        rank = np.empty(n, dtype='int32')
+        rank[by_time] = np.arange(n)
+        # Last rank still inside each edge's window
+        hi_rank = (np.searchsorted(time[by_time], time + self.window, side='right') - 1).astype('int32')
+        del by_time, time
+
+        # CSR order for extending paths: by source node, then by time rank
+        keys = src.astype('int64') * n + rank
+        order = np.argsort(keys, kind='stable')
+        self._keys, self._adj_edge = keys[order], order.astype('int32')
+        del keys, order
+
+        # Same edges ordered by (source, destination) pair, then rank, for the closing hop
+        pairs, pair_id = np.unique(src.astype('int64') * n_nodes + dst, return_inverse=True)
+        pair_keys = pair_id * n + rank
+        del pair_id
+        order = np.argsort(pair_keys, kind='stable')
+        self._pairs, self._pair_keys, self._pair_edge = pairs, pair_keys[order], order.astype('int32')
+
+        # Partial paths hold node and edge IDs, so those (and ranks) are 32-bit; lookup keys stay 64-bit
+        self._e_src, self._e_dst, self._e_amount, self._e_new = src, dst, amount, new
+        self._e_rank, self._e_hi_rank = rank, hi_rank
+
+    def _release(self):
+        # Lookup structures of _build; the raw edge lists stay for later calls
+        self._keys = self._adj_edge = self._pairs = self._pair_keys = self._pair_edge = None
+        self._e_src = self._e_dst = self._e_amount = self._e_new = self._e_rank = self._e_hi_rank = None
+
+    def network_risk(self, seeds):
+        """
+        Risk reaching each account from its counterparties, 0-100, indexed by account ID
+        (every node of the graph, including counterparties that were never scored).
+
+        `seeds` maps account IDs to their own risk in [0, 1], e.g. high Isolation Forest
+        scores and 0 elsewhere. Transfers in either direction link two accounts, weighted
+        by the amount moved, and risk spreads as in personalized PageRank:
+
+            r = (1 - RISK_DAMPING) * seeds + RISK_DAMPING * W r
+
+        where W is the row-normalized adjacency matrix. Sparse matrix-vector products are
+        repeated until no account changes by more than RISK_TOLERANCE. An account's
+        network risk is the weighted risk of its neighbours (W r), so it measures who it
+        deals with, not its own score.
+        """
+        n_nodes = len(self._nodes)
+        if not self.n_edges:
+            return pd.Series(0, index=pd.Index(self._nodes, name='account_id'), dtype='int64', name='network_risk')
+
+        src, dst, _, amount, _ = self._edges()
+        amount = np.abs(amount)
+        if self._pair_totals is not None:
+            src, dst, amount = (np.concatenate([kept, carried]) for kept, carried in zip((src, dst, amount), self._pair_totals))
+        adjacency = csr_matrix((amount, (src, dst)), shape=(n_nodes, n_nodes))
+        del src, dst, amount
+        adjacency = (adjacency + adjacency.T).tocsr()
+        # Row-normalize in place; accounts that only moved zero amounts keep an empty row
+        degree = np.asarray(adjacency.sum(axis=1)).ravel()
+        scale = np.divide(1.0, degree, out=np.zeros(n_nodes), where=degree > 0)
+        adjacency.data *= np.repeat(scale, np.diff(adjacency.indptr))
+
+        seed = np.zeros(n_nodes)
+        codes = self._nodes.get_indexer(seeds.index)
+        seed[codes[codes >= 0]] = seeds.to_numpy(dtype='float64')[codes >= 0]
+
+        risk = seed
+        for self.risk_iterations in range(1, self.RISK_MAX_ITERATIONS + 1):
+            updated = (1 - self.RISK_DAMPING) * seed + self.RISK_DAMPING * (adjacency @ risk)
+            delta = np.abs(updated - risk).max()
+            risk = updated
+            if delta < self.RISK_TOLERANCE:
+                break
+        else:
+            print(f"Network risk did not converge in {self.RISK_MAX_ITERATIONS} iterations (last change {delta:.2e})")
+
+        neighbours = np.clip(np.round((adjacency @ risk) * 100), 0, 100).astype('int64')
+        return pd.Series(neighbours, index=pd.Index(self._nodes, name='account_id'), name='network_risk')
+
+    @staticmethod
+    def _search(keys, values, order, side='left'):
+        """np.searchsorted visiting the queries in `order`; sorted queries are several times faster"""
+        found = np.empty(len(values), dtype='int64')
+        found[order] = np.searchsorted(keys, values[order], side=side)
+        return found
+
+    @staticmethod
+    def _expand(lo, counts):
+        """Row index and array position for every element of the ranges [lo, lo + counts)"""
+        total = int(counts.sum())
+        rows = np.repeat(np.arange(len(lo)), counts)
+        offsets = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+        return rows, np.repeat(lo, counts) + offsets
+
+    def _extend(self, nodes, path_edges, last_rank, hi_rank, fresh):
+        """
+        Close and extend paths (nodes[:, 0] is the start, nodes[:, -1] the current node).
+        `fresh` marks paths that already use a new (non-history) edge.
+
+        Only the frontier itself stays alive while the next level runs; the lookup
+        temporaries live in _close/_grow and are freed when those return.
+        """
+        if self.truncated:
+            return
+
+        # 1. Closing hops: edges current -> start inside the rank range
+        self._close(nodes, path_edges, last_rank, hi_rank, fresh)
+
+        # 2. Extensions through one more intermediate account
+        hops = nodes.shape[1]
+        if hops >= self.max_length:
+            return
+        lo, counts = self._successors(nodes[:, -1], last_rank, hi_rank)
+        total = int(counts.sum())
+        if total == 0:
+            return
+
+        self._expansions += total
+        if self._expansions > self.max_expansions:
+            self.truncated = True
+            return
+
+        # Extend in slices of the frontier so each step stays below max_paths rows
+        cumulative = np.cumsum(counts)
+        a = 0
+        while a < len(nodes):
+            done = cumulative[a - 1] if a else 0
+            b = max(int(np.searchsorted(cumulative, done + self.max_paths, side='right')), a + 1)
+            grown = self._grow(nodes, path_edges, hi_rank, fresh, lo, counts, a, b)
+            if grown is not None:
+                self._extend(*grown)
+            a = b
+
+    def _close(self, nodes, path_edges, last_rank, hi_rank, fresh):
+        n_nodes, n_edges = len(self._nodes), len(self._e_src)
+        pair = nodes[:, -1].astype('int64') * n_nodes + nodes[:, 0]
+        order = np.argsort(pair)
+        pos = np.minimum(self._search(self._pairs, pair, order), len(self._pairs) - 1)
+        closable = self._pairs[pos] == pair
+        if not closable.any():
+            return
+        pid = np.where(closable, pos, 0)
+        lo = self._search(self._pair_keys, pid * n_edges + last_rank + 1, order)
+        hi = self._search(self._pair_keys, pid * n_edges + hi_rank, order, side='right')
+        counts = np.where(closable, np.maximum(hi - lo, 0), 0)
+        if counts.any():
+            path, at = self._expand(lo, counts)
+            closing = self._pair_edge[at]
+            counted = fresh[path] | self._e_new[closing]
+            path, closing = path[counted], closing[counted]
+            self._record(nodes[path], np.column_stack([path_edges[path], closing]))
+
+    def _successors(self, current, last_rank, hi_rank):
+        """(first position in the CSR order, count) of the edges each path can take next"""
+        n_edges = len(self._e_src)
+        current = current.astype('int64')
+        first = current * n_edges + last_rank + 1
+        order = np.argsort(first)
+        lo = self._search(self._keys, first, order)
+        hi = self._search(self._keys, current * n_edges + hi_rank, order, side='right')
+        return lo, np.maximum(hi - lo, 0)
+
+    def _grow(self, nodes, path_edges, hi_rank, fresh, lo, counts, a, b):
+        """Paths a..b extended by one edge, as arguments for _extend (None if none are left)"""
+        path, at = self._expand(lo[a:b], counts[a:b])
+        path += a
+        edge = self._adj_edge[at]
+        nxt = self._e_dst[edge]
+        # Simple cycles only: never revisit an account (the start is handled by _close)
+        visited = nodes[path]
+        keep = ~(visited == nxt[:, None]).any(axis=1)
+        if not keep.any():
+            return None
+        path, edge = path[keep], edge[keep]
+        return (np.column_stack([visited[keep], nxt[keep]]), np.column_stack([path_edges[path], edge]),
+                self._e_rank[edge], hi_rank[path], fresh[path] | self._e_new[edge])
+
+    def _record(self, cycle_nodes, cycle_edges):
+        # Edge j of a cycle leaves node j
+        n_nodes = len(self._cycle_count)
+        self.total_cycles += len(cycle_nodes)
+        self._cycle_count += np.bincount(cycle_nodes.ravel(), minlength=n_nodes)
+        self._cycle_volume += np.bincount(cycle_nodes.ravel(), weights=self._e_amount[cycle_edges.ravel()],
+                                          minlength=n_nodes)
@@ -0,0 +1,138 @@
+import hashlib
+import os
+import uuid
+from .risk_engine import RiskEngine
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # the cache is optional; uploads are simply parsed every time
+    pa = pq = None
+
+SCHEMA = pa.schema([
+    ('account_id', pa.string()),
+    ('datetime', pa.timestamp('ns')),
+    ('type', pa.string()),
+    ('amount', pa.float64()),
+    ('related_account', pa.string()),
+    ('parse_error', pa.bool_()),
+]) if pa is not None else None
+
+
+class ParsedUploadCache:
+    """
+    Parquet cache of normalized upload frames (the output of RiskEngine.prepare_frame),
+    keyed by the SHA-256 of the uploaded file. A repeat upload of the same file skips
+    CSV/Excel parsing and column normalization entirely.
+
+    Entries are written one row group per chunk, so cached files can be streamed back
+    in chunks too. Least-recently-used entries are evicted once the cache grows past
+    `max_bytes`.
+    """
+    def __init__(self, cache_dir, max_bytes):
+        self.cache_dir = str(cache_dir)
+        self.max_bytes = max_bytes
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    @classmethod
+    def from_settings(cls):
+        """The configured cache, or None when disabled or pyarrow isn't installed"""
+        from django.conf import settings
+        cache_dir = getattr(settings, 'AML_PARSE_CACHE_DIR', None)
+        if pa is None or not cache_dir:
+            return None
+        return cls(cache_dir, getattr(settings, 'AML_PARSE_CACHE_MAX_BYTES', 5 * 1024 ** 3))
+
+    @staticmethod
+    def content_key(file_path, block_size=1024 * 1024):
+        """Hash of the file contents plus the normalization version that produced the entry"""
+        digest = hashlib.sha256()
+        with open(file_path, 'rb') as f:
+            for block in iter(lambda: f.read(block_size), b''):
+                digest.update(block)
+        return f"{digest.hexdigest()}-v{RiskEngine.NORMALIZATION_VERSION}"
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.parquet")
+
+    def get(self, key):
+        """Path of the cached entry (marking it recently used), or None on a miss"""
+        path = self._path(key)
+        if not os.path.exists(path):
+            return None
+        os.utime(path)
+        return path
+
+    def read(self, key):
+        return pq.read_table(self._path(key)).to_pandas()
+
+    def read_chunks(self, key, chunk_size):
+        """Yield (normalized chunk, fraction read) like readers.iter_upload_chunks"""
+        parquet = pq.ParquetFile(self._path(key))
+        total, read = parquet.metadata.num_rows or 1, 0
+        for batch in parquet.iter_batches(batch_size=chunk_size):
+            read += batch.num_rows
+            yield batch.to_pandas(), min(read / total, 1.0)
+
+    def write(self, key, df):
+        with self.writer(key) as writer:
+            writer.write(df)
+
+    def writer(self, key):
+        return _EntryWriter(self, key)
+
+    def evict(self):
+        """Delete least-recently-used entries until the cache fits in max_bytes"""
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if name.endswith('.parquet'):
+                stat = os.stat(os.path.join(self.cache_dir, name))
+                entries.append((stat.st_mtime, stat.st_size, name))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.cache_dir, name))
+            except FileNotFoundError:
+                pass  # evicted by another worker
+            total -= size
+
+
+class _EntryWriter:
+    """
+    Writes normalized chunks to a temp file and publishes it atomically on success.
+    A chunk that can't be stored (e.g. tz-aware datetimes) abandons the entry but never
+    the upload itself.
+    """
+
+    def __init__(self, cache, key):
+        self.cache = cache
+        self.path = cache._path(key)
+        self.tmp_path = f"{self.path}.{uuid.uuid4().hex}.tmp"
+        self.failed = False
+        self._writer = None
+
+    def __enter__(self):
+        self._writer = pq.ParquetWriter(self.tmp_path, SCHEMA)
+        return self
+
+    def write(self, df):
+        if self.failed:
+            return
+        try:
+            table = pa.Table.from_pandas(df[RiskEngine.NORMALIZED_COLUMNS], schema=SCHEMA, preserve_index=False)
+            self._writer.write_table(table)
+        except (pa.ArrowException, ValueError, TypeError) as e:
+            print(f"Parse cache: not caching {os.path.basename(self.path)}: {e}")
+            self.failed = True
+
+    def __exit__(self, exc_type, exc, tb):
+        self._writer.close()
+        if exc_type is None and not self.failed:
+            os.replace(self.tmp_path, self.path)
+            self.cache.evict()
+        elif os.path.exists(self.tmp_path):
+            os.remove(self.tmp_path)
+        return False
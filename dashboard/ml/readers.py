@@ -0,0 +1,65 @@
+import os
+import pandas as pd
+
+# openpyxl can stream these; legacy .xls still goes through pd.read_excel
+STREAMABLE_EXCEL = ('.xlsx', '.xlsm')
+
+
+def iter_upload_chunks(file_path, chunk_size):
+    """
+    Yield (raw chunk, fraction of the file read so far) for an uploaded CSV or Excel file.
+    Chunks are raw frames; normalize them with RiskEngine.prepare_frame.
+    """
+    name = file_path.lower()
+    if name.endswith('.csv'):
+        yield from _iter_csv(file_path, chunk_size)
+    elif name.endswith(STREAMABLE_EXCEL):
+        yield from _iter_xlsx(file_path, chunk_size)
+    else:
+        yield pd.read_excel(file_path), 1.0
+
+
+def _iter_csv(file_path, chunk_size):
+    with open(file_path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size or 1
+        for chunk in pd.read_csv(f, chunksize=chunk_size):
+            yield chunk, min(f.tell() / size, 1.0)
+
+
+def _iter_xlsx(file_path, chunk_size):
+    """
+    Stream the first worksheet in openpyxl's read-only mode. Rows are parsed lazily from
+    the sheet XML, so memory stays flat and the first chunk is ready long before the
+    whole workbook has been read.
+    """
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        sheet = workbook.active
+        # Sheet dimensions come from the file and may be missing; progress is then unknown
+        total = (sheet.max_row or 0) - 1
+        rows = sheet.iter_rows(values_only=True)
+
+        header = next(rows, None)
+        if header is None:
+            return
+        header = [str(h) if h is not None else f"column_{i}" for i, h in enumerate(header)]
+        width = len(header)
+
+        batch, read = [], 0
+        for row in rows:
+            if all(value is None for value in row):
+                continue  # formatted but empty trailing rows
+            if len(row) != width:
+                row = row[:width] + (None,) * (width - len(row))
+            batch.append(row)
+            if len(batch) >= chunk_size:
+                read += len(batch)
+                yield pd.DataFrame.from_records(batch, columns=header), (min(read / total, 1.0) if total > 0 else 0.0)
+                batch = []
+
+        if batch:
+            yield pd.DataFrame.from_records(batch, columns=header), 1.0
+    finally:
+        workbook.close()
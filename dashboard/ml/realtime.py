@@ -0,0 +1,403 @@
+"""
+Scoring single transactions as they happen (see dashboard/realtime.py for the service).
+
+Each account keeps running aggregates, its transactions inside the widest rolling
+window and its counterparty counts, so a new transaction updates the account's
+features in O(1) amortized time instead of re-reading its history. The features are
+the ones RiskEngine.extract_features_vectorized computes from all of the account's
+rows, provided transactions arrive in time order. Cycles are found as they close:
+each transfer searches backwards over the last 7 days of transfers for a path from
+its destination back to its source.
+"""
+import heapq
+import math
+import threading
+from collections import deque
+from datetime import datetime, timezone
+
+import numpy as np
+
+from . import fan
+from .forest import CompiledForest
+from .graph import CounterpartyGraph
+from .registry import ModelNotFound, registry
+from .risk_engine import RiskEngine
+from .streaming import StreamingFeatureAccumulator
+from ..money import AMOUNT_JUNK
+
+WINDOWS = RiskEngine.WINDOWS
+CYCLE_WINDOW = WINDOWS['7d']
+
+
+def parse_transaction(data):
+    """
+    (account_id, epoch seconds or None, type, amount, related_account) from a request
+    payload with account_id, amount and either datetime or date (+ time). Raises
+    ValueError on anything unusable.
+    """
+    account_id = str(data.get('account_id') or '').strip()
+    if not account_id:
+        raise ValueError("account_id is required")
+
+    amount = data.get('amount')
+    if amount is None or amount == '':
+        raise ValueError("amount is required")
+    if isinstance(amount, str):
+        for junk in AMOUNT_JUNK:
+            amount = amount.replace(junk, '')
+    amount = float(amount)
+    if not math.isfinite(amount):
+        raise ValueError("amount must be a finite number")
+
+    stamp = data.get('datetime') or ' '.join(str(data[k]) for k in ('date', 'time') if data.get(k))
+    seconds = None
+    if stamp:
+        moment = datetime.fromisoformat(str(stamp))
+        if moment.tzinfo is not None:
+            # Stored and uploaded datetimes are naive UTC
+            moment = moment.astimezone(timezone.utc).replace(tzinfo=None)
+        seconds = int((moment - datetime(1970, 1, 1)).total_seconds())
+
+    related = data.get('related_account')
+    related = str(related).strip() if related not in (None, '') else None
+    return account_id, seconds, str(data.get('type') or 'Unknown'), amount, related
+
+
+class AccountState:
+    """One account's running features"""
+    __slots__ = ('paise', 'transaction_count', 'structuring_count', 'mule_score', 'last', 'counterparties',
+                 'round_trip_count', 'cycle_count', 'cycle_volume', 'windows', 'peaks', 'first', 'latest',
+                 'dated_count', 'fan_windows', 'fans')
+
+    def __init__(self):
+        self.paise = 0
+        self.transaction_count = 0
+        self.structuring_count = 0
+        self.mule_score = 0
+        self.last = None                # (seconds, type, amount) of the latest dated transaction
+        self.counterparties = {}        # counterparty -> transactions with it
+        self.round_trip_count = 0
+        self.cycle_count = 0
+        self.cycle_volume = 0.0
+        # Per rolling window: rows (seconds, paise, structuring) inside it, and their running sums
+        self.windows = {label: [deque(), 0, 0, 0] for label in WINDOWS}
+        self.peaks = dict.fromkeys(StreamingFeatureAccumulator.PEAK_COLUMNS, 0)
+        self.first = self.latest = None
+        self.dated_count = 0
+        # Open 7-day fan windows: window -> {direction: [{counterparty: paise}, volume, sum of squares]}
+        self.fan_windows = {}
+        self.fans = dict.fromkeys(fan.STATE_COLUMNS, 0)
+
+    def add(self, seconds, type_, amount, related, inflow, linked):
+        paise = round(amount * 100)
+        structuring = 45000 <= amount < 50000
+        self.paise += paise
+        self.transaction_count += 1
+        self.structuring_count += structuring
+        if related is not None:
+            n = self.counterparties.get(related, 0) + 1
+            self.counterparties[related] = n
+            self.round_trip_count += n == 2
+        if seconds is None:
+            return
+
+        if self.last is not None:
+            last_seconds, last_type, last_amount = self.last
+            self.mule_score += (type_ == 'Withdrawal' and last_type == 'Deposit' and seconds - last_seconds <= 86400
+                                and 0.95 * last_amount <= amount <= 1.05 * last_amount)
+        self.last = (seconds, type_, amount)
+        self.first = seconds if self.first is None else min(self.first, seconds)
+        self.latest = seconds if self.latest is None else max(self.latest, seconds)
+        self.dated_count += 1
+
+        self._slide((seconds, paise, structuring))
+        if linked:
+            self._add_fan(seconds, 'in' if inflow else 'out', related, paise)
+
+    def _slide(self, row):
+        """Each window covers (t - width, t] of the newest row"""
+        seconds = row[0]
+        for label, width in WINDOWS.items():
+            window = self.windows[label]
+            rows = window[0]
+            rows.append(row)
+            window[1] += 1
+            window[2] += row[1]
+            window[3] += row[2]
+            while rows[0][0] <= seconds - width:
+                _, paise, structuring = rows.popleft()
+                window[1] -= 1
+                window[2] -= paise
+                window[3] -= structuring
+            self.peaks[f'peak_count_{label}'] = max(self.peaks[f'peak_count_{label}'], window[1])
+            self.peaks[f'peak_volume_{label}'] = max(self.peaks[f'peak_volume_{label}'], window[2] / 100)
+        self.peaks['structuring_24h'] = max(self.peaks['structuring_24h'], self.windows['24h'][3])
+
+    def _add_fan(self, seconds, direction, related, paise):
+        window = seconds // fan.WINDOW_SECONDS
+        sides = self.fan_windows.get(window)
+        if sides is None:
+            sides = self.fan_windows[window] = {d: [{}, 0, 0] for d in fan.DIRECTIONS}
+            # Only the current window (and a late straggler's) can still change
+            for old in [w for w in self.fan_windows if w < window - 1]:
+                del self.fan_windows[old]
+        side = sides[direction]
+        before = side[0].get(related, 0)
+        side[0][related] = before + paise
+        side[1] += paise
+        side[2] += (before + paise) ** 2 - before ** 2
+
+        # Both directions of this window changed (the other one's ratio did), as in fan.merge
+        for direction, other in zip(fan.DIRECTIONS, reversed(fan.DIRECTIONS)):
+            counterparties, volume, squares = sides[direction]
+            count = len(counterparties)
+            stored = self.fans[f'fan_{direction}_7d']
+            if count and (not stored or self.fans[f'fan_{direction}_window'] == window or count > stored):
+                self.fans[f'fan_{direction}_7d'] = count
+                # np.round, not round(): same results as the batch path's rounding
+                self.fans[f'fan_{direction}_concentration'] = float(np.round(squares / volume ** 2, 4)) if volume else 0.0
+                self.fans[f'fan_{direction}_ratio'] = float(np.round(sides[other][1] / volume, 4)) if volume else 0.0
+                self.fans[f'fan_{direction}_window'] = window
+
+    def features(self):
+        """The account's features as a dict (FEATURE_COLUMNS plus transaction_count)"""
+        burst_rate = 0.0
+        if self.dated_count:
+            hours = max((self.latest - self.first) / 3600, 1)
+            burst_rate = float(np.round(self.peaks['peak_count_1h'] / (self.dated_count / hours), 4))
+        return {
+            'total_volume': self.paise / 100,
+            'transaction_count': self.transaction_count,
+            'structuring_count': self.structuring_count,
+            'mule_score': self.mule_score,
+            'round_trip_count': self.round_trip_count,
+            'cycle_count': self.cycle_count,
+            'cycle_volume': float(np.round(self.cycle_volume, 2)),
+            **self.peaks,
+            'burst_rate': burst_rate,
+            **{column: self.fans[column] for column in fan.COLUMNS},
+        }
+
+    @classmethod
+    def from_state(cls, row):
+        """Rebuild from a saved feature-store state row (see StreamingFeatureAccumulator.state)"""
+        state = cls()
+        state.paise = round(float(row['total_volume']) * 100)
+        state.transaction_count = int(row['transaction_count'])
+        state.structuring_count = int(row['structuring_count'])
+        state.mule_score = int(row['mule_score'])
+        state.cycle_count = int(row['cycle_count'])
+        state.cycle_volume = float(row['cycle_volume'])
+        state.counterparties = {str(k): int(v) for k, v in row['counterparties'].items()}
+        state.round_trip_count = sum(n > 1 for n in state.counterparties.values())
+        state.peaks = {column: float(row[column]) for column in state.peaks}
+        state.fans = {column: float(row[column]) for column in fan.STATE_COLUMNS}
+
+        state.dated_count = int(row['dated_count'])
+        if state.dated_count:
+            state.first = int(row['first_datetime'].timestamp())
+            state.latest = int(row['last_datetime'].timestamp())
+            state.last = (state.latest, row['last_type'], float(row['last_amount']))
+
+        # Saved recent rows refill the windows and the current fan window
+        for seconds, amount, type_, related in row['recent']:
+            paise = round(amount * 100)
+            for label, width in WINDOWS.items():
+                if seconds > state.latest - width:
+                    window = state.windows[label]
+                    window[0].append((seconds, paise, 45000 <= amount < 50000))
+                    window[1] += 1
+                    window[2] += paise
+                    window[3] += 45000 <= amount < 50000
+            if related is not None and related != row.name and seconds // fan.WINDOW_SECONDS == state.latest // fan.WINDOW_SECONDS:
+                sides = state.fan_windows.setdefault(seconds // fan.WINDOW_SECONDS, {d: [{}, 0, 0] for d in fan.DIRECTIONS})
+                side = sides['in' if RealtimeScorer.is_inflow(type_) else 'out']
+                before = side[0].get(related, 0)
+                side[0][related] = before + paise
+                side[1] += paise
+                side[2] += (before + paise) ** 2 - before ** 2
+        return state
+
+
+class RealtimeScorer:
+    """
+    Running state for every account seen, plus the last CYCLE_WINDOW of transfers
+    indexed by destination for cycle detection. `score` is thread-safe; the state is
+    plain Python objects, so it pickles as is (see dashboard/realtime.py).
+
+    `load_history` (account ID -> saved state row or None) is called, outside the lock,
+    the first time `score` sees an account, e.g. to continue from the feature store.
+    """
+    INFLOW_TYPES = CounterpartyGraph.INFLOW_TYPES
+    MAX_CYCLE_LENGTH = 4
+    # Cycle search budget per transaction (path extensions), so hubs can't blow the latency
+    MAX_CYCLE_EXPANSIONS = 10000
+
+    def __init__(self, load_history=None):
+        self.load_history = load_history
+        self.accounts = {}
+        self.cycle_credits = {}  # account not seen yet -> [cycles, volume] it was a counterparty on
+        self.in_edges = {}      # destination -> deque of (seconds, sequence, source, amount), in time order
+        self.expiry = []        # heap of (seconds, destination), one entry per edge, to drop them once stale
+        self.sequence = 0
+        self.latest = None
+        self.out_of_order = 0
+        self.lock = threading.Lock()
+        self._compiled = None   # (model, CompiledForest) of the current model version
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['lock'], state['_compiled'], state['load_history']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.lock = threading.Lock()
+        self._compiled = None
+        self.load_history = None
+
+    @classmethod
+    def is_inflow(cls, type_):
+        return str(type_).lower() in cls.INFLOW_TYPES
+
+    def score(self, account_id, seconds, type_, amount, related_account):
+        """Apply one transaction and return the account's result dict (as RiskEngine.result_records)"""
+        current = registry.current()
+        if current.calibration is None:
+            raise ModelNotFound(f"Model {current.version} has no score calibration; retrain with `manage.py train_model`")
+        if self._compiled is None or self._compiled[0] is not current.model:
+            self._compiled = (current.model, CompiledForest(current.model))
+        columns = current.features or RiskEngine.FEATURE_COLUMNS[:current.model.n_features_in_]
+
+        # An unseen account's saved history is a database read; don't hold up other requests for it
+        history = self.history(account_id)
+        with self.lock:
+            features = self.apply(account_id, seconds, type_, amount, related_account, history=history)
+        decision = self._compiled[1].decision_function(np.array([features[c] for c in columns], dtype='float64'))
+        risk_score = int(current.calibration.risk(decision)[0])
+
+        flags = {flag: bool(hit) for flag, hit in RiskEngine.rule_flags(features).items()}
+        flags['anomalous_behavior'] = risk_score > RiskEngine.ANOMALOUS_SCORE and not any(flags.values())
+        return {
+            'accountId': account_id,
+            'riskScore': risk_score,
+            'patterns': [label for label, flag in RiskEngine.PATTERNS if flags[flag]],
+            'totalVolume': features['total_volume'],
+            'transactionCount': features['transaction_count'],
+            'modelVersion': current.version,
+            'networkRiskScore': None,
+        }
+
+    def history(self, account_id):
+        """Saved state (from load_history) of an account the scorer hasn't seen yet, else None"""
+        if self.load_history is None or account_id in self.accounts:
+            return None
+        return self.load_history(account_id)
+
+    def apply(self, account_id, seconds, type_, amount, related_account, history=None):
+        """
+        Update the state with one transaction and return the account's features.
+        `history` is the account's saved state (see `history`) if it is new to the scorer.
+        """
+        state = self.accounts.get(account_id)
+        if state is None:
+            state = AccountState() if history is None else self._seed(account_id, history)
+            credit = self.cycle_credits.pop(account_id, None)
+            if credit:
+                state.cycle_count += credit[0]
+                state.cycle_volume += credit[1]
+            self.accounts[account_id] = state
+        linked = related_account is not None and related_account != account_id and seconds is not None
+        inflow = self.is_inflow(type_)
+        if seconds is not None and state.latest is not None and seconds < state.latest:
+            self.out_of_order += 1
+        state.add(seconds, type_, amount, related_account, inflow, linked)
+        if linked:
+            source, destination = (related_account, account_id) if inflow else (account_id, related_account)
+            self._add_transfer(source, destination, seconds, amount)
+        return state.features()
+
+    def _seed(self, account_id, row):
+        state = AccountState.from_state(row)
+        for seconds, amount, type_, related in row['recent']:
+            if related is not None and related != account_id:
+                inflow = self.is_inflow(type_)
+                source, destination = (related, account_id) if inflow else (account_id, related)
+                self._add_edge(destination, (seconds, -1, source, amount))
+        return state
+
+    def _add_edge(self, destination, edge):
+        """Insert an edge in time order (seeded history and late rows land before newer ones)"""
+        if self.latest is not None and edge[0] < self.latest - CYCLE_WINDOW:
+            return
+        edges = self.in_edges.get(destination)
+        if edges is None:
+            edges = self.in_edges[destination] = deque()
+        position = len(edges)
+        while position and edges[position - 1][:2] > edge[:2]:
+            position -= 1
+        edges.insert(position, edge)
+        heapq.heappush(self.expiry, (edge[0], destination))
+
+    def _expire_edges(self):
+        """Drop every edge older than CYCLE_WINDOW, whichever destination it points to"""
+        floor = self.latest - CYCLE_WINDOW
+        while self.expiry and self.expiry[0][0] < floor:
+            _, destination = heapq.heappop(self.expiry)
+            edges = self.in_edges.get(destination)
+            while edges and edges[0][0] < floor:
+                edges.popleft()
+            if edges is not None and not edges:
+                del self.in_edges[destination]
+
+    def _add_transfer(self, source, destination, seconds, amount):
+        # The other leg of a transfer already applied (A's withdrawal, then B's deposit) is the same edge
+        edges = self.in_edges.get(destination, ())
+        for position in range(len(edges) - 1, -1, -1):
+            edge_seconds, _, sender, edge_amount = edges[position]
+            if edge_seconds < seconds:
+                break
+            if edge_seconds == seconds and sender == source and edge_amount == amount:
+                return
+        self.sequence += 1
+        self.latest = seconds if self.latest is None else max(self.latest, seconds)
+        self._close_cycles(source, destination, seconds, self.sequence, amount)
+        self._add_edge(destination, (seconds, self.sequence, source, amount))
+        self._expire_edges()
+
+    def _close_cycles(self, source, destination, seconds, sequence, amount):
+        """
+        Cycles destination -> ... -> source -> destination that this transfer completes:
+        walk backwards from `source` over earlier transfers (each hop no later than the
+        next), at most MAX_CYCLE_LENGTH hops, all within CYCLE_WINDOW of the first.
+        """
+        floor = seconds - CYCLE_WINDOW
+        budget = self.MAX_CYCLE_EXPANSIONS
+        # Path: nodes from `source` backwards, and the (sender, amount) of each hop
+        stack = [(source, (seconds, sequence), [source], [(source, amount)])]
+        while stack:
+            node, rank, nodes, hops = stack.pop()
+            for edge_seconds, edge_sequence, sender, edge_amount in self.in_edges.get(node, ()):
+                if edge_seconds < floor or (edge_seconds, edge_sequence) >= rank:
+                    continue
+                budget -= 1
+                if budget < 0:
+                    return
+                if sender == destination:
+                    self._record_cycle(hops + [(sender, edge_amount)])
+                elif len(nodes) + 1 < self.MAX_CYCLE_LENGTH and sender not in nodes:
+                    stack.append((sender, (edge_seconds, edge_sequence), nodes + [sender],
+                                  hops + [(sender, edge_amount)]))
+
+    def _record_cycle(self, hops):
+        # Counterparties on a cycle are credited too, in case they transact themselves later;
+        # ones not seen yet just keep the credit, without loading or building their state
+        for sender, amount in hops:
+            state = self.accounts.get(sender)
+            if state is None:
+                credit = self.cycle_credits.setdefault(sender, [0, 0.0])
+                credit[0] += 1
+                credit[1] += amount
+            else:
+                state.cycle_count += 1
+                state.cycle_volume += amount
@@ -0,0 +1,172 @@
+import contextlib
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import namedtuple
+from datetime import datetime, timezone
+
+import joblib
+
+from .calibration import ScoreCalibration
+
+logger = logging.getLogger(__name__)
+
+MODELS_DIR = os.path.join(os.path.dirname(__file__), 'models')
+# The unversioned model the repo shipped with; served until a version is published
+LEGACY_MODEL = 'isolation_forest.joblib'
+LEGACY_VERSION = 'legacy'
+
+ModelVersion = namedtuple('ModelVersion', ['version', 'model', 'features', 'calibration'])
+
+
+class ModelNotFound(LookupError):
+    pass
+
+
+class ModelRegistry:
+    """
+    Versioned Isolation Forest artifacts in `models_dir`, described by manifest.json:
+
+        {"current": "v3", "versions": [{"version": "v3", "file": "isolation_forest-v3.joblib",
+                                        "features": [...], "calibration": {...},
+                                        "created_at": "...", ...}, ...]}
+
+    Each process loads the current version once and keeps it in memory. Every lookup
+    stats the manifest (or the legacy file while there is no manifest) and swaps in
+    the new model as soon as `publish` - in this or any other process - changes it,
+    so workers pick up a retrained model without a restart.
+    """
+    MANIFEST = 'manifest.json'
+
+    def __init__(self, models_dir=MODELS_DIR):
+        self.models_dir = models_dir
+        self._lock = threading.Lock()
+        self._signature = None
+        self._current = None
+
+    @property
+    def manifest_path(self):
+        return os.path.join(self.models_dir, self.MANIFEST)
+
+    def current(self):
+        """The current ModelVersion, reloaded only when the manifest changed"""
+        signature = self._stat()
+        if signature is None:
+            raise ModelNotFound(f"No trained model in {self.models_dir}; run `manage.py train_model`")
+        with self._lock:
+            if signature != self._signature:
+                self._current = self._load()
+                self._signature = signature
+            return self._current
+
+    def _stat(self):
+        for path in (self.manifest_path, os.path.join(self.models_dir, LEGACY_MODEL)):
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            return path, stat.st_mtime_ns, stat.st_size
+        return None
+
+    def _load(self):
+        manifest = self.manifest()
+        if manifest is None:
+            model = joblib.load(os.path.join(self.models_dir, LEGACY_MODEL))
+            logger.info("Model registry: loaded %s model", LEGACY_VERSION)
+            return ModelVersion(LEGACY_VERSION, model, None, None)
+
+        entry = next(v for v in manifest['versions'] if v['version'] == manifest['current'])
+        # Keep serving the loaded model if it's already the current one (e.g. only metadata changed)
+        if self._current is not None and self._current.version == entry['version']:
+            return self._current
+        model = joblib.load(os.path.join(self.models_dir, entry['file']))
+        logger.info("Model registry: loaded model %s", entry['version'])
+        return ModelVersion(entry['version'], model, entry.get('features'),
+                            ScoreCalibration.from_dict(entry.get('calibration')))
+
+    def manifest(self):
+        try:
+            with open(self.manifest_path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def publish(self, model, features, **metadata):
+        """Save a new version, make it current and return its version string"""
+        os.makedirs(self.models_dir, exist_ok=True)
+        # Held from reading the manifest to writing it, so concurrent publishers get distinct versions
+        with self._manifest_lock():
+            manifest = self.manifest() or {'current': None, 'versions': []}
+            version = f"v{max((int(v['version'][1:]) for v in manifest['versions']), default=0) + 1}"
+            filename = f"isolation_forest-{version}.joblib"
+
+            self._write_atomic(filename, lambda path: joblib.dump(model, path))
+            manifest['versions'].append({
+                'version': version,
+                'file': filename,
+                'features': list(features),
+                'created_at': datetime.now(timezone.utc).isoformat(),
+                **metadata,
+            })
+            manifest['current'] = version
+            # The manifest goes last, so readers never see a version whose file isn't there yet
+            self._write_atomic(self.MANIFEST, lambda path: self._dump_json(manifest, path))
+        return version
+
+    def activate(self, version):
+        """Make an already published version current again (rollback)"""
+        with self._manifest_lock():
+            manifest = self.manifest()
+            if manifest is None or not any(v['version'] == version for v in manifest['versions']):
+                raise ModelNotFound(f"Unknown model version {version}")
+            manifest['current'] = version
+            self._write_atomic(self.MANIFEST, lambda path: self._dump_json(manifest, path))
+
+    @contextlib.contextmanager
+    def _manifest_lock(self, timeout=60, stale_after=600):
+        """
+        Exclusive lock on the manifest across processes: a lock file created with O_EXCL
+        (portable, unlike flock). A lock older than `stale_after` seconds was left by a
+        crashed publisher and is broken.
+        """
+        path = os.path.join(self.models_dir, f"{self.MANIFEST}.lock")
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                os.close(os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+                break
+            except FileExistsError:
+                try:
+                    if time.time() - os.stat(path).st_mtime > stale_after:
+                        os.remove(path)
+                        continue
+                except FileNotFoundError:
+                    continue
+                if time.monotonic() > deadline:
+                    raise TimeoutError(f"Model registry: {path} is held by another publisher")
+                time.sleep(0.05)
+        try:
+            yield
+        finally:
+            os.remove(path)
+
+    def _write_atomic(self, filename, write):
+        path = os.path.join(self.models_dir, filename)
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        try:
+            write(tmp_path)
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    @staticmethod
+    def _dump_json(data, path):
+        with open(path, 'w') as f:
+            json.dump(data, f, indent=2)
+
+
+registry = ModelRegistry()
@@ -1,17 +1,49 @@
 import pandas as pd
+from pandas.tseries.api import guess_datetime_format
 from datetime import datetime, timedelta
 from sklearn.ensemble import IsolationForest
 import numpy as np
-import joblib
-import os
+from . import fan
+from .calibration import ScoreCalibration
+from .graph import CounterpartyGraph
+from .registry import ModelNotFound, registry
+from ..money import AMOUNT_JUNK
 
 class RiskEngine:
-    MODEL_PATH = os.path.join(os.path.dirname(__file__), 'models', 'isolation_forest.joblib')
+    # Columns kept after prepare_frame; everything downstream only needs these
+    NORMALIZED_COLUMNS = ['account_id', 'datetime', 'type', 'amount', 'related_account', 'parse_error']
+    # Bump whenever _map_columns/_prepare_data change what they produce (invalidates parse caches)
+    NORMALIZATION_VERSION = 2
+    # Isolation Forest inputs. Models trained before a feature existed use the leading
+    # columns they were fitted on (see score_features)
+    FEATURE_COLUMNS = ['total_volume', 'structuring_count', 'mule_score', 'round_trip_count',
+                       'cycle_count', 'cycle_volume',
+                       'peak_count_1h', 'peak_volume_1h', 'peak_count_24h', 'peak_volume_24h',
+                       'peak_count_7d', 'peak_volume_7d', 'burst_rate', 'structuring_24h'] + fan.COLUMNS
+    # Alert patterns in display order, with their boolean column in result frames
+    PATTERNS = [('High Volume', 'high_volume'), ('Structuring', 'structuring'), ('Money Mule', 'money_mule'),
+                ('Round Trip', 'round_trip'), ('Fan-In', 'fan_in'), ('Fan-Out', 'fan_out'),
+                ('Anomalous Behavior', 'anomalous_behavior')]
+    PATTERN_FLAGS = [flag for _, flag in PATTERNS]
+    # Separator of pattern names in Alert.type
+    PATTERN_SEPARATOR = ', '
+    RESULT_COLUMNS = ['account_id', 'risk_score', 'total_volume', 'transaction_count'] + PATTERN_FLAGS + \
+                     ['model_version', 'network_risk']
+    # Rolling windows (seconds) for the velocity features
+    WINDOWS = {'1h': 3600, '24h': 86400, '7d': 7 * 86400}
+    # Fan-in/out: this many distinct counterparties in one 7-day window, none of them dominant
+    FAN_MIN_COUNTERPARTIES = 10
+    FAN_MAX_CONCENTRATION = 0.3
+    # Scores above this that no rule explains are flagged as anomalous behavior
+    ANOMALOUS_SCORE = 75
+    # Accounts scoring at least this much seed the network risk propagation
+    NETWORK_SEED_SCORE = 75
 
     def __init__(self, data=None):
         """
         data: List of dictionaries representing transactions.
         """
+        self.graph = None   # counterparty graph of the last extracted frame (network risk)
         if data is not None:
             self.df = pd.DataFrame(data)
             self._map_columns()
@@ -19,6 +51,14 @@ class RiskEngine:
         else:
             self.df = None
 
+    def prepare_frame(self, df):
+        """Map columns and normalize types for a raw upload frame (or one chunk of it)"""
+        self.df = df
+        self._map_columns()
+        self._prepare_data()
+        self.df = self.df[self.NORMALIZED_COLUMNS]
+        return self.df
+
     def _map_columns(self):
         """Map common column name variations to internal names"""
         mapping = {
@@ -45,28 +85,79 @@ class RiskEngine:
         if missing:
             raise ValueError(f"Missing required columns: {', '.join(missing)}. Found: {', '.join(self.df.columns)}")
 
-    def _prepare_data(self):
-        """Convert types and handle missing time"""
+    DATE_FORMATS = ['%Y-%m-%d', '%Y-%m-%d %H:%M:%S', '%Y-%m-%d %H:%M', '%d-%m-%Y', '%d/%m/%Y',
+                    '%m/%d/%Y', '%Y/%m/%d', '%d-%b-%Y', '%d %b %Y']
+    TIME_FORMATS = ['%H:%M:%S', '%H:%M', '%H:%M:%S.%f', '%I:%M %p', '%I:%M:%S %p']
+    # Currency symbols, thousands separators and stray spaces in amount strings
+    AMOUNT_JUNK = AMOUNT_JUNK
+
+    @staticmethod
+    def _detect_format(text, candidates, sample_size=100):
+        """Pick the first candidate format that parses every value in a sample of the column"""
+        sample = text.head(sample_size)
+        for fmt in candidates:
+            if fmt and pd.to_datetime(sample, format=fmt, errors='coerce').notna().all():
+                return fmt
+        return None
+
+    def _parse_datetime_column(self, values, candidates):
+        """
+        Parse a date or time column with a format detected once from a sample.
+        Dates and times repeat a lot, so only the distinct values are parsed, and only
+        the ones that don't match the detected format fall back to per-element inference.
+        """
+        if pd.api.types.is_datetime64_any_dtype(values):
+            return values
+
+        codes, uniques = pd.factorize(values)
+        text = pd.Series(uniques, dtype=object).astype(str)
+        guessed = guess_datetime_format(text.iloc[0]) if len(text) else None
+        fmt = self._detect_format(text, [guessed] + candidates)
+
+        if fmt is None:
+            parsed = pd.to_datetime(text, format='mixed', errors='coerce')
+        else:
+            parsed = pd.to_datetime(text, format=fmt, errors='coerce')
+            missed = parsed.isna()
+            if missed.any():
+                parsed[missed] = pd.to_datetime(text[missed], format='mixed', errors='coerce')
+
+        # Missing values have code -1 and come back as NaT
+        parsed = pd.DatetimeIndex(parsed).take(codes, allow_fill=True, fill_value=pd.NaT)
+        return pd.Series(parsed, index=values.index)
+
+    def _parse_amounts(self, values):
+        """Vectorized amount cleaning; returns (amounts, unparseable-row mask). Missing amounts are 0."""
+        if pd.api.types.is_numeric_dtype(values):
+            return values.astype('float64').fillna(0.0), pd.Series(False, index=values.index)
+
+        cleaned = values.astype(str)
+        for junk in self.AMOUNT_JUNK:
+            cleaned = cleaned.str.replace(junk, '', regex=False)
         try:
-            if 'time' not in self.df.columns:
-                # If time is missing, try to extract from date or default to 00:00:00
-                self.df['datetime'] = pd.to_datetime(self.df['date'])
-            else:
-                dates = self.df['date'].astype(str)
-                times = self.df['time'].astype(str)
-                self.df['datetime'] = pd.to_datetime(dates + ' ' + times)
-        except Exception as e:
-            print(f"Error parsing datetime: {e}")
-            self.df['datetime'] = pd.to_datetime(self.df['date'], errors='coerce')
-
-        # Robust amount parsing
-        def clean_amount(val):
-            if pd.isna(val): return 0.0
-            if isinstance(val, (int, float)):
-                return float(val)
-            return float(str(val).replace('₹', '').replace(',', '').replace('$', ''))
-
-        self.df['amount'] = self.df['amount'].apply(clean_amount)
+            parsed = cleaned.astype('float64')
+        except ValueError:
+            # Only pay for element-wise coercion when something doesn't parse
+            parsed = pd.to_numeric(cleaned, errors='coerce')
+        parsed = parsed.where(values.notna())
+        failed = parsed.isna() & values.notna()
+        return parsed.fillna(0.0), failed
+
+    def _prepare_data(self):
+        """
+        Convert types and handle missing time. Rows whose date or amount can't be parsed
+        are kept (as NaT / 0) and flagged in the 'parse_error' column.
+        """
+        dates = self._parse_datetime_column(self.df['date'], self.DATE_FORMATS)
+        if 'time' not in self.df.columns:
+            self.df['datetime'] = dates
+        else:
+            times = self._parse_datetime_column(self.df['time'], self.TIME_FORMATS)
+            # Rows without a usable time keep just the date
+            self.df['datetime'] = (dates.dt.normalize() + (times - times.dt.normalize())).fillna(dates)
+
+        self.df['amount'], bad_amounts = self._parse_amounts(self.df['amount'])
+        self.df['parse_error'] = self.df['datetime'].isna() | bad_amounts
         
         # Ensure 'type' exists
         if 'type' not in self.df.columns:
@@ -76,105 +167,352 @@ class RiskEngine:
         if 'related_account' not in self.df.columns:
             self.df['related_account'] = None
 
-    def extract_features_vectorized(self, df):
+        # Account ids are strings in the DB; read_csv may infer ints (per chunk, when streaming)
+        for col in ['account_id', 'related_account']:
+            ids = self.df[col]
+            if pd.api.types.is_string_dtype(ids):
+                continue
+            if pd.api.types.is_float_dtype(ids) and (ids.dropna() % 1 == 0).all():
+                ids = ids.astype('Int64')  # integer ids with gaps are read as floats
+            self.df[col] = ids.astype(object).where(ids.isna(), ids.astype(str))
+
+    def extract_features_vectorized(self, df, cycles=None):
         """
         Extract features for all accounts at once using vectorized operations.
         This is significantly faster for millions of records.
+
+        Accounts are handled as integer codes and only the few columns each feature needs
+        are pulled out as plain arrays; df itself is never modified or copied whole.
+
+        `cycles` takes precomputed cycle features, e.g. from the whole upload when df is
+        only one shard of it (see ShardedScorer). Otherwise the counterparty graph is
+        built here and kept as `self.graph` for scoring.
         """
+        # Cycles: money that comes back to its origin (A -> B -> ... -> A) within a time window.
+        # Built before any re-sorting so same-timestamp transfers keep their upload order
+        if cycles is None:
+            self.graph = CounterpartyGraph.from_frame(df)
+            cycles = self.graph.cycle_features()
+
+        # Sorted codes, so position i is the i-th account of the sorted feature index.
+        # Rows without an account ID (code -1) are left out, as groupby always did
+        account_codes, accounts = pd.factorize(df['account_id'], sort=True)
+        known = account_codes >= 0
+        n_accounts = len(accounts)
+        codes = account_codes[known].astype('int32')
+        amount = df['amount'].to_numpy(dtype='float64')[known]
+        times = df['datetime'].to_numpy(dtype='datetime64[ns]').view('int64')[known]
+        dated = times != np.iinfo('int64').min
+        
         # 1. Total Volume
-        stats = df.groupby('account_id')['amount'].agg(['sum', 'count']).rename(columns={'sum': 'total_volume', 'count': 'transaction_count'})
+        stats = pd.Series(amount).groupby(codes).agg(['sum', 'count'])
         
         # 2. Structuring Count (45k - 50k)
-        df['is_structuring'] = (df['amount'] >= 45000) & (df['amount'] < 50000)
-        structuring = df.groupby('account_id')['is_structuring'].sum().rename('structuring_count')
+        structuring = np.bincount(codes[(amount >= 45000) & (amount < 50000)], minlength=n_accounts)
         
         # 3. Money Mule Score (Rapid In/Out)
         # We'll use a simplified vectorized version for scale: 
         # Accounts where total deposits approx equal total withdrawals within a short window
         # For true scale, we might use a rolling window or just flag high-frequency churn
-        df = df.sort_values(['account_id', 'datetime'])
-        df['prev_amount'] = df.groupby('account_id')['amount'].shift(1)
-        df['prev_type'] = df.groupby('account_id')['type'].shift(1)
-        df['time_diff'] = df.groupby('account_id')['datetime'].diff().dt.total_seconds()
+        # Each account's rows in time order (undated last), as an index rather than a sorted copy of df
+        order = np.lexsort((np.where(dated, times, np.iinfo('int64').max), codes))
+        codes, amount, times, dated = codes[order], amount[order], times[order], dated[order]
+        withdrawal = (df['type'] == 'Withdrawal').to_numpy(dtype=bool, na_value=False)[known][order]
+        deposit = (df['type'] == 'Deposit').to_numpy(dtype=bool, na_value=False)[known][order]
         
         # Flag if Withdrawal follows Deposit of similar amount within 24h
-        df['is_mule'] = (df['type'] == 'Withdrawal') & \
-                        (df['prev_type'] == 'Deposit') & \
-                        (df['time_diff'] <= 86400) & \
-                        (df['amount'] >= 0.95 * df['prev_amount']) & \
-                        (df['amount'] <= 1.05 * df['prev_amount'])
-        
-        mule_scores = df.groupby('account_id')['is_mule'].sum().rename('mule_score')
+        is_mule = (codes[1:] == codes[:-1]) & withdrawal[1:] & deposit[:-1] & \
+                  dated[1:] & dated[:-1] & \
+                  (times[1:] - times[:-1] <= 86400 * 10 ** 9) & \
+                  (amount[1:] >= 0.95 * amount[:-1]) & \
+                  (amount[1:] <= 1.05 * amount[:-1])
+        mule_scores = np.bincount(codes[1:][is_mule], minlength=n_accounts)
+
+        # Velocity: peak activity in rolling windows over the same sorted timelines
+        timeline = pd.DataFrame({'account_id': codes[dated], 'datetime': times[dated].view('datetime64[ns]'),
+                                 'amount': amount[dated]})
+        windows = self.window_features(timeline)
+        windows['burst_rate'] = self.burst_rate(windows['peak_count_1h'], *self.timeline_spans(timeline))
+        del timeline, times, amount, withdrawal, deposit
         
         # 4. Round Trip Count
-        # Flag if related_account appears as both sender and receiver for the same account
-        round_trips = df[df['related_account'].notna()].groupby(['account_id', 'related_account']).size()
-        # If size > 1 for a pair, it's a potential round trip (simplification)
-        round_trip_counts = round_trips[round_trips > 1].groupby('account_id').count().rename('round_trip_count')
-        
+        # Counterparties an account dealt with more than once. Too noisy to flag on its own
+        # (the Round Trip pattern uses cycles instead) but still an input of older models
+        counterparties = pd.factorize(df['related_account'])
+        related_codes, related = counterparties[0][known][order], counterparties[1]
+        linked = related_codes >= 0
+        pairs, counts = np.unique(codes[linked].astype('int64') * len(related) + related_codes[linked],
+                                  return_counts=True)
+        round_trip_counts = np.bincount(pairs[counts > 1] // max(len(related), 1), minlength=n_accounts)
+        del related_codes, linked, pairs, counts
+
+        # 5. Fan-in / fan-out over the account x counterparty matrix of each 7-day window
+        fans = fan.fan_features(df, (account_codes, accounts), counterparties)
+        del account_codes, counterparties
+
         # Combine all features
-        features_df = pd.concat([stats, structuring, mule_scores, round_trip_counts], axis=1).fillna(0)
+        features_df = pd.DataFrame({
+            # Round to paise so partial (chunked) sums agree exactly with a single full sum
+            'total_volume': stats['sum'].round(2).to_numpy(),
+            'transaction_count': stats['count'].to_numpy(),
+            'structuring_count': structuring,
+            'mule_score': mule_scores,
+            'round_trip_count': round_trip_counts,
+        }, index=pd.Index(accounts, name='account_id'))
+        windows.index = features_df.index.take(windows.index.to_numpy(dtype='int64'))
+        features_df = pd.concat([features_df, cycles.reindex(features_df.index),
+                                 windows.reindex(features_df.index), fans[fan.COLUMNS].reindex(features_df.index)],
+                                axis=1).fillna(0)
         return features_df
 
+    @classmethod
+    def window_features(cls, timeline, counted=None):
+        """
+        Peak transaction count and volume per account in any 1h/24h/7d window, plus the
+        most structuring-range amounts inside one 24h window.
+
+        `timeline` must be sorted by account_id then datetime, with no missing datetimes.
+        Each row's window is (t - w, t]; its start is found with one searchsorted over
+        (account, time) keys, and sums come from integer prefix sums, so there is no
+        per-account loop. Rows outside `counted` only serve as history for later rows.
+        """
+        columns = [f'peak_{kind}_{label}' for label in cls.WINDOWS for kind in ('count', 'volume')]
+        if timeline.empty:
+            return pd.DataFrame(columns=columns + ['structuring_24h'], index=pd.Index([], name='account_id'))
+
+        codes, accounts = pd.factorize(timeline['account_id'], sort=False)
+        seconds = timeline['datetime'].to_numpy(dtype='datetime64[s]').view('int64')
+        seconds = seconds - seconds.min()
+        keys = codes * (int(seconds.max()) + max(cls.WINDOWS.values()) + 1) + seconds
+
+        amount = timeline['amount'].to_numpy(dtype='float64')
+        # Paise keep the prefix sums exact whatever the chunking
+        paise = np.concatenate([[0], np.cumsum(np.round(amount * 100).astype('int64'))])
+        structuring = np.concatenate([[0], np.cumsum((amount >= 45000) & (amount < 50000))])
+
+        # Rows are grouped by account, so each account's peak is a maximum over its run of rows
+        rows = np.arange(len(keys)) if counted is None else np.flatnonzero(counted)
+        if len(rows) == 0:
+            return pd.DataFrame(columns=columns + ['structuring_24h'], index=pd.Index([], name='account_id'))
+        row_codes = codes[rows]
+        runs = np.flatnonzero(np.concatenate([[True], row_codes[1:] != row_codes[:-1]]))
+
+        end = rows + 1
+        peaks = {}
+        for label, width in cls.WINDOWS.items():
+            start = np.searchsorted(keys, keys[rows] - width, side='right')
+            peaks[f'peak_count_{label}'] = np.maximum.reduceat(end - start, runs)
+            peaks[f'peak_volume_{label}'] = np.maximum.reduceat((paise[end] - paise[start]) / 100, runs)
+            if label == '24h':
+                peaks['structuring_24h'] = np.maximum.reduceat(structuring[end] - structuring[start], runs)
+
+        return pd.DataFrame(peaks, index=pd.Index(accounts[row_codes[runs]], name='account_id'))[columns + ['structuring_24h']]
+
+    @staticmethod
+    def timeline_spans(timeline):
+        """(first datetime, last datetime, dated transaction count) per account"""
+        spans = timeline.groupby('account_id')['datetime'].agg(['min', 'max', 'count'])
+        return spans['min'], spans['max'], spans['count']
+
+    @staticmethod
+    def burst_rate(peak_count_1h, first, last, count):
+        """Busiest hour relative to the account's average hourly rate over its active span"""
+        hours = ((last - first).dt.total_seconds() / 3600).clip(lower=1)
+        return (peak_count_1h / (count / hours)).round(4)
+
+    @staticmethod
+    def top_transactions(df, n=5):
+        """
+        Top-n transactions by amount for every account, in one sort and one grouped pass.
+        Rows keep descending amount order within each account.
+        """
+        return df.sort_values('amount', ascending=False, kind='stable')\
+            .groupby('account_id', sort=False).head(n)
+
     def train(self, data):
         self.df = pd.DataFrame(data)
         self._map_columns()
         self._prepare_data()
         
         features_df = self.extract_features_vectorized(self.df)
-        X = features_df[['total_volume', 'structuring_count', 'mule_score', 'round_trip_count']].values
+        return self.fit_features(features_df)
+
+    def fit_features(self, features_df, **metadata):
+        """Fit the Isolation Forest on a per-account feature frame and publish it as a new version"""
+        X = features_df[self.FEATURE_COLUMNS].values
         
         clf = IsolationForest(random_state=42, contamination=0.1)
         clf.fit(X)
+        # Risk scores come from where an account ranks among the training accounts
+        calibration = ScoreCalibration.fit(clf.decision_function(X), clf.contamination)
         
-        # Ensure directory exists
-        os.makedirs(os.path.dirname(self.MODEL_PATH), exist_ok=True)
-        joblib.dump(clf, self.MODEL_PATH)
+        # Publish as a new version; running workers switch to it on their next scoring call
+        self.model_version = registry.publish(clf, self.FEATURE_COLUMNS, calibration=calibration.to_dict(),
+                                              n_samples=len(X), **metadata)
         return clf
 
-    def analyze(self, use_saved_model=True, chunk_mode=False):
+    def analyze(self, use_saved_model=True, chunk_mode=False, workers=1, columnar=False):
         if self.df is None:
-            return []
+            return self.empty_results(columnar)
+
+        if workers > 1:
+            # Shard by account across a process pool; results match the serial path
+            from .parallel import ShardedScorer
+            return ShardedScorer(self, workers).analyze(self.df, use_saved_model=use_saved_model, columnar=columnar)
 
         # Extract features using vectorized logic
         features_df = self.extract_features_vectorized(self.df)
-        
+        return self.score_features(features_df, use_saved_model=use_saved_model, columnar=columnar, graph=self.graph)
+
+    def score_features(self, features_df, use_saved_model=True, columnar=False, graph=None):
+        """
+        Score a per-account feature frame (batch or streamed) with the Isolation Forest.
+        Returns a result frame (see build_result_frame) with `columnar`, else a list of
+        result dicts. With the counterparty `graph` the features came from, results also
+        carry each account's network risk.
+        """
         if features_df.empty:
-            return []
+            return self.empty_results(columnar)
 
-        X = features_df[['total_volume', 'structuring_count', 'mule_score', 'round_trip_count']].values
+        clf, columns, model_version, calibration = self.resolve_model(features_df, use_saved_model)
+        scores = clf.decision_function(features_df[columns].values)
+        results = self.build_result_frame(features_df, scores, model_version, graph, calibration)
+        return results if columnar else self.result_records(results)
 
-        if use_saved_model and os.path.exists(self.MODEL_PATH):
-            clf = joblib.load(self.MODEL_PATH)
-        else:
-            clf = IsolationForest(random_state=42, contamination=0.1)
-            clf.fit(X)
-        
-        scores = clf.decision_function(X)
-        
-        # Normalize scores
-        min_score, max_score = scores.min(), scores.max()
-        if max_score == min_score:
-            normalized_scores = [50] * len(scores)
+    def resolve_model(self, features_df, use_saved_model=True):
+        """
+        (model, feature columns, version, calibration) to score features_df with. Without a
+        saved model, one is fitted on features_df and calibrated on the same accounts.
+        """
+        current = None
+        if use_saved_model:
+            try:
+                # Loaded once per process and swapped when train_model publishes a new version
+                current = registry.current()
+            except ModelNotFound:
+                pass
+        if current is not None:
+            columns = current.features or self.FEATURE_COLUMNS[:current.model.n_features_in_]
+            return current.model, columns, current.version, current.calibration
+
+        X = features_df[self.FEATURE_COLUMNS].values
+        clf = IsolationForest(random_state=42, contamination=0.1)
+        clf.fit(X)
+        return clf, self.FEATURE_COLUMNS, None, ScoreCalibration.fit(clf.decision_function(X), clf.contamination)
+
+    @classmethod
+    def build_result_frame(cls, features_df, scores, model_version, graph=None, calibration=None):
+        """
+        One row per account (in features_df order) with its integer risk score, a boolean
+        column per pattern and the volume/count shown on alerts. Everything is computed on
+        whole columns, so it costs about the same for a million accounts as for ten.
+        network_risk is left missing without a graph.
+
+        Risk scores come from the model's calibration. Models published before
+        calibrations existed (and the legacy model) fall back to min-max normalizing
+        within the batch, so their scores still depend on the rest of the batch.
+        """
+        if calibration is not None:
+            risk_scores = calibration.risk(scores)
+        elif scores.max() == scores.min():
+            risk_scores = np.full(len(scores), 50, dtype='int64')
         else:
-            normalized_scores = (1 - ((scores - min_score) / (max_score - min_score))) * 100
-
-        results = []
-        for i, (account_id, row) in enumerate(features_df.iterrows()):
-            risk_score = int(normalized_scores[i])
-            patterns = []
-            if row['total_volume'] > 1000000: patterns.append('High Volume')
-            if row['structuring_count'] >= 2: patterns.append('Structuring')
-            if row['mule_score'] > 0: patterns.append('Money Mule')
-            if row['round_trip_count'] > 0: patterns.append('Round Trip')
-            if risk_score > 75 and not patterns: patterns.append('Anomalous Behavior')
-
-            results.append({
+            min_score, max_score = scores.min(), scores.max()
+            risk_scores = ((1 - ((scores - min_score) / (max_score - min_score))) * 100).astype('int64')
+
+        results = pd.DataFrame({
+            'account_id': features_df.index.to_numpy(dtype=object),
+            'risk_score': risk_scores,
+            'total_volume': features_df['total_volume'].to_numpy(dtype='float64'),
+            'transaction_count': features_df['transaction_count'].to_numpy(dtype='int64'),
+            **{flag: np.asarray(hit) for flag, hit in cls.rule_flags(features_df).items()},
+        })
+        # Only for high scores that no rule explains
+        rules = [flag for flag in cls.PATTERN_FLAGS if flag != 'anomalous_behavior']
+        results['anomalous_behavior'] = (results['risk_score'] > cls.ANOMALOUS_SCORE) & ~results[rules].any(axis=1)
+        results['model_version'] = model_version
+        results['network_risk'] = cls.network_risk(results, graph)
+        return results
+
+    @classmethod
+    def network_risk(cls, results, graph):
+        """Risk each account is exposed to through its counterparties (see CounterpartyGraph.network_risk)"""
+        if graph is None:
+            return pd.array([pd.NA] * len(results), dtype='Int64')
+        scores = results['risk_score'].to_numpy()
+        seeds = pd.Series(np.where(scores >= cls.NETWORK_SEED_SCORE, scores / 100, 0.0), index=results['account_id'])
+        return graph.network_risk(seeds).reindex(results['account_id']).fillna(0).to_numpy(dtype='int64')
+
+    @classmethod
+    def rule_flags(cls, features):
+        """
+        Every pattern but anomalous_behavior, as {flag: hits}. `features` is a feature
+        frame (hits are boolean Series) or one account's features as a dict (plain bools).
+        """
+        return {
+            'high_volume': features['total_volume'] > 1000000,
+            'structuring': features['structuring_count'] >= 2,
+            'money_mule': features['mule_score'] > 0,
+            'round_trip': features['cycle_count'] > 0,
+            'fan_in': cls.fan_flags(features, 'in'),
+            'fan_out': cls.fan_flags(features, 'out'),
+        }
+
+    @classmethod
+    def fan_flags(cls, features, direction):
+        """Many counterparties in one week, spread evenly rather than dominated by one"""
+        counterparties = features[f'fan_{direction}_7d']
+        concentration = features[f'fan_{direction}_concentration']
+        return (counterparties >= cls.FAN_MIN_COUNTERPARTIES) & (concentration <= cls.FAN_MAX_CONCENTRATION)
+
+    @classmethod
+    def empty_results(cls, columnar=False):
+        return pd.DataFrame(columns=cls.RESULT_COLUMNS) if columnar else []
+
+    @classmethod
+    def pattern_labels(cls, results, sep=PATTERN_SEPARATOR):
+        """Pattern names of each result row joined with `sep` (e.g. for Alert.type)"""
+        labels = np.full(len(results), '', dtype=object)
+        for label, flag in cls.PATTERNS:
+            hit = results[flag].to_numpy()
+            labels[hit] = np.where(labels[hit] == '', label, labels[hit] + sep + label)
+        return labels
+
+    @classmethod
+    def pattern_masks(cls, results):
+        """Bitmask of each result row's patterns, bit i for PATTERNS[i] (Alert.typologies)"""
+        masks = np.zeros(len(results), dtype='int64')
+        for bit, (_, flag) in enumerate(cls.PATTERNS):
+            masks |= results[flag].to_numpy(dtype=bool).astype('int64') << bit
+        return masks
+
+    @classmethod
+    def labels_mask(cls, labels):
+        """Bitmask of a list of pattern names (unknown names are ignored)"""
+        bits = {label: bit for bit, (label, _) in enumerate(cls.PATTERNS)}
+        return sum(1 << bits[label] for label in set(labels) if label in bits)
+
+    @classmethod
+    def mask_labels(cls, mask):
+        """Pattern names in a bitmask, in display order"""
+        return [label for bit, (label, _) in enumerate(cls.PATTERNS) if mask >> bit & 1]
+
+    @classmethod
+    def result_records(cls, results):
+        """The result-dict list of a result frame (the API before columnar results)"""
+        flags = [(label, results[flag].tolist()) for label, flag in cls.PATTERNS]
+        network_risk = results['network_risk'].astype(object).where(results['network_risk'].notna(), None)
+        columns = zip(results['account_id'].tolist(), results['risk_score'].tolist(), results['total_volume'].tolist(),
+                      results['transaction_count'].tolist(), results['model_version'].tolist(), network_risk.tolist())
+        records = []
+        for i, (account_id, risk_score, total_volume, transaction_count, model_version, network) in enumerate(columns):
+            records.append({
                 'accountId': account_id,
                 'riskScore': risk_score,
-                'patterns': patterns,
-                'totalVolume': float(row['total_volume']),
-                'transactionCount': int(row['transaction_count'])
+                'patterns': [label for label, hits in flags if hits[i]],
+                'totalVolume': total_volume,
+                'transactionCount': transaction_count,
+                'modelVersion': model_version,
+                'networkRiskScore': network,
             })
-
-        return results
+        return records
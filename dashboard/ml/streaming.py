@@ -0,0 +1,334 @@
+import numpy as np
+import pandas as pd
+from . import fan
+from .graph import CounterpartyGraph
+from .risk_engine import RiskEngine
+
+
+def _isin(values, ids):
+    """values.isin(ids) for large ID sets (arrow-backed string isin converts ids one by one)"""
+    return pd.Index(pd.unique(ids)).get_indexer(values) >= 0
+
+
+class StreamingFeatureAccumulator:
+    """
+    Builds the same per-account features as RiskEngine.extract_features_vectorized,
+    one chunk at a time. Only per-account partial aggregates are kept, so memory
+    grows with the number of accounts rather than the number of rows.
+
+    Chunks must already be normalized (see RiskEngine.prepare_frame). The mule
+    check assumes each account's transactions arrive in chronological order across
+    chunks; rows that arrive earlier than an account's last seen transaction are
+    counted in `out_of_order_rows` so the caller can fall back to the batch path.
+    The counterparty graph keeps one compact edge (integer account codes, time, amount)
+    per linked transaction; once it holds `compact_edges` of them it is compacted to
+    the last cycle window (see CounterpartyGraph.compact), so for an upload in time
+    order it stays bounded by the busiest 7 days, not the file. Linked rows older than
+    what compaction kept can no longer join a cycle and are counted in
+    `out_of_order_rows` too, so the caller falls back to the batch path. Rolling-window
+    features carry each account's last 7 days of transactions into the next chunk;
+    they also hold every row of the fan-in/out windows a new transaction can fall into.
+
+    The same state can be saved per account (`state`) and folded back in later
+    (`seed`), so an upload continues each account's history instead of starting over.
+    With `load_history`, saved state is fetched for each account the first time a
+    chunk mentions it. Saved recent transfers go back into the counterparty graph as
+    history, so cycles that started in an earlier upload are found once they close;
+    cycle counts from earlier uploads are carried as totals.
+    """
+    EVIDENCE_COLUMNS = ['account_id', 'datetime', 'type', 'amount', 'related_account']
+    PEAK_COLUMNS = [c for c in RiskEngine.FEATURE_COLUMNS if c.startswith('peak_')] + ['structuring_24h']
+    # Rolling-window state saved alongside the peaks
+    WINDOW_COLUMNS = PEAK_COLUMNS + fan.STATE_COLUMNS
+    # Carried for rolling windows, and as history edges for cycles that span uploads
+    RECENT_COLUMNS = ['account_id', 'datetime', 'amount', 'type', 'related_account']
+
+    def __init__(self, evidence_size=5, load_history=None, sketch_size=500, compact_edges=2_000_000):
+        self.evidence_size = evidence_size
+        self.compact_edges = compact_edges  # graph edges that trigger a compaction
+        self._compact_at = compact_edges
+        self.load_history = load_history    # account IDs -> saved state frame (see `state`)
+        self.sketch_size = sketch_size      # counterparties kept per account in saved state
+        self.total_rows = 0
+        self.parse_errors = 0
+        self.out_of_order_rows = 0
+
+        self._stats = None      # sum, count, structuring hits, mule hits per account
+        self._last = None       # last dated transaction per account (mule check)
+        self._pairs = None      # (account_id, related_account) -> count
+        self._evidence = None   # top-N transactions by amount per account
+        self._graph = CounterpartyGraph()
+        self._recent = None     # transactions still inside the widest window of a later one
+        self._peaks = None      # rolling-window peaks per account
+        self._fans = None       # busiest fan-in/out window per account (fan.STATE_COLUMNS)
+        self._spans = None      # first/last datetime and dated count per account (burst rate)
+        self._prior_cycles = None   # cycle totals from saved state
+        self._cycles = None         # cycle features, cached until the next update
+        self._loaded = set()        # accounts whose saved state has been requested
+
+    def update(self, chunk):
+        if chunk.empty:
+            return
+        if self.load_history is not None:
+            self._seed_history(chunk)
+        self._cycles = None
+        self.total_rows += len(chunk)
+        self.parse_errors += int(chunk['parse_error'].sum())
+
+        # 1. Sums, counts and structuring hits
+        is_structuring = (chunk['amount'] >= 45000) & (chunk['amount'] < 50000)
+        partial = pd.DataFrame({
+            'total_volume': chunk['amount'],
+            'transaction_count': 1,
+            'structuring_count': is_structuring.astype('int64'),
+        }).groupby(chunk['account_id']).sum()
+
+        # 2. Mule hits, continuing each account's timeline from the previous chunk
+        partial['mule_score'] = self._mule_hits(chunk)
+        partial['mule_score'] = partial['mule_score'].fillna(0).astype('int64')
+        self._stats = self._merge_sum(self._stats, partial)
+
+        # 3. Counterparty pair counts
+        linked = chunk[chunk['related_account'].notna()]
+        pairs = linked.groupby(['account_id', 'related_account']).size()
+        self._pairs = self._merge_sum(self._pairs, pairs)
+        if self._graph.horizon is not None:
+            self.out_of_order_rows += int((linked['datetime'] < pd.Timestamp(self._graph.horizon)).sum())
+        self._graph.add_transactions(chunk)
+        if self._graph.n_edges >= self._compact_at:
+            self._graph.compact()
+            # Compacting again before the graph has grown would redo the same cycle search
+            self._compact_at = max(self.compact_edges, 2 * self._graph.n_edges)
+
+        # 4. Rolling-window peaks
+        self._update_windows(chunk)
+
+        # 5. Evidence candidates
+        candidates = chunk[self.EVIDENCE_COLUMNS]
+        if self._evidence is not None:
+            candidates = pd.concat([self._evidence, candidates], ignore_index=True)
+        self._evidence = RiskEngine.top_transactions(candidates, self.evidence_size).reset_index(drop=True)
+
+    def _mule_hits(self, chunk):
+        dated = chunk.loc[chunk['datetime'].notna(), ['account_id', 'datetime', 'type', 'amount']]
+        if dated.empty:
+            return pd.Series(dtype='int64')
+        dated = dated.assign(carried=False)
+
+        if self._last is not None:
+            carried = self._last[_isin(self._last['account_id'], dated['account_id'])]
+            if not carried.empty:
+                earliest = dated.groupby('account_id')['datetime'].min()
+                late = carried.set_index('account_id')['datetime'] > earliest.reindex(carried['account_id']).values
+                self.out_of_order_rows += int(late.sum())
+                dated = pd.concat([carried.assign(carried=True), dated], ignore_index=True)
+
+        dated = dated.sort_values(['account_id', 'datetime'])
+        grouped = dated.groupby('account_id')
+        prev_amount = grouped['amount'].shift(1)
+        prev_type = grouped['type'].shift(1)
+        time_diff = grouped['datetime'].diff().dt.total_seconds()
+
+        is_mule = (dated['type'] == 'Withdrawal') & \
+                  (prev_type == 'Deposit') & \
+                  (time_diff <= 86400) & \
+                  (dated['amount'] >= 0.95 * prev_amount) & \
+                  (dated['amount'] <= 1.05 * prev_amount) & \
+                  ~dated['carried']
+
+        last = grouped.tail(1).drop(columns='carried')
+        if self._last is None:
+            self._last = last.reset_index(drop=True)
+        else:
+            merged = pd.concat([self._last, last], ignore_index=True)
+            self._last = merged.drop_duplicates('account_id', keep='last').reset_index(drop=True)
+
+        return is_mule.groupby(dated['account_id']).sum()
+
+    def _update_windows(self, chunk):
+        dated = chunk.loc[chunk['datetime'].notna(), self.RECENT_COLUMNS]
+        if dated.empty:
+            return
+
+        spans = dated.groupby('account_id')['datetime'].agg(['min', 'max', 'count'])
+        if self._spans is not None:
+            spans = pd.concat([self._spans, spans]).groupby(level=0)\
+                .agg({'min': 'min', 'max': 'max', 'count': 'sum'})
+        self._spans = spans
+
+        # Windows of this chunk's rows reach back into the carried history
+        history = dated.iloc[:0]
+        if self._recent is not None:
+            history = self._recent[_isin(self._recent['account_id'], dated['account_id'])]
+        timeline = pd.concat([history.assign(counted=False), dated.assign(counted=True)], ignore_index=True)
+        timeline = timeline.sort_values(['account_id', 'datetime'], kind='stable')
+        counted = timeline.pop('counted').to_numpy()
+
+        peaks = RiskEngine.window_features(timeline, counted)
+        if self._peaks is not None:
+            peaks = pd.concat([self._peaks, peaks]).groupby(level=0).max()
+        self._peaks = peaks
+
+        # Fan-in/out: recompute every 7-day window this chunk added to, from all of its rows
+        codes, _ = pd.factorize(timeline['account_id'])
+        window = fan.windows(timeline)
+        keys = codes.astype('int64') * (int(window.max() - window.min()) + 1) + (window - window.min())
+        touched = np.isin(keys, keys[counted])
+        self._fans = fan.merge(self._fans, fan.fan_features(timeline[touched]))
+
+        # Drop rows no later window can reach
+        horizon = timeline.groupby('account_id')['datetime'].transform('max') - pd.Timedelta(seconds=max(RiskEngine.WINDOWS.values()))
+        recent = timeline[timeline['datetime'] > horizon]
+        if self._recent is not None:
+            untouched = self._recent[~_isin(self._recent['account_id'], dated['account_id'])]
+            recent = pd.concat([untouched, recent], ignore_index=True)
+        self._recent = recent.reset_index(drop=True)
+
+    def _seed_history(self, chunk):
+        new_ids = [acc for acc in pd.unique(chunk['account_id']) if acc not in self._loaded]
+        if not new_ids:
+            return
+        self._loaded.update(new_ids)
+        state = self.load_history(new_ids)
+        if state is not None and not state.empty:
+            self.seed(state)
+
+    def seed(self, state):
+        """Fold in saved per-account state (the output of `state`) for accounts not seen yet"""
+        self._cycles = None
+        self._stats = self._merge_sum(self._stats, state[['total_volume', 'transaction_count',
+                                                           'structuring_count', 'mule_score']])
+        self._prior_cycles = self._merge_sum(self._prior_cycles, state[['cycle_count', 'cycle_volume']])
+
+        pairs = [(acc, related, n) for acc, counts in state['counterparties'].items() for related, n in counts.items()]
+        if pairs:
+            pairs = pd.DataFrame(pairs, columns=['account_id', 'related_account', 'n'])
+            self._pairs = self._merge_sum(self._pairs, pairs.set_index(['account_id', 'related_account'])['n'])
+
+        dated = state[state['dated_count'] > 0]
+        if dated.empty:
+            return
+        last = pd.DataFrame({'account_id': dated.index, 'datetime': dated['last_datetime'].values,
+                             'type': dated['last_type'].values, 'amount': dated['last_amount'].values})
+        self._last = last if self._last is None else pd.concat([self._last, last], ignore_index=True)
+
+        spans = dated[['first_datetime', 'last_datetime', 'dated_count']]
+        spans.columns = ['min', 'max', 'count']
+        self._spans = spans if self._spans is None else pd.concat([self._spans, spans])
+        peaks = dated[self.PEAK_COLUMNS]
+        self._peaks = peaks if self._peaks is None else pd.concat([self._peaks, peaks])
+        fans = dated[fan.STATE_COLUMNS]
+        self._fans = fans if self._fans is None else pd.concat([self._fans, fans])
+
+        lengths = dated['recent'].map(len).to_numpy()
+        if lengths.sum():
+            rows = [row for history in dated['recent'] for row in history]
+            seconds, amounts, types, related = zip(*rows)
+            recent = pd.DataFrame({'account_id': np.repeat(dated.index.to_numpy(), lengths),
+                                   'datetime': pd.to_datetime(np.array(seconds, dtype='int64'), unit='s'),
+                                   'amount': np.array(amounts, dtype='float64'),
+                                   'type': pd.Series(types, dtype=object),
+                                   'related_account': pd.Series(related, dtype=object)})
+            self._graph.add_transactions(recent, history=True)
+            self._recent = recent if self._recent is None else pd.concat([self._recent, recent], ignore_index=True)
+
+    def state(self):
+        """
+        Per-account state to save for every account seen, indexed by account_id. Plain
+        columns plus three per-account collections: `recent` ([epoch seconds, amount,
+        type, counterparty] still inside the widest window), `counterparties` ({counterparty: count} for the
+        `sketch_size` most frequent) and the WINDOW_COLUMNS.
+        """
+        if self._stats is None:
+            return pd.DataFrame()
+        index = self._stats.index
+        state = self._stats.copy()
+        state['total_volume'] = state['total_volume'].round(2)
+        state = state.join(self.cycle_features().reindex(index).fillna(0))
+
+        spans = self._spans.reindex(index) if self._spans is not None else pd.DataFrame(index=index, columns=['min', 'max', 'count'])
+        state['dated_count'] = spans['count'].fillna(0).astype('int64')
+        state['first_datetime'], state['last_datetime'] = spans['min'], spans['max']
+        last = self._last.set_index('account_id').reindex(index) if self._last is not None else None
+        state['last_type'] = last['type'] if last is not None else None
+        state['last_amount'] = last['amount'].fillna(0) if last is not None else 0.0
+
+        peaks = self._peaks.reindex(index) if self._peaks is not None else pd.DataFrame(index=index, columns=self.PEAK_COLUMNS)
+        state[self.PEAK_COLUMNS] = peaks[self.PEAK_COLUMNS].fillna(0)
+        fans = self._fans.reindex(index) if self._fans is not None else pd.DataFrame(index=index, columns=fan.STATE_COLUMNS)
+        state[fan.STATE_COLUMNS] = fans[fan.STATE_COLUMNS].fillna(0)
+
+        recent = None
+        if self._recent is not None:
+            recent = self._recent.assign(
+                datetime=self._recent['datetime'].to_numpy(dtype='datetime64[s]').view('int64'),
+                related_account=self._recent['related_account'].astype(object).where(self._recent['related_account'].notna(), None),
+            )
+        state['recent'] = self._collect(recent, index, ['datetime', 'amount', 'type', 'related_account'],
+                                        lambda *columns: [list(row) for row in zip(*columns)], list)
+        heaviest = None
+        if self._pairs is not None:
+            heaviest = self._pairs.sort_values(ascending=False, kind='stable').groupby(level=0, sort=False).head(self.sketch_size)
+            heaviest = heaviest.rename('n').reset_index()
+        state['counterparties'] = self._collect(heaviest, index, ['related_account', 'n'],
+                                                lambda related, n: dict(zip(related, n)), dict)
+        return state
+
+    @staticmethod
+    def _collect(rows, index, columns, build, empty):
+        """Build one Python object per account from the given columns of its rows (in row order)"""
+        if rows is None or rows.empty:
+            return pd.Series([empty() for _ in range(len(index))], index=index, dtype=object)
+        codes = index.get_indexer(rows['account_id'])
+        keep = np.flatnonzero(codes >= 0)
+        order = keep[np.argsort(codes[keep], kind='stable')]
+        values = [rows[col].to_numpy()[order].tolist() for col in columns]
+        ends = np.cumsum(np.bincount(codes[keep], minlength=len(index))).tolist()
+        starts = [0] + ends[:-1]
+        return pd.Series([build(*(v[a:b] for v in values)) if b > a else empty() for a, b in zip(starts, ends)],
+                         index=index, dtype=object)
+
+    @property
+    def graph(self):
+        """Counterparty graph of every transfer seen so far, saved recent history included"""
+        return self._graph
+
+    def cycle_features(self):
+        """Cycles among the transfers seen so far, plus totals carried from saved state"""
+        if self._cycles is None:
+            cycles = self._graph.cycle_features()
+            if self._prior_cycles is not None:
+                cycles = self._merge_sum(self._prior_cycles, cycles)
+            cycles['cycle_volume'] = cycles['cycle_volume'].round(2)
+            self._cycles = cycles
+        return self._cycles
+
+    @staticmethod
+    def _merge_sum(current, partial):
+        if current is None:
+            return partial
+        levels = list(range(partial.index.nlevels))
+        return pd.concat([current, partial]).groupby(level=levels).sum()
+
+    def features(self):
+        """Per-account feature frame, identical in shape to extract_features_vectorized"""
+        if self._stats is None:
+            return pd.DataFrame(columns=['total_volume', 'transaction_count'] + RiskEngine.FEATURE_COLUMNS[1:])
+
+        round_trip_counts = self._pairs[self._pairs > 1].groupby(level=0).count().rename('round_trip_count')
+        cycles = self.cycle_features().reindex(self._stats.index)
+        windows = pd.DataFrame(columns=self.PEAK_COLUMNS + ['burst_rate']) if self._peaks is None else self._peaks.copy()
+        if self._spans is not None:
+            spans = self._spans.reindex(windows.index)
+            windows['burst_rate'] = RiskEngine.burst_rate(windows['peak_count_1h'], spans['min'], spans['max'], spans['count'])
+        fans = pd.DataFrame(columns=fan.COLUMNS) if self._fans is None else self._fans[fan.COLUMNS]
+        features_df = pd.concat([self._stats, round_trip_counts, cycles, windows, fans], axis=1).fillna(0)
+        features_df['total_volume'] = features_df['total_volume'].round(2)
+        features_df.index.name = 'account_id'
+        return features_df.sort_index()
+
+    def evidence(self):
+        """Top transactions by amount for every account seen so far"""
+        if self._evidence is None:
+            return pd.DataFrame(columns=self.EVIDENCE_COLUMNS)
+        return self._evidence
@@ -0,0 +1,104 @@
+import numpy as np
+import pandas as pd
+
+TYPOLOGIES = ('structuring', 'mule', 'round_trip')
+RING_SIZE = 3
+
+
+def generate_transactions(n_rows, n_accounts=None, structuring=0, mules=0, round_trips=0, days=30,
+                          start='2026-01-01', seed=42, normalized=False):
+    """
+    Random upload in the raw schema of the sample files (account_id, date, time, type,
+    amount, related_account), in time order like a bank export, with typologies planted
+    on distinct accounts (none by default):
+
+    - structuring: 2-5 deposits just under the 50k reporting threshold within a week
+    - mules: a deposit withdrawn again (96-100% of it) within a few hours
+    - round_trips: rings of RING_SIZE accounts passing the money on, and back to the
+      first, within a day
+
+    Everything else is background noise, ~10 rows per account by default. Returns
+    (frame, planted) where planted maps each typology to its accounts' IDs. With
+    `normalized` the frame is already in the shape RiskEngine.prepare_frame produces
+    (account_id, datetime, type, amount, related_account), e.g. for benchmarks and tests
+    that skip parsing.
+    """
+    rng = np.random.default_rng(seed)
+    n_accounts = n_accounts or max(1, n_rows // 10)
+    account_ids = np.array([f"ACC-{i:07d}" for i in range(n_accounts)], dtype=object)
+    span = days * 86400
+
+    counts = {'structuring': structuring, 'mule': mules, 'round_trip': round_trips * RING_SIZE}
+    if sum(counts.values()) > n_accounts:
+        raise ValueError(f"{sum(counts.values())} planted accounts need at least as many accounts, got {n_accounts}")
+    chosen = np.split(rng.choice(n_accounts, sum(counts.values()), replace=False),
+                      np.cumsum(list(counts.values()))[:-1])
+    planted = dict(zip(TYPOLOGIES, chosen))
+
+    parts = []
+    accounts = planted['structuring']
+    if len(accounts):
+        per_account = rng.integers(2, 6, len(accounts))
+        who = np.repeat(accounts, per_account)
+        week_start = np.repeat(rng.integers(0, max(span - 7 * 86400, 1), len(accounts)), per_account)
+        parts.append(_rows(who, week_start + rng.integers(0, 7 * 86400, len(who)), 'Deposit',
+                           rng.uniform(45000, 49999.99, len(who)), rng.integers(0, n_accounts, len(who))))
+
+    accounts = planted['mule']
+    if len(accounts):
+        received = rng.integers(0, max(span - 86400, 1), len(accounts))
+        amount = rng.lognormal(11, 0.8, len(accounts))
+        parts.append(_rows(accounts, received, 'Deposit', amount, rng.integers(0, n_accounts, len(accounts))))
+        parts.append(_rows(accounts, received + rng.integers(600, 6 * 3600, len(accounts)), 'Withdrawal',
+                           amount * rng.uniform(0.96, 1.0, len(accounts)), rng.integers(0, n_accounts, len(accounts))))
+
+    rings = planted['round_trip'].reshape(-1, RING_SIZE)
+    if len(rings):
+        sent = rng.integers(0, max(span - 86400, 1), len(rings))
+        amount = rng.lognormal(11, 0.8, len(rings))
+        for hop in range(RING_SIZE):
+            # Each hop keeps a small cut and passes the rest on to the next account of the ring
+            parts.append(_rows(rings[:, hop], sent, 'Withdrawal', amount * 0.98 ** hop, rings[:, (hop + 1) % RING_SIZE]))
+            sent = sent + rng.integers(600, 3 * 3600, len(rings))
+
+    n_background = max(n_rows - sum(len(part[0]) for part in parts), 0)
+    parts.append(_rows(rng.integers(0, n_accounts, n_background), rng.integers(0, span, n_background),
+                       np.where(rng.random(n_background) < 0.5, 'Deposit', 'Withdrawal'),
+                       rng.lognormal(10, 1.2, n_background), rng.integers(0, n_accounts, n_background)))
+
+    account, seconds, types, amount, related = (np.concatenate(column) for column in zip(*parts))
+    order = np.argsort(seconds, kind='stable')
+    account, seconds, types, amount, related = account[order], seconds[order], types[order], amount[order], related[order]
+
+    planted = {typology: account_ids[codes] for typology, codes in planted.items()}
+    if normalized:
+        return pd.DataFrame({
+            'account_id': account_ids[account],
+            'datetime': pd.Timestamp(start) + pd.to_timedelta(seconds, unit='s'),
+            'type': types,
+            'amount': amount.round(2),
+            'related_account': account_ids[related],
+        }), planted
+
+    # Dates and times by lookup into the few distinct values rather than formatting every row
+    day, second_of_day = np.divmod(seconds, 86400)
+    dates = pd.date_range(start, periods=days + 1, freq='D').strftime('%Y-%m-%d').to_numpy(dtype=object)
+    clock = pd.to_timedelta(np.arange(86400), unit='s')
+    times = pd.Index(clock.components.hours.map('{:02d}'.format) + ':' + clock.components.minutes.map('{:02d}'.format)
+                     + ':' + clock.components.seconds.map('{:02d}'.format)).to_numpy(dtype=object)
+
+    df = pd.DataFrame({
+        'account_id': account_ids[account],
+        'date': dates[day],
+        'time': times[second_of_day],
+        'type': types,
+        'amount': amount.round(2),
+        'related_account': account_ids[related],
+    })
+    return df, planted
+
+
+def _rows(account, seconds, type_, amount, related):
+    types = np.broadcast_to(np.asarray(type_, dtype=object), len(account))
+    return (np.asarray(account, dtype='int64'), np.asarray(seconds, dtype='int64'), types,
+            np.asarray(amount, dtype='float64'), np.asarray(related, dtype='int64'))
@@ -1,5 +1,6 @@
 from django.db import models
 from django.contrib.auth.models import User
+from .money import format_money
 
 class Account(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='accounts', null=True, blank=True)
@@ -7,7 +8,7 @@ class Account(models.Model):
     name = models.CharField(max_length=100)
     type = models.CharField(max_length=50)
     open_date = models.DateField()
-    avg_balance = models.CharField(max_length=50)
+    avg_balance = models.BigIntegerField(default=0)  # paise, see dashboard/money.py
     total_transactions = models.IntegerField()
     flagged_transactions = models.IntegerField()
     risk_history = models.JSONField(default=list)
@@ -24,31 +25,107 @@ class Alert(models.Model):
     alert_id = models.CharField(max_length=20)
     account = models.ForeignKey(Account, on_delete=models.CASCADE, related_name='alerts')
     risk_score = models.IntegerField()
-    type = models.CharField(max_length=100)
+    type = models.CharField(max_length=100)  # pattern names joined with ", "
+    typologies = models.IntegerField(default=0)  # the same patterns as a bitmask, bit i for RiskEngine.PATTERNS[i]
     date = models.DateField()
     time = models.TimeField()
     status = models.CharField(max_length=50)
-    amount = models.CharField(max_length=50)
+    amount = models.BigIntegerField(default=0)  # paise: the account's total volume
     transactions_count = models.IntegerField()
     priority = models.CharField(max_length=20)
+    model_version = models.CharField(max_length=50, blank=True, null=True)  # Isolation Forest version that scored it
+    network_risk_score = models.IntegerField(blank=True, null=True)  # risk reaching the account through its counterparties
 
     def __str__(self):
         return self.alert_id
 
     class Meta:
         unique_together = ('user', 'alert_id')
+        # Dashboard access paths: recent alerts and the 7-day trend, critical count, review queues,
+        # and covering indexes for the suspicious-volume SUM and the typology distribution
+        indexes = [
+            models.Index(fields=['user', 'date', 'time'], name='alert_user_date_time_idx'),
+            models.Index(fields=['user', 'amount'], name='alert_user_amount_idx'),
+            models.Index(fields=['user', 'typologies'], name='alert_user_typologies_idx'),
+            models.Index(fields=['user', 'priority'], name='alert_user_priority_idx'),
+            models.Index(fields=['user', 'status'], name='alert_user_status_idx'),
+        ]
 
 class Transaction(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='transactions', null=True, blank=True)
     account = models.ForeignKey(Account, on_delete=models.CASCADE, related_name='recent_activity')
     date_time = models.DateTimeField()
     type = models.CharField(max_length=50)
-    amount = models.CharField(max_length=50)
+    amount = models.BigIntegerField(default=0)  # paise
     related_account = models.CharField(max_length=20, blank=True, null=True) # from/to
     flag = models.BooleanField(default=False)
 
     def __str__(self):
-        return f"{self.type} - {self.amount}"
+        return f"{self.type} - {format_money(self.amount)}"
+
+    class Meta:
+        # An account's activity, newest first (account view, SAR evidence)
+        indexes = [
+            models.Index(fields=['user', 'account', '-date_time'], name='txn_user_account_time_idx'),
+        ]
+
+class AccountFeatureState(models.Model):
+    # Running per-account features, updated incrementally by each upload (see dashboard/feature_store.py)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='feature_states', null=True, blank=True)
+    account_id = models.CharField(max_length=20)
+    total_volume = models.FloatField(default=0)
+    transaction_count = models.IntegerField(default=0)
+    structuring_count = models.IntegerField(default=0)
+    mule_score = models.IntegerField(default=0)
+    cycle_count = models.IntegerField(default=0)
+    cycle_volume = models.FloatField(default=0)
+    # Dated transactions only; the last one continues the mule check in the next upload
+    dated_count = models.IntegerField(default=0)
+    first_datetime = models.DateTimeField(blank=True, null=True)
+    last_datetime = models.DateTimeField(blank=True, null=True)
+    last_type = models.CharField(max_length=50, blank=True, null=True)
+    last_amount = models.FloatField(default=0)
+    peaks = models.JSONField(default=dict) # rolling-window peaks and fan windows, e.g. peak_count_24h
+    recent = models.JSONField(default=list) # [epoch seconds, amount, type, counterparty] inside the widest window
+    counterparties = models.JSONField(default=dict) # counterparty -> transaction count (heaviest only)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Features for {self.account_id}"
+
+    class Meta:
+        unique_together = ('user', 'account_id')
+
+class FeatureStoreUpload(models.Model):
+    # A file folded into the user's feature store, by content hash, so uploading it again doesn't count it twice
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='feature_store_uploads')
+    content_key = models.CharField(max_length=100)
+    task_id = models.CharField(max_length=50, blank=True, null=True)
+    applied_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Upload {self.content_key[:12]} for {self.user}"
+
+    class Meta:
+        unique_together = ('user', 'content_key')
+
+class DashboardSummary(models.Model):
+    # Running dashboard totals of one user, updated with every upload and alert edit (see dashboard/summary.py)
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='dashboard_summary')
+    total_accounts = models.IntegerField(default=0)
+    flagged_accounts = models.IntegerField(default=0)  # accounts with at least one alert
+    total_transactions = models.BigIntegerField(default=0)
+    total_alerts = models.IntegerField(default=0)
+    suspicious_volume = models.BigIntegerField(default=0)  # paise, sum of Alert.amount
+    daily_alerts = models.JSONField(default=dict)  # 'YYYY-MM-DD' -> alerts dated that day
+    typologies = models.JSONField(default=dict)  # pattern name -> alerts with that pattern
+    priorities = models.JSONField(default=dict)  # priority -> alerts
+    statuses = models.JSONField(default=dict)  # status -> alerts
+    account_types = models.JSONField(default=dict)  # Account.type -> accounts
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Dashboard summary for {self.user}"
 
 class ProcessingTask(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='tasks', null=True, blank=True)
@@ -59,11 +136,21 @@ class ProcessingTask(models.Model):
         ('Failed', 'Failed'),
     ]
     task_id = models.CharField(max_length=50, unique=True)
-    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='Pending')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='Pending', db_index=True)
     progress = models.IntegerField(default=0)
     total_records = models.IntegerField(default=0)
     processed_records = models.IntegerField(default=0)
+    invalid_records = models.IntegerField(default=0) # rows with an unparseable date or amount
     error_message = models.TextField(blank=True, null=True)
+    file_path = models.CharField(max_length=500, blank=True, null=True) # spooled upload on disk
+    file_size = models.BigIntegerField(default=0)
+    # Job queue lease (see dashboard/jobs.py)
+    worker_id = models.CharField(max_length=100, blank=True, null=True)
+    lease_expires_at = models.DateTimeField(blank=True, null=True)
+    attempts = models.IntegerField(default=0)
+    # Parse cache lookups for this task's upload (see dashboard/ml/parse_cache.py)
+    cache_hits = models.IntegerField(default=0)
+    cache_misses = models.IntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -0,0 +1,43 @@
+"""
+Money is stored as integer minor units (paise) in Account.avg_balance, Alert.amount
+and Transaction.amount, so totals are exact SQL SUMs. Values are only turned into
+display strings like "₹8,750,000" at the API edge (see serializers.MoneyField).
+"""
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+
+import numpy as np
+
+CURRENCY_SYMBOL = '₹'
+# Stripped from amounts given as strings, e.g. "₹1,234.50" (uploads and API input alike)
+AMOUNT_JUNK = ('₹', '$', ',', ' ')
+MINOR_UNITS = 100
+
+
+def to_minor(value):
+    """Minor units of an amount given as a number or a string like "₹1,234.50" (ValueError if unparseable)"""
+    if isinstance(value, str):
+        for junk in AMOUNT_JUNK:
+            value = value.replace(junk, '')
+    try:
+        amount = Decimal(str(value))
+    except InvalidOperation:
+        raise ValueError(f"Not an amount: {value!r}")
+    if not amount.is_finite():
+        raise ValueError(f"Not an amount: {value!r}")
+    return int((amount * MINOR_UNITS).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+
+def minor_units(amounts):
+    """Minor units of an array of amounts (floats, already rounded to paise by the parser)"""
+    return np.round(np.asarray(amounts, dtype='float64') * MINOR_UNITS).astype('int64')
+
+
+def format_money(minor):
+    """Display string for minor units: "₹8,750,000", "₹1,234.50"; None stays None"""
+    if minor is None:
+        return None
+    sign = '-' if minor < 0 else ''
+    whole, fraction = divmod(abs(int(minor)), MINOR_UNITS)
+    if fraction:
+        return f"{sign}{CURRENCY_SYMBOL}{whole:,}.{fraction:02d}"
+    return f"{sign}{CURRENCY_SYMBOL}{whole:,}"
@@ -0,0 +1,115 @@
+"""
+Real-time scoring service behind /api/score-transaction/.
+
+Each user gets a RealtimeScorer that lives in the process and holds every account's
+running state in memory. An account the scorer hasn't seen yet starts from its saved
+feature-store state (when the feature store is on), so it is scored on the history
+its uploads built up. A background thread pickles every scorer to
+AML_REALTIME_SNAPSHOT_DIR each AML_REALTIME_SNAPSHOT_SECONDS (and once more at exit),
+and a restarted process picks up from those snapshots.
+
+State isn't shared between processes: serve the endpoint from a single process (with
+threads), or route each user to a fixed process.
+"""
+import atexit
+import logging
+import os
+import pickle
+import threading
+import time
+import uuid
+
+from django.conf import settings
+
+from . import feature_store
+from .feature_store import FeatureStore
+from .ml.realtime import RealtimeScorer
+
+logger = logging.getLogger(__name__)
+
+_scorers = {}
+_lock = threading.Lock()
+_snapshotter = None
+
+
+def snapshot_dir():
+    return getattr(settings, 'AML_REALTIME_SNAPSHOT_DIR', None)
+
+
+def scorer_for(user):
+    """The user's scorer, restored from its snapshot the first time it is needed"""
+    scorer = _scorers.get(user.pk)
+    if scorer is not None:
+        return scorer
+    with _lock:
+        scorer = _scorers.get(user.pk)
+        if scorer is None:
+            scorer = _restore(user.pk) or RealtimeScorer()
+            if feature_store.enabled():
+                scorer.load_history = _history_loader(user)
+            _scorers[user.pk] = scorer
+            _start_snapshots()
+    return scorer
+
+
+def _history_loader(user):
+    store = FeatureStore(user)
+
+    def load(account_id):
+        state = store.load([account_id])
+        return None if state.empty else state.iloc[0]
+    return load
+
+
+def _path(user_pk):
+    return os.path.join(snapshot_dir(), f"user-{user_pk}.pickle")
+
+
+def _restore(user_pk):
+    if not snapshot_dir():
+        return None
+    try:
+        with open(_path(user_pk), 'rb') as f:
+            scorer = pickle.load(f)
+    except FileNotFoundError:
+        return None
+    logger.info("Real-time scoring: restored %d accounts for user %s", len(scorer.accounts), user_pk)
+    return scorer
+
+
+def snapshot_all():
+    """Write every scorer's state to its snapshot file (atomically, like model files)"""
+    if not snapshot_dir():
+        return
+    os.makedirs(snapshot_dir(), exist_ok=True)
+    for user_pk, scorer in list(_scorers.items()):
+        path = _path(user_pk)
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        try:
+            # Scoring waits while the state is pickled
+            with scorer.lock:
+                with open(tmp_path, 'wb') as f:
+                    pickle.dump(scorer, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+
+def _start_snapshots():
+    global _snapshotter
+    interval = getattr(settings, 'AML_REALTIME_SNAPSHOT_SECONDS', 60)
+    if _snapshotter is not None or not snapshot_dir() or not interval:
+        return
+
+    def run():
+        while True:
+            time.sleep(interval)
+            try:
+                snapshot_all()
+            except Exception:
+                logger.exception("Real-time scoring: snapshot failed")
+
+    _snapshotter = threading.Thread(target=run, name='realtime-snapshots', daemon=True)
+    _snapshotter.start()
+    atexit.register(snapshot_all)
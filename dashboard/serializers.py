@@ -1,20 +1,84 @@
+from django.db import models
 from rest_framework import serializers
+from .ml.risk_engine import RiskEngine
 from .models import Account, Alert, Transaction
+from .money import format_money, to_minor, MINOR_UNITS
+
+class MoneyField(serializers.Field):
+    """Paise in the model, "₹8,750,000"-style strings in the API (numbers are accepted too)"""
+
+    def to_representation(self, value):
+        return format_money(value)
+
+    def to_internal_value(self, data):
+        try:
+            return to_minor(data)
+        except ValueError:
+            raise serializers.ValidationError("Enter an amount, e.g. 1250.50 or \"₹1,250.50\".")
 
 class TransactionSerializer(serializers.ModelSerializer):
+    amount = MoneyField()
+
     class Meta:
         model = Transaction
         fields = '__all__'
 
+def account_trends(account_pks):
+    """
+    Daily transaction volume of the last 7 days (oldest first) for each of these Account
+    pks, from one query grouped by (account, day) per 900 accounts.
+    """
+    from django.utils import timezone
+    from django.db.models import Sum
+    from django.db.models.functions import TruncDate
+    from datetime import timedelta
+
+    end_date = timezone.now().date()
+    start_date = end_date - timedelta(days=6)
+    days = [start_date + timedelta(days=i) for i in range(7)]
+    account_pks = list(set(account_pks))
+    totals = {}
+    for start in range(0, len(account_pks), 900):
+        totals.update(
+            ((account_pk, day), total) for account_pk, day, total in
+            Transaction.objects.filter(account_id__in=account_pks[start:start + 900], date_time__date__gte=start_date)
+            .annotate(day=TruncDate('date_time'))
+            .values_list('account_id', 'day')
+            .annotate(total=Sum('amount'))
+        )
+    return {pk: [(totals.get((pk, day)) or 0) / MINOR_UNITS for day in days] for pk in account_pks}
+
+class AlertListSerializer(serializers.ListSerializer):
+    """Serializes alerts with the trends of all their accounts looked up together, not one query per alert"""
+
+    def to_representation(self, data):
+        alerts = list(data.all() if isinstance(data, models.manager.BaseManager) else data)
+        try:
+            self.child.trends = account_trends(alert.account_id for alert in alerts)
+        except Exception as e:
+            print(f"Error calculating trends: {e}")
+            self.child.trends = {}
+        return super().to_representation(alerts)
+
 class AlertSerializer(serializers.ModelSerializer):
     account_name = serializers.CharField(source='account.name', read_only=True)
     account_id_display = serializers.CharField(source='account.account_id', read_only=True)
     trend = serializers.SerializerMethodField()
+    amount = MoneyField()
 
     class Meta:
         model = Alert
         fields = '__all__'
         extra_fields = ['account_name', 'account_id_display', 'trend']
+        # Derived from `type` (see validate), so the two can't disagree
+        read_only_fields = ['typologies']
+        list_serializer_class = AlertListSerializer
+
+    def validate(self, attrs):
+        attrs = super().validate(attrs)
+        if 'type' in attrs:
+            attrs['typologies'] = RiskEngine.labels_mask(attrs['type'].split(RiskEngine.PATTERN_SEPARATOR))
+        return attrs
 
     def to_representation(self, instance):
         representation = super().to_representation(instance)
@@ -23,35 +87,12 @@ class AlertSerializer(serializers.ModelSerializer):
         return representation
 
     def get_trend(self, obj):
-        from django.utils import timezone
-        from datetime import timedelta
-        
+        # Lists precompute every account's trend (AlertListSerializer); single alerts look theirs up
+        trends = getattr(self, 'trends', None)
+        if trends is not None:
+            return trends.get(obj.account_id, [0] * 7)
         try:
-            # Get last 7 days
-            end_date = timezone.now().date()
-            start_date = end_date - timedelta(days=6)
-            
-            daily_vol = []
-            
-            # Get all transactions for this account in range
-            txns = Transaction.objects.filter(
-                account=obj.account, 
-                date_time__date__gte=start_date
-            )
-            
-            for i in range(7):
-                d = start_date + timedelta(days=i)
-                day_txns = [t for t in txns if t.date_time and t.date_time.date() == d]
-                vol = 0.0
-                for t in day_txns:
-                    try:
-                        clean_amt = float(str(t.amount).replace('₹','').replace(',','').replace('$',''))
-                        vol += clean_amt
-                    except:
-                        pass
-                daily_vol.append(vol)
-                 
-            return daily_vol
+            return account_trends([obj.account_id])[obj.account_id]
         except Exception as e:
             print(f"Error calculating trend: {e}")
             return [0] * 7
@@ -59,6 +100,7 @@ class AlertSerializer(serializers.ModelSerializer):
 class AccountSerializer(serializers.ModelSerializer):
     alerts = AlertSerializer(many=True, read_only=True)
     recent_activity = TransactionSerializer(many=True, read_only=True)
+    avg_balance = MoneyField()
 
     class Meta:
         model = Account
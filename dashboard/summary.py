@@ -0,0 +1,173 @@
+"""
+Per-user dashboard rollup (DashboardSummary rows) behind AlertViewSet.stats.
+
+Everything that adds, edits or removes accounts, alerts or transactions describes the
+change as a SummaryDelta and applies it in the same transaction as the rows: upload
+processing, generate_alerts and the alert API. Reading the dashboard is then one row
+lookup however much data the user has. A user without a summary gets one rebuilt from
+the tables the first time it is needed, and `manage.py rebuild_dashboard_summary`
+recomputes them to repair drift (e.g. after rows were changed outside these paths).
+"""
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import Count, Sum
+
+from .ml.risk_engine import RiskEngine
+from .models import Account, Alert, DashboardSummary, Transaction
+
+BREAKDOWNS = ['daily_alerts', 'typologies', 'priorities', 'statuses', 'account_types']
+# Account IDs per IN (...) lookup
+BATCH_SIZE = 900
+
+
+class SummaryDelta:
+    """Pending changes to one user's summary: counter and per-key breakdown increments"""
+
+    def __init__(self):
+        self.counters = Counter()
+        self.breakdowns = {name: Counter() for name in BREAKDOWNS}
+
+    def add_alerts(self, alerts, sign=1):
+        for alert in alerts:
+            self.counters['total_alerts'] += sign
+            self.counters['suspicious_volume'] += sign * alert.amount
+            self.breakdowns['daily_alerts'][str(alert.date)] += sign
+            for label in RiskEngine.mask_labels(alert.typologies):
+                self.breakdowns['typologies'][label] += sign
+            self.breakdowns['priorities'][alert.priority] += sign
+            self.breakdowns['statuses'][alert.status] += sign
+        return self
+
+    def add_accounts(self, accounts, sign=1):
+        for account in accounts:
+            self.counters['total_accounts'] += sign
+            self.breakdowns['account_types'][account.type] += sign
+        return self
+
+
+def for_user(user):
+    """The user's summary, rebuilt from the tables if there isn't one yet"""
+    return DashboardSummary.objects.filter(user=user).first() or rebuild(user)
+
+
+def lock(user):
+    """
+    Lock the user's summary row until the end of the transaction, so a writer that
+    counts existing rows before inserting doesn't race another one doing the same
+    """
+    if not DashboardSummary.objects.filter(user=user).exists():
+        # Counted before the caller writes, so its delta then applies on top
+        rebuild(user)
+    DashboardSummary.objects.select_for_update().get(user=user)
+
+
+def apply(user, delta):
+    """Add a delta to the user's summary; call it in the transaction that wrote the rows"""
+    with transaction.atomic():
+        summary = DashboardSummary.objects.select_for_update().filter(user=user).first()
+        if summary is None:
+            # Counted from the tables, which already hold the rows this delta describes
+            rebuild(user)
+            return
+        for name, change in delta.counters.items():
+            setattr(summary, name, getattr(summary, name) + change)
+        for name, changes in delta.breakdowns.items():
+            counts = getattr(summary, name)
+            for key, change in changes.items():
+                counts[key] = counts.get(key, 0) + change
+                if not counts[key]:
+                    del counts[key]
+        summary.save()
+
+
+def rebuild(user):
+    """Recompute the user's summary from the Account, Alert and Transaction tables"""
+    accounts = Account.objects.filter(user=user)
+    alerts = Alert.objects.filter(user=user)
+    totals = alerts.aggregate(total_alerts=Count('id'), suspicious_volume=Sum('amount'))
+
+    typologies = Counter()
+    for mask, count in alerts.values_list('typologies').annotate(count=Count('id')):
+        for label in RiskEngine.mask_labels(mask):
+            typologies[label] += count
+
+    summary, _ = DashboardSummary.objects.update_or_create(user=user, defaults={
+        'total_accounts': accounts.count(),
+        'flagged_accounts': accounts.filter(alerts__isnull=False).distinct().count(),
+        'total_transactions': Transaction.objects.filter(user=user).count(),
+        'total_alerts': totals['total_alerts'],
+        'suspicious_volume': totals['suspicious_volume'] or 0,
+        'daily_alerts': {str(day): count for day, count in alerts.values_list('date').annotate(count=Count('id'))},
+        'typologies': dict(typologies),
+        'priorities': dict(alerts.values_list('priority').annotate(count=Count('id'))),
+        'statuses': dict(alerts.values_list('status').annotate(count=Count('id'))),
+        'account_types': dict(accounts.values_list('type').annotate(count=Count('id'))),
+    })
+    return summary
+
+
+def accounts_with_alerts(user, account_pks):
+    """The subset of these Account pks that already have alerts"""
+    account_pks = list(set(account_pks))
+    found = set()
+    for start in range(0, len(account_pks), BATCH_SIZE):
+        batch = account_pks[start:start + BATCH_SIZE]
+        found.update(Alert.objects.filter(user=user, account_id__in=batch).values_list('account_id', flat=True).distinct())
+    return found
+
+
+def alert_saved(alert, before=None):
+    """Record an alert created (before=None) or edited through the API; call after saving it"""
+    if alert.user_id is None:
+        return
+    delta = SummaryDelta().add_alerts([alert])
+    if before is not None:
+        delta.add_alerts([before], sign=-1)
+    if before is None or before.account_id != alert.account_id:
+        # The alert's account is flagged now; one it moved away from may not be any more
+        if not Alert.objects.filter(account_id=alert.account_id).exclude(pk=alert.pk).exists():
+            delta.counters['flagged_accounts'] += 1
+        if before is not None and not Alert.objects.filter(account_id=before.account_id).exists():
+            delta.counters['flagged_accounts'] -= 1
+    apply(alert.user, delta)
+
+
+def alert_deleted(alert):
+    """Record an alert deleted through the API; call after deleting it"""
+    if alert.user_id is None:
+        return
+    delta = SummaryDelta().add_alerts([alert], sign=-1)
+    if not Alert.objects.filter(account_id=alert.account_id).exists():
+        delta.counters['flagged_accounts'] -= 1
+    apply(alert.user, delta)
+
+
+def account_saved(account, before=None):
+    """Record an account created (before=None) or edited through the API; call after saving it"""
+    if before is not None and before.user_id != account.user_id:
+        # Moved to another user, flags and all: rare enough to recount both
+        for user in (before.user, account.user):
+            if user is not None:
+                rebuild(user)
+        return
+    if account.user_id is None:
+        return
+    delta = SummaryDelta().add_accounts([account])
+    if before is not None:
+        delta.add_accounts([before], sign=-1)
+    apply(account.user, delta)
+
+
+def account_deleted(account, alerts, transaction_count):
+    """
+    Record an account deleted through the API, with the alerts and transaction count it
+    had (deleted with it); call after deleting it
+    """
+    if account.user_id is None:
+        return
+    delta = SummaryDelta().add_accounts([account], sign=-1).add_alerts(alerts, sign=-1)
+    delta.counters['total_transactions'] -= transaction_count
+    if alerts:
+        delta.counters['flagged_accounts'] -= 1
+    apply(account.user, delta)
@@ -1,3 +1,651 @@
-from django.test import TestCase
+import io
+import os
+import pickle
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import types
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, time, timedelta, timezone as dt_timezone
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+import pandas as pd
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection, transaction
+from django.db.models import Sum
+from django.test import SimpleTestCase, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from . import jobs, realtime, summary
+from .feature_store import FeatureStore, stored_transaction_chunks
+from .management.commands.train_model import reservoir_sample
+from .ml.fan import fan_features
+from .ml.graph import CounterpartyGraph
+from .ml.realtime import RealtimeScorer
+from .ml.registry import ModelRegistry
+from .ml.risk_engine import RiskEngine
+from .ml.streaming import StreamingFeatureAccumulator
+from .ml.synthetic import generate_transactions
+from .models import Account, AccountFeatureState, Alert, DashboardSummary, FeatureStoreUpload, ProcessingTask, Transaction
+from .views import background_process
+
+
+class FakeSARGenerator:
+    def __init__(self, api_key):
+        pass
+
+    def generate_report(self, **kwargs):
+        return "report"
+
+
+class DashboardQueryPlanTest(TestCase):
+    """
+    EXPLAINs every query the dashboard's hot endpoints run and fails on full table
+    scans. Seeds AML_EXPLAIN_TEST_ROWS transactions (20k by default; run with 10000000
+    to check the plans at production scale) spread over several users, so a per-user
+    filter is selective the way it is in production.
+    """
+    USERS = 10
+
+    @classmethod
+    def setUpTestData(cls):
+        n_rows = int(os.environ.get('AML_EXPLAIN_TEST_ROWS', 20000))
+        n_accounts = max(cls.USERS, n_rows // 10)
+        cls.users = [User.objects.create_user(f'plan-user-{i}') for i in range(cls.USERS)]
+        start = datetime(2026, 1, 1, tzinfo=dt_timezone.utc)
+
+        for first in range(0, n_accounts, 10000):
+            batch = range(first, min(first + 10000, n_accounts))
+            Account.objects.bulk_create([
+                Account(user=cls.users[i % cls.USERS], account_id=f'ACC-{i:08d}', name=f'Account {i}', type='Checking',
+                        open_date=date(2025, 1, 1), avg_balance=0, total_transactions=10, flagged_transactions=0)
+                for i in batch
+            ])
+        accounts = list(Account.objects.order_by('id').values_list('id', 'user_id'))
+
+        alerts = [
+            Alert(user_id=user_id, account_id=account_id, alert_id=f'AL-{account_id}', risk_score=80, type='Structuring',
+                  date=date(2026, 1, 1) + timedelta(days=account_id % 30), time=time(account_id % 24),
+                  status='Open', amount=100000, transactions_count=10, priority='Critical' if account_id % 3 else 'High')
+            for account_id, user_id in accounts[::20]
+        ]
+        Alert.objects.bulk_create(alerts, batch_size=10000)
+
+        for first in range(0, n_rows, 50000):
+            Transaction.objects.bulk_create([
+                Transaction(user_id=accounts[i % len(accounts)][1], account_id=accounts[i % len(accounts)][0],
+                            date_time=start + timedelta(minutes=i), type='Deposit', amount=i)
+                for i in range(first, min(first + 50000, n_rows))
+            ], batch_size=10000)
+
+        # Plans on real statistics, as a long-running database has them
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def setUp(self):
+        self.user = self.users[0]
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.alert = Alert.objects.filter(user=self.user).first()
+
+    def hot_queries(self, method, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = getattr(self.client, method)(url)
+        self.assertEqual(response.status_code, 200)
+        return [q['sql'] for q in queries.captured_queries if q['sql'].startswith('SELECT')]
+
+    def full_scans(self, sql):
+        with connection.cursor() as cursor:
+            if connection.vendor == 'sqlite':
+                cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+                steps = [row[-1] for row in cursor.fetchall()]
+                # "SCAN table" reads every row; index lookups are "SEARCH ... USING INDEX"
+                return [step for step in steps if step.startswith('SCAN') and 'dashboard_' in step]
+            if connection.vendor == 'postgresql':
+                cursor.execute('SET LOCAL enable_seqscan = off')
+                cursor.execute(f'EXPLAIN {sql}')
+                return [row[0] for row in cursor.fetchall() if 'Seq Scan on dashboard_' in row[0]]
+        self.skipTest(f'No plan check for {connection.vendor}')
+
+    def assertNoFullScans(self, sqls):
+        self.assertTrue(sqls)
+        for sql in sqls:
+            self.assertEqual(self.full_scans(sql), [], sql)
+
+    def test_stats(self):
+        self.assertNoFullScans(self.hot_queries('get', '/api/alerts/stats/'))
+
+    def test_account_transactions(self):
+        account = self.alert.account.account_id
+        self.assertNoFullScans(self.hot_queries('get', f'/api/accounts/{account}/transactions/'))
+
+    def test_sar_generation(self):
+        sar_module = types.ModuleType('dashboard.rag.utils.sar_generator')
+        sar_module.SARGenerator = FakeSARGenerator
+        with mock.patch.dict(sys.modules, {'dashboard.rag.utils.sar_generator': sar_module}):
+            self.assertNoFullScans(self.hot_queries('post', f'/api/generate-sar/{self.alert.id}/'))
+
+
+class AlertListQueryCountTest(TestCase):
+    """
+    Listing alerts runs the same queries for 5 alerts as for 50: accounts come with the
+    alerts and every account's trend from one grouped query, nothing per alert.
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user('list-user')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def add_alerts(self, n):
+        first = Alert.objects.count()
+        for i in range(first, first + n):
+            account = Account.objects.create(
+                user=self.user, account_id=f'ACC-LIST-{i:04d}', name=f'Account {i}', type='Checking',
+                open_date=date(2025, 1, 1), avg_balance=0, total_transactions=1, flagged_transactions=1)
+            Alert.objects.create(
+                user=self.user, account=account, alert_id=f'AL-LIST-{i:04d}', risk_score=80, type='Structuring',
+                date=date(2026, 1, 1), time=time(12), status='Open', amount=100000, transactions_count=1,
+                priority='High')
+            Transaction.objects.create(user=self.user, account=account, date_time=timezone.now() - timedelta(days=i % 5),
+                                       type='Deposit', amount=100 * (i + 1))
+
+    def list_alerts(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/alerts/')
+        self.assertEqual(response.status_code, 200)
+        return response.data, len(queries.captured_queries)
+
+    def test_constant_query_count(self):
+        self.add_alerts(5)
+        _, few = self.list_alerts()
+        self.add_alerts(45)
+        alerts, many = self.list_alerts()
+        self.assertEqual(len(alerts), 50)
+        self.assertEqual(few, many)
+        self.assertLessEqual(many, 2)
+
+    def test_trends_match_single_alert(self):
+        self.add_alerts(10)
+        alerts, _ = self.list_alerts()
+        self.assertTrue(any(sum(alert['trend']) for alert in alerts))
+        for alert in alerts:
+            response = self.client.get(f"/api/alerts/{alert['id']}/")
+            self.assertEqual(response.data['trend'], alert['trend'])
+
+    def test_typologies_follow_type(self):
+        self.add_alerts(1)
+        alert = Alert.objects.get()
+        response = self.client.patch(f'/api/alerts/{alert.pk}/', {'type': 'Money Mule, Fan-In', 'typologies': 1},
+                                     format='json')
+        self.assertEqual(response.status_code, 200)
+        alert.refresh_from_db()
+        self.assertEqual(RiskEngine.mask_labels(alert.typologies), ['Money Mule', 'Fan-In'])
+        self.assertEqual(DashboardSummary.objects.get(user=self.user).typologies, {'Money Mule': 1, 'Fan-In': 1})
+
+        self.client.patch(f'/api/alerts/{alert.pk}/', {'typologies': 0}, format='json')
+        alert.refresh_from_db()
+        self.assertEqual(alert.typologies, RiskEngine.labels_mask(['Money Mule', 'Fan-In']))
+
+
+class AccountSummaryTest(TestCase):
+    """Account API writes adjust the dashboard summary to what a recount gives"""
+
+    def setUp(self):
+        self.user = User.objects.create_user('summary-user')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def assertSummaryMatchesRecount(self):
+        fields = ['total_accounts', 'flagged_accounts', 'total_transactions', 'total_alerts', 'suspicious_volume',
+                  'daily_alerts', 'typologies', 'priorities', 'statuses', 'account_types']
+        kept = DashboardSummary.objects.filter(user=self.user).values(*fields).get()
+        summary.rebuild(self.user)
+        self.assertEqual(kept, DashboardSummary.objects.filter(user=self.user).values(*fields).get())
+
+    def test_account_writes(self):
+        summary.rebuild(self.user)
+        data = {'user': self.user.pk, 'account_id': 'ACC-SUM-1', 'name': 'Account 1', 'type': 'Checking',
+                'open_date': '2025-01-01', 'avg_balance': '100.00', 'total_transactions': 1, 'flagged_transactions': 0}
+        self.assertEqual(self.client.post('/api/accounts/', data, format='json').status_code, 201)
+        self.assertSummaryMatchesRecount()
+
+        response = self.client.patch('/api/accounts/ACC-SUM-1/', {'type': 'Savings'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertSummaryMatchesRecount()
+
+        account = Account.objects.get(account_id='ACC-SUM-1')
+        Alert.objects.create(user=self.user, account=account, alert_id='AL-SUM-1', risk_score=80, type='Structuring',
+                             typologies=RiskEngine.labels_mask(['Structuring']), date=date(2026, 1, 1), time=time(12),
+                             status='Open', amount=100000, transactions_count=1, priority='High')
+        Transaction.objects.create(user=self.user, account=account, date_time=timezone.now(), type='Deposit', amount=100)
+        summary.rebuild(self.user)
+        self.assertEqual(self.client.delete('/api/accounts/ACC-SUM-1/').status_code, 204)
+        self.assertSummaryMatchesRecount()
+        self.assertEqual(DashboardSummary.objects.get(user=self.user).total_accounts, 0)
+
+    def test_lock_creates_the_row(self):
+        Account.objects.create(user=self.user, account_id='ACC-SUM-2', name='Account 2', type='Checking',
+                               open_date=date(2025, 1, 1), avg_balance=0, total_transactions=1, flagged_transactions=0)
+        with transaction.atomic():
+            summary.lock(self.user)
+            self.assertTrue(DashboardSummary.objects.filter(user=self.user).exists())
+            added = Account.objects.create(user=self.user, account_id='ACC-SUM-3', name='Account 3', type='Savings',
+                                           open_date=date(2025, 1, 1), avg_balance=0, total_transactions=1,
+                                           flagged_transactions=0)
+            summary.apply(self.user, summary.SummaryDelta().add_accounts([added]))
+        self.assertEqual(DashboardSummary.objects.get(user=self.user).total_accounts, 2)
+        self.assertSummaryMatchesRecount()
+
+
+class OneDirectionUploadTest(TestCase):
+    """Uploads whose linked rows all go one way (e.g. only withdrawals) still score"""
+    ROWS = (
+        'account_id,date,time,type,amount,related_account\n'
+        'ACC-1,2026-01-01,10:00:00,Withdrawal,100.00,ACC-2\n'
+        'ACC-1,2026-01-02,11:00:00,Withdrawal,250.00,ACC-3\n'
+        'ACC-2,2026-01-03,12:00:00,Withdrawal,75.50,ACC-3\n'
+    )
+
+    def setUp(self):
+        self.user = User.objects.create_user('one-direction')
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+
+    def test_fan_features(self):
+        df = RiskEngine().prepare_frame(pd.read_csv(io.StringIO(self.ROWS)))
+        features = fan_features(df)
+        self.assertEqual(list(features['fan_out_7d']), [2, 1])
+        self.assertEqual(list(features['fan_in_7d']), [0, 0])
+
+    def test_upload(self):
+        path = os.path.join(self.tmp, 'withdrawals.csv')
+        with open(path, 'w') as f:
+            f.write(self.ROWS)
+        ProcessingTask.objects.create(task_id='one-direction', user=self.user, file_path=path)
+        with self.settings(AML_PARSE_CACHE_DIR=os.path.join(self.tmp, 'cache')):
+            background_process('one-direction', path, self.user.id)
+        task = ProcessingTask.objects.get(task_id='one-direction')
+        self.assertEqual(task.status, 'Completed', task.error_message)
+        self.assertEqual(task.total_records, 3)
+
+
+class FeatureStoreUploadTest(TestCase):
+    """The feature store counts each uploaded file once and isn't rebuilt from the few rows uploads store"""
+
+    def setUp(self):
+        self.user = User.objects.create_user('feature-store')
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+        # More rows per account than the evidence Transactions an upload keeps
+        rows = [f'ACC-{i % 2},2026-01-{1 + i:02d},10:00:00,Deposit,{1000 + i}.00,ACC-9' for i in range(20)]
+        self.rows = 'account_id,date,time,type,amount,related_account\n' + '\n'.join(rows) + '\n'
+
+    def upload(self, name):
+        path = os.path.join(self.tmp, name)
+        with open(path, 'w') as f:
+            f.write(self.rows)
+        ProcessingTask.objects.create(task_id=name, user=self.user, file_path=path)
+        with self.settings(AML_PARSE_CACHE_DIR=os.path.join(self.tmp, 'cache'), AML_FEATURE_STORE=True):
+            background_process(name, path, self.user.id)
+        return ProcessingTask.objects.get(task_id=name)
+
+    def counted(self):
+        return AccountFeatureState.objects.filter(user=self.user).aggregate(n=Sum('transaction_count'))['n']
+
+    def test_reupload_is_rescored(self):
+        self.assertEqual(self.upload('first.csv').status, 'Completed')
+        alerts, transactions = Alert.objects.filter(user=self.user).count(), Transaction.objects.count()
+        task = self.upload('again.csv')
+        self.assertEqual((task.status, task.cache_hits, task.total_records), ('Completed', 1, 20))
+        self.assertIn('re-scored against the saved state', task.error_message)
+        self.assertEqual(self.counted(), 20)
+        self.assertEqual(Alert.objects.filter(user=self.user).count(), alerts)
+        self.assertEqual(Transaction.objects.count(), transactions)
+
+    def test_reupload_after_retrain_refreshes_scores(self):
+        models_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, models_dir)
+        engine = RiskEngine()
+        with mock.patch('dashboard.ml.risk_engine.registry', ModelRegistry(models_dir)) as registry:
+            engine.fit_features(engine.extract_features_vectorized(realtime_frame(2000, 100)))
+            self.upload('first.csv')
+            account = Account.objects.get(user=self.user, account_id='ACC-0')
+            alert = Alert.objects.filter(account=account).first() or Alert.objects.create(
+                user=self.user, account=account, alert_id='AL-RESCORE', risk_score=0, type='', date=date(2026, 1, 1),
+                time=time(12), status='Open', amount=0, transactions_count=0, priority='High', model_version='v1')
+            self.assertEqual(alert.model_version, 'v1')
+
+            # Retrained on different data, so the same accounts score differently
+            engine.fit_features(engine.extract_features_vectorized(realtime_frame(4000, 40)))
+            task = self.upload('again.csv')
+            expected = engine.score_features(FeatureStore(self.user).features(), columnar=True).set_index('account_id')
+            self.assertEqual(registry.manifest()['current'], 'v2')
+
+        self.assertEqual(task.status, 'Completed')
+        self.assertEqual(self.counted(), 20)
+        alert.refresh_from_db()
+        self.assertEqual((alert.model_version, alert.risk_score), ('v2', expected.loc['ACC-0', 'risk_score']))
+        self.assertEqual(DashboardSummary.objects.get(user=self.user).total_alerts, Alert.objects.filter(user=self.user).count())
+
+    def test_rebuild_keeps_upload_history(self):
+        self.upload('first.csv')
+        with self.assertRaises(CommandError):
+            call_command('rebuild_feature_store', user=self.user.username, stdout=io.StringIO())
+        self.assertEqual(self.counted(), 20)
+
+        call_command('rebuild_feature_store', user=self.user.username, force=True, stdout=io.StringIO())
+        self.assertEqual(self.counted(), Transaction.objects.filter(user=self.user).count())
+        self.assertFalse(FeatureStoreUpload.objects.filter(user=self.user).exists())
+
+
+class ShardedAnalyzeTest(SimpleTestCase):
+    """RiskEngine.analyze gives the same results on a process pool as serially"""
+
+    def test_matches_serial(self):
+        df = pd.read_csv(os.path.join(settings.BASE_DIR, 'aml_transactions_1000_rows_100_suspicious.csv'))
+        serial = RiskEngine(df.to_dict('records')).analyze(workers=1, columnar=True)
+        sharded = RiskEngine(df.to_dict('records')).analyze(workers=3, columnar=True)
+        self.assertGreater(len(serial), 0)
+        pd.testing.assert_frame_equal(sharded.sort_values('account_id', ignore_index=True),
+                                      serial.sort_values('account_id', ignore_index=True))
+
+
+class CalibratedScoreTest(SimpleTestCase):
+    """With a calibrated model an account's risk score doesn't depend on the rest of its batch"""
+
+    def test_single_account_matches_batch(self):
+        df = pd.read_csv(os.path.join(settings.BASE_DIR, 'aml_transactions_1000_rows_100_suspicious.csv'))
+        engine = RiskEngine(df.to_dict('records'))
+        features = engine.extract_features_vectorized(engine.df)
+        models_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, models_dir)
+
+        with mock.patch('dashboard.ml.risk_engine.registry', ModelRegistry(models_dir)):
+            engine.fit_features(features)
+            batch = engine.score_features(features, columnar=True).set_index('account_id')['risk_score']
+            # The riskiest account and a spread of the others
+            accounts = [batch.idxmax()] + list(features.index[::50])
+            for account in accounts:
+                single = engine.score_features(features.loc[[account]], columnar=True)
+                self.assertEqual(single['risk_score'].iloc[0], batch[account], account)
+
+
+def realtime_frame(n_rows=3000, n_accounts=150):
+    """Normalized transactions in time order, with structuring amounts, unlinked and undated rows"""
+    df, _ = generate_transactions(n_rows, n_accounts=n_accounts, normalized=True)
+    rng = np.random.default_rng(3)
+    df['datetime'] = df['datetime'].dt.floor('min')
+    df.loc[rng.random(len(df)) < 0.05, 'amount'] = 47000.0
+    df.loc[::50, 'related_account'] = None
+    df.loc[::77, 'datetime'] = pd.NaT
+    df['type'] = np.where(rng.random(len(df)) < 0.2, 'Transfer', df['type'])
+    df['parse_error'] = False
+    return df.sort_values('datetime', kind='stable', na_position='first').reset_index(drop=True)
+
+
+def replay(scorer, df):
+    seconds = df['datetime'].to_numpy('datetime64[s]').view('int64')
+    for account, second, undated, type_, amount, related in zip(
+            df['account_id'], seconds, df['datetime'].isna(), df['type'], df['amount'],
+            df['related_account'].astype(object).where(df['related_account'].notna(), None)):
+        scorer.apply(account, None if undated else int(second), type_, float(amount), related)
+
+
+class StreamingAccumulatorTest(SimpleTestCase):
+    """Streamed features match the batch extractor's while the counterparty graph stays compacted"""
+
+    def test_matches_batch_with_compaction(self):
+        df = realtime_frame()
+        accumulator = StreamingFeatureAccumulator(compact_edges=500)
+        for start in range(0, len(df), 300):
+            accumulator.update(df.iloc[start:start + 300])
+        self.assertEqual(accumulator.out_of_order_rows, 0)
+        self.assertIsNotNone(accumulator.graph.horizon)
+        self.assertLess(accumulator.graph.n_edges, df['related_account'].notna().sum() // 2)
+
+        engine = RiskEngine()
+        batch = engine.extract_features_vectorized(df)
+        streamed = accumulator.features().loc[batch.index, batch.columns]
+        self.assertGreater(batch['cycle_count'].sum(), 0)
+        pd.testing.assert_frame_equal(streamed.astype('float64'), batch.astype('float64'), check_names=False)
+
+        seeds = pd.Series(np.arange(len(batch)) % 4 == 0, index=batch.index, dtype='float64')
+        pd.testing.assert_series_equal(accumulator.graph.network_risk(seeds).sort_index(),
+                                       engine.graph.network_risk(seeds).sort_index())
+
+        # A transfer from before the kept window could close cycles that were already dropped
+        late = df[df['related_account'].notna() & df['datetime'].notna()].iloc[:1]
+        accumulator.update(late.assign(account_id='ACC-LATE'))
+        self.assertEqual(accumulator.out_of_order_rows, 1)
+
+
+class RealtimeScorerTest(SimpleTestCase):
+    """Transactions scored one at a time end up with the batch extractor's features"""
+
+    def test_matches_batch_features(self):
+        df = realtime_frame()
+        batch = RiskEngine().extract_features_vectorized(df)
+        scorer = RealtimeScorer()
+        replay(scorer, df)
+        streamed = pd.DataFrame({account: state.features() for account, state in scorer.accounts.items()}).T
+        streamed = streamed.loc[batch.index, batch.columns].astype('float64')
+        self.assertGreater(batch['cycle_count'].sum(), 0)
+        pd.testing.assert_frame_equal(streamed, batch.astype('float64'), check_names=False)
+
+    def test_mirrored_ring_counts_once(self):
+        # A -> B -> C -> A, each transfer recorded by both the sender and the receiver
+        legs = []
+        for hour, (sender, receiver) in enumerate([('A', 'B'), ('B', 'C'), ('C', 'A')]):
+            when = pd.Timestamp('2026-01-01') + pd.Timedelta(hours=hour)
+            legs += [(sender, when, 'Withdrawal', 1000.0, receiver), (receiver, when, 'Deposit', 1000.0, sender)]
+        df = pd.DataFrame(legs, columns=['account_id', 'datetime', 'type', 'amount', 'related_account'])
+        df['parse_error'] = False
+
+        graph = CounterpartyGraph.from_frame(df)
+        cycles = graph.cycle_features()
+        self.assertEqual(graph.total_cycles, 1)
+        self.assertEqual(cycles['cycle_count'].to_dict(), {'A': 1, 'B': 1, 'C': 1})
+        self.assertEqual(cycles['cycle_volume'].to_dict(), {'A': 1000.0, 'B': 1000.0, 'C': 1000.0})
+        self.assertEqual(RiskEngine().extract_features_vectorized(df)['cycle_count'].to_dict(), {'A': 1, 'B': 1, 'C': 1})
+
+        scorer = RealtimeScorer()
+        replay(scorer, df)
+        self.assertEqual({a: s.cycle_count for a, s in scorer.accounts.items()}, {'A': 1, 'B': 1, 'C': 1})
+
+    def test_snapshot_round_trip(self):
+        df = realtime_frame()
+        half = len(df) // 2
+        uninterrupted = RealtimeScorer()
+        replay(uninterrupted, df)
+
+        restarted = RealtimeScorer()
+        replay(restarted, df.iloc[:half])
+        restarted = pickle.loads(pickle.dumps(restarted))
+        replay(restarted, df.iloc[half:])
+        self.assertEqual({a: s.features() for a, s in restarted.accounts.items()},
+                         {a: s.features() for a, s in uninterrupted.accounts.items()})
+
+
+class RealtimeSnapshotTest(TestCase):
+    """The scoring service writes each user's scorer to disk and a new process picks it up"""
+
+    def test_restore(self):
+        user = User.objects.create_user('realtime')
+        snapshots = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, snapshots)
+        self.addCleanup(realtime._scorers.clear)
+        with self.settings(AML_REALTIME_SNAPSHOT_DIR=snapshots, AML_REALTIME_SNAPSHOT_SECONDS=0,
+                           AML_FEATURE_STORE=False):
+            scorer = realtime.scorer_for(user)
+            replay(scorer, realtime_frame(300, 20))
+            expected = {a: s.features() for a, s in scorer.accounts.items()}
+            realtime.snapshot_all()
+
+            realtime._scorers.clear()
+            restored = realtime.scorer_for(user)
+        self.assertIsNot(restored, scorer)
+        self.assertEqual({a: s.features() for a, s in restored.accounts.items()}, expected)
+
+
+class ModelRegistryTest(SimpleTestCase):
+    """Concurrent train_model runs publish distinct versions and none is lost"""
+
+    def test_concurrent_publish(self):
+        models_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, models_dir)
+        registry = ModelRegistry(models_dir)
+        barrier = threading.Barrier(4)
+
+        def publish(seed):
+            barrier.wait()
+            return registry.publish({'seed': seed}, ['total_volume'])
+
+        with ThreadPoolExecutor(4) as pool:
+            versions = list(pool.map(publish, range(4)))
+
+        self.assertEqual(sorted(versions), ['v1', 'v2', 'v3', 'v4'])
+        manifest = registry.manifest()
+        self.assertEqual(sorted(v['version'] for v in manifest['versions']), sorted(versions))
+        for entry in manifest['versions']:
+            self.assertTrue(os.path.exists(os.path.join(models_dir, entry['file'])))
+        self.assertFalse(os.path.exists(registry.manifest_path + '.lock'))
+
+
+class JobQueueTest(TestCase):
+    """Claims, leases and recovery of the upload job queue (dashboard/jobs.py)"""
+
+    def setUp(self):
+        self.alice = User.objects.create_user('queue-alice')
+        self.bob = User.objects.create_user('queue-bob')
+
+    def queue(self, user, name, age=0):
+        task = ProcessingTask.objects.create(task_id=name, user=user, status='Pending')
+        ProcessingTask.objects.filter(pk=task.pk).update(created_at=timezone.now() - timedelta(minutes=age))
+        return task
+
+    def test_claim_is_exclusive(self):
+        self.queue(self.alice, 'only')
+        task = jobs.claim_next_task('worker-1')
+        self.assertEqual((task.task_id, task.status, task.worker_id, task.attempts),
+                         ('only', 'Processing', 'worker-1', 1))
+        self.assertIsNone(jobs.claim_next_task('worker-2'))
+
+    def test_fairness(self):
+        for i in range(3):
+            self.queue(self.alice, f'alice-{i}', age=10 - i)
+        self.queue(self.bob, 'bob-0', age=1)
+        with self.settings(AML_FEATURE_STORE=False):
+            claimed = [jobs.claim_next_task(f'worker-{i}').task_id for i in range(3)]
+        # Bob's one task doesn't wait behind Alice's backlog
+        self.assertEqual(claimed, ['alice-0', 'bob-0', 'alice-1'])
+
+    def test_feature_store_runs_a_users_tasks_in_order(self):
+        self.queue(self.alice, 'alice-0', age=2)
+        self.queue(self.alice, 'alice-1', age=1)
+        with self.settings(AML_FEATURE_STORE=True):
+            self.assertEqual(jobs.claim_next_task('worker-1').task_id, 'alice-0')
+            self.assertIsNone(jobs.claim_next_task('worker-2'))
+            ProcessingTask.objects.filter(task_id='alice-0').update(status='Completed')
+            self.assertEqual(jobs.claim_next_task('worker-2').task_id, 'alice-1')
+
+    def test_lease_and_recovery(self):
+        self.queue(self.alice, 'leased')
+        task = jobs.claim_next_task('worker-1', lease=60)
+        self.assertTrue(jobs.renew_lease(task.pk, 'worker-1', lease=60))
+        self.assertFalse(jobs.renew_lease(task.pk, 'worker-2', lease=60))
+        self.assertEqual(jobs.recover_orphaned_tasks(), (0, 0))
+
+        # worker-1 dies: its lease runs out and the task goes back in the queue
+        ProcessingTask.objects.filter(pk=task.pk).update(lease_expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(jobs.recover_orphaned_tasks(), (1, 0))
+        task.refresh_from_db()
+        self.assertEqual((task.status, task.worker_id, task.lease_expires_at), ('Pending', None, None))
+        self.assertFalse(jobs.renew_lease(task.pk, 'worker-1'))
+        self.assertEqual(jobs.claim_next_task('worker-2').attempts, 2)
+
+    def test_recovery_gives_up(self):
+        task = self.queue(self.alice, 'doomed')
+        ProcessingTask.objects.filter(pk=task.pk).update(
+            status='Processing', attempts=3, lease_expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(jobs.recover_orphaned_tasks(max_attempts=3), (0, 1))
+        self.assertEqual(ProcessingTask.objects.get(pk=task.pk).status, 'Failed')
+
+    def test_completed_task_is_not_rerun(self):
+        tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp)
+        path = os.path.join(tmp, 'upload.csv')
+        generate_transactions(500, n_accounts=20)[0].to_csv(path, index=False)
+        task = self.queue(self.alice, 'once')
+        task.file_path = path
+        task.save()
+
+        with self.settings(AML_PARSE_CACHE_DIR=None, AML_FEATURE_STORE=True):
+            background_process(task.task_id, path, self.alice.id)
+            task.refresh_from_db()
+            self.assertEqual(task.status, 'Completed')
+            rows = (Alert.objects.count(), Transaction.objects.count(), AccountFeatureState.objects.count())
+            self.assertTrue(all(rows))
+            # A worker that lost track of the task (e.g. died before it could tell) runs it again
+            background_process(task.task_id, path, self.alice.id)
+        self.assertEqual((Alert.objects.count(), Transaction.objects.count(), AccountFeatureState.objects.count()), rows)
+        self.assertEqual(ProcessingTask.objects.get(pk=task.pk).status, 'Completed')
+
+
+class TrainModelTest(TestCase):
+    """train_model fits on a sample of accounts with the features a batch run gives them"""
+
+    def setUp(self):
+        user = User.objects.create_user('trainer')
+        df = realtime_frame(2000, 40).dropna(subset=['datetime'])
+        accounts = {account_id: Account.objects.create(
+            user=user, account_id=account_id, name=account_id, type='Checking', open_date=date(2025, 1, 1),
+            avg_balance=0, total_transactions=0, flagged_transactions=0) for account_id in df['account_id'].unique()}
+        Transaction.objects.bulk_create([
+            Transaction(user=user, account=accounts[account_id], date_time=when.tz_localize('UTC'), type=type_,
+                        amount=round(amount * 100), related_account=related)
+            for account_id, when, type_, amount, related in zip(
+                df['account_id'], df['datetime'], df['type'], df['amount'],
+                df['related_account'].astype(object).where(df['related_account'].notna(), None))
+        ])
+        models_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, models_dir)
+        patcher = mock.patch('dashboard.ml.risk_engine.registry', ModelRegistry(models_dir))
+        self.registry = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_reservoir_sample(self):
+        rng = random.Random(7)
+        self.assertEqual(sorted(reservoir_sample(iter(range(5)), 10, rng)), list(range(5)))
+        picks = Counter()
+        for _ in range(2000):
+            sample = reservoir_sample(iter(range(20)), 5, rng)
+            self.assertEqual(len(set(sample)), 5)
+            picks.update(sample)
+        # Each item is kept a quarter of the time
+        self.assertEqual(set(picks), set(range(20)))
+        for count in picks.values():
+            self.assertAlmostEqual(count / 2000, 0.25, delta=0.05)
+
+    def test_streaming_matches_batch(self):
+        with mock.patch.object(RiskEngine, 'fit_features', autospec=True, side_effect=RiskEngine.fit_features) as fit:
+            call_command('train_model', sample_accounts=10, chunk_size=200, fold_every=2, seed=1, stdout=io.StringIO())
+        features = fit.call_args.args[1]
+        self.assertEqual(len(features), 10)
+        self.assertEqual(self.registry.manifest()['versions'][-1]['sampled_accounts'], 10)
+
+        stored = pd.concat(stored_transaction_chunks(Transaction.objects.order_by('date_time'), 1000), ignore_index=True)
+        batch = RiskEngine().extract_features_vectorized(stored).loc[features.index, features.columns]
+        # Cycles through accounts outside the sample are counted too
+        self.assertGreater(features['cycle_count'].sum(), 0)
+        pd.testing.assert_frame_equal(features.astype('float64'), batch.astype('float64'), check_names=False)
@@ -1,6 +1,6 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import AccountViewSet, AlertViewSet, UploadView, TaskStatusView, SignupView, GoogleLoginView, SARGenerationView
+from .views import AccountViewSet, AlertViewSet, UploadView, TaskStatusView, TaskRetryView, SignupView, GoogleLoginView, SARGenerationView, ScoreTransactionView
 from rest_framework_simplejwt.views import (
     TokenObtainPairView,
     TokenRefreshView,
@@ -14,9 +14,11 @@ urlpatterns = [
     path('api/', include(router.urls)),
     path('api/upload/', UploadView.as_view(), name='file-upload'),
     path('api/task-status/<str:task_id>/', TaskStatusView.as_view(), name='task-status'),
+    path('api/task-retry/<str:task_id>/', TaskRetryView.as_view(), name='task-retry'),
     path('api/signup/', SignupView.as_view(), name='signup'),
     path('api/login/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
     path('api/google-login/', GoogleLoginView.as_view(), name='google-login'),
     path('api/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
+    path('api/score-transaction/', ScoreTransactionView.as_view(), name='score-transaction'),
     path('api/generate-sar/<int:alert_id>/', SARGenerationView.as_view(), name='generate-sar'),
 ]
@@ -5,13 +5,23 @@ from rest_framework.parsers import MultiPartParser, FormParser
 from .models import Account, Alert, Transaction, ProcessingTask
 from .serializers import AccountSerializer, AlertSerializer, TransactionSerializer
 from .ml.risk_engine import RiskEngine
+from .ml.streaming import StreamingFeatureAccumulator
+from .ml.parse_cache import ParsedUploadCache
+from .ml.readers import iter_upload_chunks
+from .ml.realtime import parse_transaction
+from .ml.registry import ModelNotFound
+from . import realtime
+from .money import format_money, minor_units, to_minor, MINOR_UNITS
+from . import feature_store
+from . import summary
+from .feature_store import FeatureStore
 import pandas as pd
-import io
-import threading
+import contextlib
+import copy
+import os
+import shutil
 import uuid
-from django.db.models import Sum
-from django.db.models.functions import Cast
-from django.db.models import FloatField
+from django.db import transaction
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from django.contrib.auth.models import User
 from rest_framework_simplejwt.tokens import RefreshToken
@@ -26,10 +36,27 @@ class AccountViewSet(viewsets.ModelViewSet):
     def get_queryset(self):
         return Account.objects.filter(user=self.request.user)
 
+    def perform_create(self, serializer):
+        with transaction.atomic():
+            summary.account_saved(serializer.save())
+
+    def perform_update(self, serializer):
+        before = copy.copy(serializer.instance)
+        with transaction.atomic():
+            summary.account_saved(serializer.save(), before=before)
+
+    def perform_destroy(self, instance):
+        with transaction.atomic():
+            # Its alerts and transactions go with it
+            alerts = list(instance.alerts.all())
+            transaction_count = instance.recent_activity.count()
+            instance.delete()
+            summary.account_deleted(instance, alerts, transaction_count)
+
     @action(detail=True, methods=['get'])
     def transactions(self, request, account_id=None):
         account = self.get_object()
-        transactions = Transaction.objects.filter(account=account).order_by('-date_time')
+        transactions = Transaction.objects.filter(user=request.user, account=account).order_by('-date_time')
         serializer = TransactionSerializer(transactions, many=True)
         return Response(serializer.data)
 
@@ -37,26 +64,32 @@ class AlertViewSet(viewsets.ModelViewSet):
     serializer_class = AlertSerializer
     
     def get_queryset(self):
-        return Alert.objects.filter(user=self.request.user)
+        # The serializer shows every alert's account name and ID
+        return Alert.objects.filter(user=self.request.user).select_related('account')
     
+    def perform_create(self, serializer):
+        with transaction.atomic():
+            summary.alert_saved(serializer.save())
+
+    def perform_update(self, serializer):
+        before = copy.copy(serializer.instance)
+        with transaction.atomic():
+            summary.alert_saved(serializer.save(), before=before)
+
+    def perform_destroy(self, instance):
+        with transaction.atomic():
+            instance.delete()
+            summary.alert_deleted(instance)
+
     @action(detail=False, methods=['get'])
     def stats(self, request):
-        total_accounts = Account.objects.filter(user=request.user).count()
-        flagged_accounts = Account.objects.filter(user=request.user, alerts__isnull=False).distinct().count()
-        
-        # Calculate suspicious volume
-        try:
-            volume_sum = Alert.objects.filter(user=request.user).aggregate(
-                total=Sum(Cast('amount', FloatField()))
-            )['total'] or 0
-        except:
-            volume_sum = 0
-            for alert in Alert.objects.filter(user=request.user):
-                try:
-                    clean_amt = float(str(alert.amount).replace('₹', '').replace(',', '').strip())
-                    volume_sum += clean_amt
-                except:
-                    continue
+        # Counts come from the user's rollup row (dashboard/summary.py), one lookup however much data there is
+        rollup = summary.for_user(request.user)
+        total_accounts = rollup.total_accounts
+        flagged_accounts = rollup.flagged_accounts
+
+        # Calculate suspicious volume (amounts are paise)
+        volume_sum = rollup.suspicious_volume / MINOR_UNITS
         
         # Format volume (e.g., ₹1.2M or ₹450K)
         if volume_sum >= 1000000:
@@ -76,37 +109,22 @@ class AlertViewSet(viewsets.ModelViewSet):
         # 1. Alert Trends (Last 7 days)
         from django.utils import timezone
         from datetime import timedelta
-        from django.db.models.functions import TruncDate
-        from django.db.models import Count
         
         last_7_days = timezone.now().date() - timedelta(days=7)
-        trends = Alert.objects.filter(user=request.user, date__gte=last_7_days)\
-            .values('date')\
-            .annotate(count=Count('id'))\
-            .order_by('date')
-        
         trend_data = []
         for i in range(7):
             day = last_7_days + timedelta(days=i+1)
-            count = next((t['count'] for t in trends if t['date'] == day), 0)
-            trend_data.append({"date": day.strftime('%d %b'), "count": count})
+            trend_data.append({"date": day.strftime('%d %b'), "count": rollup.daily_alerts.get(day.isoformat(), 0)})
 
         # 2. Typology Distribution
-        typologies = Alert.objects.filter(user=request.user).values('type')
-        type_counts = {}
-        for t in typologies:
-            types = t['type'].split(', ')
-            for tp in types:
-                type_counts[tp] = type_counts.get(tp, 0) + 1
-        
-        dist_data = [{"name": name, "value": count} for name, count in type_counts.items()]
+        dist_data = [{"name": label, "value": rollup.typologies[label]}
+                     for label, _ in RiskEngine.PATTERNS if rollup.typologies.get(label)]
 
         # 3. Detection Funnel
-        total_transactions = Transaction.objects.filter(user=request.user).count()
+        total_transactions = rollup.total_transactions
 
         # 4. Account Type Distribution
-        acc_types = Account.objects.filter(user=request.user).values('type').annotate(count=Count('id'))
-        acc_type_data = [{"name": a['type'], "value": a['count']} for a in acc_types]
+        acc_type_data = [{"name": name, "value": count} for name, count in rollup.account_types.items()]
 
         # 5. High-Impact Activity Feed (Unique)
         impact_feed = []
@@ -116,14 +134,14 @@ class AlertViewSet(viewsets.ModelViewSet):
                 "id": a.id,
                 "account": a.account.account_id,
                 "name": a.account.name,
-                "reason": a.type.split(', ')[0], # Take primary reason
-                "amount": a.amount,
+                "reason": a.type.split(RiskEngine.PATTERN_SEPARATOR)[0], # Take primary reason
+                "amount": format_money(a.amount),
                 "time": f"{a.date.strftime('%d %b')} {a.time.strftime('%H:%M')}",
                 "severity": a.priority
             })
 
         return Response({
-            "critical_alerts": Alert.objects.filter(user=request.user, priority='Critical').count(),
+            "critical_alerts": rollup.priorities.get('Critical', 0),
             "flagged_accounts": flagged_accounts,
             "suspicious_volume": volume_str,
             "detection_rate": rate_str,
@@ -134,7 +152,7 @@ class AlertViewSet(viewsets.ModelViewSet):
             "summary": {
                 "total_accounts": total_accounts,
                 "total_transactions": total_transactions,
-                "total_alerts": Alert.objects.filter(user=request.user).count()
+                "total_alerts": rollup.total_alerts
             }
         })
 
@@ -213,112 +231,379 @@ class TaskStatusView(views.APIView):
                 "progress": task.progress,
                 "total_records": task.total_records,
                 "processed_records": task.processed_records,
+                "invalid_records": task.invalid_records,
+                "file_size": task.file_size,
+                "cache_hits": task.cache_hits,
+                "cache_misses": task.cache_misses,
                 "error": task.error_message
             })
         except ProcessingTask.DoesNotExist:
             return Response({"error": "Task not found"}, status=status.HTTP_404_NOT_FOUND)
 
-def background_process(task_id, file_data, filename, user_id):
-    try:
-        user = User.objects.get(id=user_id)
-        task = ProcessingTask.objects.get(task_id=task_id)
-        task.status = 'Processing'
-        task.save()
+class TaskRetryView(views.APIView):
+    def post(self, request, task_id):
+        try:
+            task = ProcessingTask.objects.get(task_id=task_id, user=request.user)
+        except ProcessingTask.DoesNotExist:
+            return Response({"error": "Task not found"}, status=status.HTTP_404_NOT_FOUND)
 
-        # Read file
-        if filename.endswith('.csv'):
-            df = pd.read_csv(io.BytesIO(file_data))
-        else:
-            df = pd.read_excel(io.BytesIO(file_data))
+        if task.status != 'Failed':
+            return Response({"error": "Only failed tasks can be retried"}, status=status.HTTP_400_BAD_REQUEST)
+        if not task.file_path or not os.path.exists(task.file_path):
+            return Response({"error": "Spooled upload no longer available, please upload again"}, status=status.HTTP_410_GONE)
 
-        task.total_records = len(df)
+        task.status = 'Pending'
+        task.progress = 0
+        task.processed_records = 0
+        task.error_message = None
+        task.attempts = 0
         task.save()
 
-        # Run Risk Engine
-        engine = RiskEngine()
-        engine.df = df
-        engine._map_columns()
-        engine._prepare_data()
-        
-        results = engine.analyze(use_saved_model=True)
-        
-        # Bulk save results for efficiency
-        from datetime import datetime
-        accounts_to_create = {}
-        alerts_to_create = []
-        transactions_to_create = []
-        
-        # Pre-fetch existing accounts for this user to avoid duplicates
-        existing_accounts = {acc.account_id: acc for acc in Account.objects.filter(user=user)}
-        
-        total = len(results)
-        for i, res in enumerate(results):
-            if i % 1000 == 0:
-                task.processed_records = i
-                task.progress = int((i / total) * 100)
-                task.save()
-
-            acc_id = res['accountId']
-            if acc_id not in accounts_to_create and acc_id not in existing_accounts:
-                accounts_to_create[acc_id] = Account(
-                    account_id=acc_id,
-                    user=user,
-                    name=f"Account {acc_id}",
-                    type='Checking',
-                    open_date=datetime.now().date(),
-                    avg_balance="₹0",
-                    total_transactions=res['transactionCount'],
-                    flagged_transactions=1 if res['riskScore'] > 50 else 0
-                )
-        
-        if accounts_to_create:
-            Account.objects.bulk_create(accounts_to_create.values())
-        
-        # Refresh account maps
-        all_accounts = {acc.account_id: acc for acc in Account.objects.filter(user=user)}
-        
-        for res in results:
-            account = all_accounts.get(res['accountId'])
-            if res['riskScore'] > 50:
-                alerts_to_create.append(Alert(
-                    alert_id=f"AL-{uuid.uuid4().hex[:10]}-{res['accountId']}",
-                    account=account,
-                    user=user,
-                    risk_score=res['riskScore'],
-                    type=", ".join(res['patterns']),
-                    date=datetime.now().date(),
-                    time=datetime.now().time(),
-                    status='Open',
-                    amount=str(res['totalVolume']),
-                    transactions_count=res['transactionCount'],
-                    priority='Critical' if res['riskScore'] > 90 else 'High'
-                ))
-            
-            # Save a few sample transactions for evidence (top 5 by amount for example)
-            # In a real app we'd save all, but for demo we'll take a subset to avoid DB bloat
-            # Actually, let's extract them from the original dataframe
-            sample_txns = df[df['account_id'] == res['accountId']].sort_values(by='amount', ascending=False).head(5)
-            for _, row in sample_txns.iterrows():
-                transactions_to_create.append(Transaction(
-                    user=user,
-                    account=account,
-                    date_time=pd.to_datetime(row['date'] + ' ' + (row.get('time', '00:00:00'))),
-                    type=row.get('type', 'Transfer'),
-                    amount=f"₹{row['amount']}",
-                    related_account=str(row.get('related_account', '')),
-                    flag=res['riskScore'] > 50
-                ))
+        # Picked up again by the next free `manage.py run_workers` process
+        return Response({
+            "message": "Analysis re-queued",
+            "task_id": task.task_id
+        }, status=status.HTTP_202_ACCEPTED)
+
+def spool_upload(file_obj, task_id):
+    """Stream an uploaded file to the spool directory and return (path, size)"""
+    spool_dir = getattr(settings, 'AML_UPLOAD_SPOOL_DIR', os.path.join(settings.BASE_DIR, 'uploads', 'spool'))
+    os.makedirs(spool_dir, exist_ok=True)
+    ext = os.path.splitext(file_obj.name)[1].lower()
+    path = os.path.join(spool_dir, f"{task_id}{ext}")
+
+    if hasattr(file_obj, 'temporary_file_path'):
+        # Large uploads are already on disk in Django's temp dir; move instead of copying
+        shutil.move(file_obj.temporary_file_path(), path)
+    else:
+        with open(path, 'wb') as out:
+            for chunk in file_obj.chunks():
+                out.write(chunk)
+
+    return path, os.path.getsize(path)
+
+def build_evidence_transactions(evidence, results, accounts, user):
+    """
+    Build unsaved evidence Transactions for every scored account from column arrays.
+    `evidence` is the per-account top-N frame from RiskEngine.top_transactions and
+    `results` a result frame from RiskEngine.build_result_frame.
+    """
+    positions = evidence.groupby('account_id', sort=False).indices
+    date_times = evidence['datetime'].tolist()
+    types = evidence['type'].tolist()
+    amounts = minor_units(evidence['amount']).tolist()
+    related = evidence['related_account']
+    related = related.astype(object).where(related.notna(), '').astype(str).tolist()
+
+    transactions = []
+    for account_id, flag in zip(results['account_id'].tolist(), (results['risk_score'] > 50).tolist()):
+        rows = positions.get(account_id)
+        if rows is None:
+            continue
+        account = accounts.get(account_id)
+        for j in rows:
+            transactions.append(Transaction(
+                user=user,
+                account=account,
+                date_time=date_times[j],
+                type=types[j],
+                amount=amounts[j],
+                related_account=related[j],
+                flag=flag
+            ))
+    return transactions
+
+def build_alerts(results, accounts, user, flagged_only=True):
+    """Unsaved Alerts for the flagged accounts (risk score over 50) of a result frame, or for all of them"""
+    from datetime import datetime
+    flagged = results[results['risk_score'] > 50] if flagged_only else results
+    columns = zip(flagged['account_id'].tolist(), flagged['risk_score'].tolist(),
+                  RiskEngine.pattern_labels(flagged).tolist(), flagged['total_volume'].tolist(),
+                  flagged['transaction_count'].tolist(), flagged['model_version'].tolist(),
+                  flagged['network_risk'].tolist(), RiskEngine.pattern_masks(flagged).tolist())
+    alerts = []
+    for acc_id, risk_score, patterns, total_volume, transaction_count, model_version, network_risk, typologies in columns:
+        alerts.append(Alert(
+            alert_id=f"AL-{uuid.uuid4().hex[:10]}-{acc_id}",
+            account=accounts.get(acc_id),
+            user=user,
+            risk_score=risk_score,
+            type=patterns,
+            typologies=typologies,
+            date=datetime.now().date(),
+            time=datetime.now().time(),
+            status='Open',
+            amount=to_minor(total_volume),
+            transactions_count=transaction_count,
+            priority='Critical' if risk_score > 90 else 'High',
+            model_version=model_version,
+            network_risk_score=network_risk,
+        ))
+    return alerts
+
+# Fields of an open alert that re-scoring an upload refreshes
+RESCORED_FIELDS = ['risk_score', 'type', 'typologies', 'amount', 'transactions_count', 'priority', 'model_version',
+                   'network_risk_score']
+
+def rescore_results(user, results, task=None):
+    """
+    Write new scores of accounts already on file (an upload the feature store holds,
+    scored again): their open alerts take the new scores, flagged accounts without one
+    get a new alert. Nothing else is written; the task is marked Completed with them.
+    """
+    accounts = {}
+    ids = results['account_id'].tolist()
+    for start in range(0, len(ids), summary.BATCH_SIZE):
+        accounts.update((acc.account_id, acc) for acc in
+                        Account.objects.filter(user=user, account_id__in=ids[start:start + summary.BATCH_SIZE]))
+    scored = [alert for alert in build_alerts(results, accounts, user, flagged_only=False) if alert.account is not None]
+
+    with transaction.atomic():
+        open_alerts = {}
+        pks = [acc.pk for acc in accounts.values()]
+        for start in range(0, len(pks), summary.BATCH_SIZE):
+            for alert in Alert.objects.filter(user=user, status='Open', account_id__in=pks[start:start + summary.BATCH_SIZE]):
+                open_alerts.setdefault(alert.account_id, []).append(alert)
+
+        delta = summary.SummaryDelta()
+        updated, created = [], []
+        for new in scored:
+            existing = open_alerts.get(new.account_id)
+            if not existing:
+                if new.risk_score > 50:
+                    created.append(new)
+                continue
+            delta.add_alerts(existing, sign=-1)
+            # An account no longer flagged keeps the priority it was raised with
+            fields = RESCORED_FIELDS if new.risk_score > 50 else [f for f in RESCORED_FIELDS if f != 'priority']
+            for alert in existing:
+                for field in fields:
+                    setattr(alert, field, getattr(new, field))
+            delta.add_alerts(existing)
+            updated.extend(existing)
+        delta.add_alerts(created)
+        alerted = {alert.account_id for alert in created}
+        delta.counters['flagged_accounts'] += len(alerted - summary.accounts_with_alerts(user, alerted))
+
+        Alert.objects.bulk_update(updated, RESCORED_FIELDS, batch_size=1000)
+        Alert.objects.bulk_create(created, batch_size=1000)
+        summary.apply(user, delta)
+
+        if task:
+            task.status = 'Completed'
+            task.progress = 100
+            task.processed_records = len(results)
+            task.error_message = (f"Already in the feature store, so re-scored against the saved state: "
+                                  f"{len(updated)} open alerts updated, {len(created)} raised")
+            task.save(update_fields=['status', 'progress', 'processed_records', 'error_message', 'updated_at'])
+
+def save_results(user, results, evidence, task=None, store=None, state=None, upload_key=None):
+    """
+    Write a scored upload: new Accounts, Alerts for the flagged ones and evidence
+    Transactions, plus the merged feature-store `state` when `store` is given (recorded
+    as the upload with content key `upload_key`). Reports progress on `task` (the second
+    half of its progress bar) when there is one, and marks it Completed with the results.
+    """
+    from datetime import datetime
+    accounts_to_create = {}
+    
+    # Pre-fetch existing accounts for this user to avoid duplicates
+    existing_accounts = {acc.account_id: acc for acc in Account.objects.filter(user=user)}
+    
+    # Only accounts this user doesn't have yet need a row
+    new = results[pd.Index(list(existing_accounts), dtype=object).get_indexer(results['account_id']) < 0]
+    columns = zip(new['account_id'].tolist(), new['transaction_count'].tolist(), (new['risk_score'] > 50).tolist())
+    for i, (acc_id, transaction_count, flagged) in enumerate(columns):
+        if task and i % 1000 == 0:
+            task.processed_records = i
+            task.progress = 50 + int((i / len(new)) * 50)
+            task.save(update_fields=['processed_records', 'progress', 'updated_at'])
+
+        accounts_to_create[acc_id] = Account(
+            account_id=acc_id,
+            user=user,
+            name=f"Account {acc_id}",
+            type='Checking',
+            open_date=datetime.now().date(),
+            avg_balance=0,
+            total_transactions=transaction_count,
+            flagged_transactions=1 if flagged else 0
+        )
+    
+    if accounts_to_create:
+        with transaction.atomic():
+            # Another worker may have created some of them since; only the rows inserted here are counted
+            summary.lock(user)
+            existing = set(Account.objects.filter(user=user).values_list('account_id', flat=True))
+            inserted = [account for acc_id, account in accounts_to_create.items() if acc_id not in existing]
+            Account.objects.bulk_create(inserted, ignore_conflicts=True)
+            summary.apply(user, summary.SummaryDelta().add_accounts(inserted))
+    
+    # Refresh account maps
+    all_accounts = {acc.account_id: acc for acc in Account.objects.filter(user=user)}
+    
+    alerts_to_create = build_alerts(results, all_accounts, user)
+
+    # Save a few sample transactions for evidence (top 5 by amount per account)
+    # In a real app we'd save all, but for demo we'll take a subset to avoid DB bloat
+    transactions_to_create = build_evidence_transactions(evidence, results, all_accounts, user)
+
+    # All or nothing, so a retried task can't apply its transactions to the feature state twice
+    with transaction.atomic():
+        delta = summary.SummaryDelta().add_alerts(alerts_to_create)
+        delta.counters['total_transactions'] += len(transactions_to_create)
+        alerted = {alert.account_id for alert in alerts_to_create}
+        delta.counters['flagged_accounts'] += len(alerted - summary.accounts_with_alerts(user, alerted))
 
         if alerts_to_create:
             Alert.objects.bulk_create(alerts_to_create, batch_size=1000)
-        
+
         if transactions_to_create:
             Transaction.objects.bulk_create(transactions_to_create, batch_size=2000)
 
-        task.status = 'Completed'
-        task.progress = 100
-        task.processed_records = total
-        task.save()
+        summary.apply(user, delta)
+
+        if store:
+            store.save(state, content_key=upload_key, task_id=task.task_id if task else None)
+
+        if task:
+            # Completed with its results, so a worker dying after this can't get the task rerun
+            task.status = 'Completed'
+            task.progress = 100
+            task.processed_records = len(results)
+            task.save(update_fields=['status', 'progress', 'processed_records', 'updated_at'])
+
+def background_process(task_id, file_path, user_id):
+    try:
+        user = User.objects.get(id=user_id)
+        task = ProcessingTask.objects.get(task_id=task_id)
+        if task.status == 'Completed':
+            # Its results are already saved; running it again would duplicate them
+            return
+        task.status = 'Processing'
+        # Save only the fields this function owns so the worker's lease heartbeat isn't overwritten
+        task.save(update_fields=['status', 'updated_at'])
+
+        engine = RiskEngine()
+        chunk_size = getattr(settings, 'AML_INGEST_CHUNK_SIZE', 100000)
+        results = None
+        # With the feature store, accounts continue from their saved history instead of this file alone
+        store = FeatureStore(user) if feature_store.enabled() else None
+        new_accumulator = store.accumulator if store else StreamingFeatureAccumulator
+
+        # Repeat uploads load the normalized frame from the parse cache instead of re-parsing
+        cache = ParsedUploadCache.from_settings()
+        cache_key = cache.content_key(file_path) if cache else None
+        cached = cache is not None and cache.get(cache_key) is not None
+
+        # Folding the same file into the feature store twice would double its accounts' counts
+        upload_key = (cache_key or ParsedUploadCache.content_key(file_path)) if store else None
+        if cache:
+            if cached:
+                task.cache_hits += 1
+            else:
+                task.cache_misses += 1
+            task.save(update_fields=['cache_hits', 'cache_misses', 'updated_at'])
+
+        if upload_key and store.applied(upload_key):
+            # Only its accounts are needed: score their saved state (which holds this file) again
+            print(f"Task {task_id}: this file is already in the feature store, re-scoring its accounts")
+            if cached:
+                chunks = (chunk for chunk, _ in cache.read_chunks(cache_key, chunk_size))
+            else:
+                chunks = (engine.prepare_frame(chunk) for chunk, _ in iter_upload_chunks(file_path, chunk_size))
+            account_ids = set()
+            task.total_records = task.invalid_records = 0
+            for chunk in chunks:
+                account_ids.update(chunk['account_id'].unique())
+                task.total_records += len(chunk)
+                task.invalid_records += int(chunk['parse_error'].sum())
+            task.progress = 50
+            task.save(update_fields=['total_records', 'invalid_records', 'progress', 'updated_at'])
+
+            accumulator = StreamingFeatureAccumulator()
+            state = store.load(account_ids)
+            if not state.empty:
+                accumulator.seed(state)
+            results = engine.score_features(accumulator.features(), use_saved_model=True, columnar=True,
+                                            graph=accumulator.graph)
+            rescore_results(user, results, task=task)
+            if os.path.exists(file_path):
+                os.remove(file_path)
+            return
+
+        # Reading/scoring the upload is the first half of the progress bar, saving results the second
+        if getattr(settings, 'AML_STREAMING_INGEST', True):
+            # Stream the file in fixed-size chunks, keeping only per-account aggregates
+            accumulator = new_accumulator()
+            if cached:
+                chunks = cache.read_chunks(cache_key, chunk_size)
+            else:
+                chunks = ((engine.prepare_frame(chunk), fraction)
+                          for chunk, fraction in iter_upload_chunks(file_path, chunk_size))
+
+            with (cache.writer(cache_key) if cache and not cached else contextlib.nullcontext()) as writer:
+                for chunk, fraction in chunks:
+                    if writer:
+                        writer.write(chunk)
+                    accumulator.update(chunk)
+                    task.total_records = accumulator.total_rows
+                    task.invalid_records = accumulator.parse_errors
+                    task.progress = int(fraction * 50)
+                    task.save(update_fields=['total_records', 'invalid_records', 'progress', 'updated_at'])
+
+            if accumulator.out_of_order_rows:
+                # Mule checks need each account's rows in time order; rescore in batch
+                print(f"Task {task_id}: {accumulator.out_of_order_rows} out-of-order rows, falling back to batch scoring")
+            else:
+                results = engine.score_features(accumulator.features(), use_saved_model=True, columnar=True,
+                                                graph=accumulator.graph)
+                evidence = accumulator.evidence()
+
+        if results is None:
+            if cache and cache.get(cache_key):
+                # Cache hit, or written just now by the streaming pass
+                df = cache.read(cache_key)
+            else:
+                # Read file
+                if file_path.endswith('.csv'):
+                    df = pd.read_csv(file_path, memory_map=True)
+                else:
+                    df = pd.concat([chunk for chunk, _ in iter_upload_chunks(file_path, chunk_size)], ignore_index=True)
+                df = engine.prepare_frame(df)
+                if cache:
+                    cache.write(cache_key, df)
+
+            task.total_records = len(df)
+            task.invalid_records = int(df['parse_error'].sum())
+            task.progress = 50
+            task.save(update_fields=['total_records', 'invalid_records', 'progress', 'updated_at'])
+
+            # Run Risk Engine
+            if store:
+                # As one chunk, row order within the file no longer matters, only against saved history
+                accumulator = new_accumulator()
+                accumulator.update(df)
+                if accumulator.out_of_order_rows:
+                    # Typically an export overlapping an earlier one: only identical files are recognized
+                    print(f"Task {task_id}: {accumulator.out_of_order_rows} rows predate their account's saved history")
+                    task.error_message = (f"{accumulator.out_of_order_rows} rows are older than their accounts' saved "
+                                          f"history; if they overlap an earlier upload they are counted twice")
+                    task.save(update_fields=['error_message', 'updated_at'])
+                results = engine.score_features(accumulator.features(), use_saved_model=True, columnar=True,
+                                                graph=accumulator.graph)
+            else:
+                engine.df = df
+                results = engine.analyze(use_saved_model=True, workers=getattr(settings, 'AML_SCORING_WORKERS', 1),
+                                         columnar=True)
+            evidence = engine.top_transactions(df)
+        
+        save_results(user, results, evidence, task=task, store=store,
+                     state=accumulator.state() if store else None, upload_key=upload_key)
+
+        # Spooled files are only kept around so failed tasks can be retried
+        if os.path.exists(file_path):
+            os.remove(file_path)
 
     except Exception as e:
         import traceback
@@ -327,7 +612,7 @@ def background_process(task_id, file_data, filename, user_id):
         task = ProcessingTask.objects.get(task_id=task_id)
         task.status = 'Failed'
         task.error_message = str(e)
-        task.save()
+        task.save(update_fields=['status', 'error_message', 'updated_at'])
 
 class UploadView(views.APIView):
     parser_classes = (MultiPartParser, FormParser)
@@ -337,23 +622,34 @@ class UploadView(views.APIView):
         if not file_obj:
             return Response({"error": "No file uploaded"}, status=status.HTTP_400_BAD_REQUEST)
 
-        # Create a background task
+        # Queue a processing task; `manage.py run_workers` picks it up in a separate process
         task_id = str(uuid.uuid4())
         task = ProcessingTask.objects.create(task_id=task_id, status='Pending', user=request.user)
         
-        # Read file data to pass to thread (for small/medium files)
-        # For truly massive files, we'd save to disk first
-        file_data = file_obj.read()
-        filename = file_obj.name
-
-        # Start background thread
-        thread = threading.Thread(target=background_process, args=(task_id, file_data, filename, request.user.id))
-        thread.start()
+        # Spool the upload to disk; the worker reads it by path so the raw bytes never sit in memory
+        task.file_path, task.file_size = spool_upload(file_obj, task_id)
+        task.save()
 
         return Response({
-            "message": "Analysis started in background",
+            "message": "Analysis queued",
             "task_id": task_id
         }, status=status.HTTP_202_ACCEPTED)
+
+class ScoreTransactionView(views.APIView):
+    """Score one transaction as it happens against the account's in-memory running state"""
+
+    def post(self, request):
+        try:
+            txn = parse_transaction(request.data)
+        except (TypeError, ValueError) as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            result = realtime.scorer_for(request.user).score(*txn)
+        except ModelNotFound as e:
+            return Response({"error": str(e)}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        return Response(result)
+
 class SARGenerationView(views.APIView):
     def post(self, request, alert_id):
         try:
@@ -363,9 +659,9 @@ class SARGenerationView(views.APIView):
             print(f"Account: {account.account_id}")
             
             # Fetch recent transactions for context
-            recent_txns = Transaction.objects.filter(account=account).order_by('-date_time')[:10]
+            recent_txns = Transaction.objects.filter(user=request.user, account=account).order_by('-date_time')[:10]
             print(f"Transactions found: {len(recent_txns)}")
-            evidence = "\n".join([f"- {t.date_time.strftime('%Y-%m-%d')}: {t.type} of {t.amount} involving {t.related_account or 'N/A'}" for t in recent_txns])
+            evidence = "\n".join([f"- {t.date_time.strftime('%Y-%m-%d')}: {t.type} of {format_money(t.amount)} involving {t.related_account or 'N/A'}" for t in recent_txns])
             
             # Initialize Generator
             api_key = getattr(settings, 'GROQ_API_KEY', 'your-grok-api-key-here')
@@ -382,7 +678,7 @@ class SARGenerationView(views.APIView):
                     'account_id': account.account_id,
                     'case_id': alert.alert_id
                 },
-                patterns=alert.type.split(', '),
+                patterns=alert.type.split(RiskEngine.PATTERN_SEPARATOR),
                 risk_score=alert.risk_score,
                 evidence=evidence
             )
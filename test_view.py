@@ -27,9 +27,9 @@ def test_view():
         print("No alerts found for user. Creating one...")
         from datetime import datetime
         acc, _ = Account.objects.get_or_create(account_id="TESTACC", user=user, defaults={
-            "name": "Test Account", "type": "Savings", "open_date": datetime.now().date(), "avg_balance": "0", "total_transactions": 0, "flagged_transactions": 0
+            "name": "Test Account", "type": "Savings", "open_date": datetime.now().date(), "avg_balance": 0, "total_transactions": 0, "flagged_transactions": 0
         })
-        alert = Alert.objects.create(alert_id="TESTALERT", account=acc, user=user, risk_score=99, type="Structuring", date=datetime.now().date(), time=datetime.now().time(), status="Open", amount="50000", transactions_count=1, priority="Critical")
+        alert = Alert.objects.create(alert_id="TESTALERT", account=acc, user=user, risk_score=99, type="Structuring", date=datetime.now().date(), time=datetime.now().time(), status="Open", amount=5000000, transactions_count=1, priority="Critical")
 
     factory = RequestFactory()
     request = factory.post(f'/api/generate-sar/{alert.id}/')